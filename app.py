@@ -1,28 +1,197 @@
 import streamlit as st
-import preprocessor, helper
+import preprocessor, helper, search, storage, instrumentation, report, multichat, loader, sketches
+import metrics as analyzer_metrics
+import media as chat_media
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import pandas as pd
 import matplotlib.pyplot as plt
-from wordcloud import WordCloud
+import importlib.util
 import zipfile
 import io
 import os
-import tempfile
-import urllib.request
+import time
 import plotly.express as px
+import plotly.graph_objects as go
 import seaborn as sns
-# Use fpdf2 for PDF export
-try:
-    from fpdf import FPDF, XPos, YPos
-    def export_pdf(summary_text):
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-        for line in summary_text.split('\n'):
-            pdf.multi_cell(0, 10, line)
-        out = pdf.output()  # Removed deprecated dest parameter
-        return out
-    PDF_EXPORT_AVAILABLE = True
-except ImportError:
-    PDF_EXPORT_AVAILABLE = False
+# fpdf2 builds the PDF report (see report.py)
+PDF_EXPORT_AVAILABLE = importlib.util.find_spec("fpdf") is not None
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def parsed_chat_parquet(_df, chat_key):
+    # Serialize once per chat instead of on every rerun
+    buffer = io.BytesIO()
+    storage.save_chat(_df, buffer, file_format='parquet')
+    return buffer.getvalue()
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def cached_analysis(name, chat_key, _df, selected_user=None, **kwargs):
+    # `_df` is not hashed; chat_key identifies the chat (or date window) it holds
+    fn = getattr(helper, name)
+    if selected_user is None:
+        return fn(_df, **kwargs)
+    return fn(selected_user, _df, **kwargs)
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def media_inventory(file_id, _zip_file):
+    # Names and sizes from the zip's central directory; no attachment is decompressed
+    return chat_media.inventory(_zip_file)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def cached_attachments(window_key, _df):
+    return chat_media.attachments(_df)
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def cached_sketch(window_key, _df, selected_user):
+    # Fixed-size summary of the window, fed in row batches
+    return sketches.sketch_chat(selected_user, _df)
+
+def histogram_figure(histogram, xlabel, title, color=None, ylabel='Frequency'):
+    # Bars drawn from pre-binned counts, so the chart holds one point per bin
+    fig = go.Figure(go.Bar(x=(histogram['bin_start'] + histogram['bin_end']) / 2, y=histogram['count'],
+                           width=histogram['bin_end'] - histogram['bin_start'], marker_color=color))
+    fig.update_layout(title=title, xaxis_title=xlabel, yaxis_title=ylabel, bargap=0)
+    return fig
+
+def box_figure(box, ylabel, title, top=10):
+    # Box plots from precomputed quartiles and fences of the busiest members
+    box = box.head(top)
+    fig = go.Figure(go.Box(x=box['group'], q1=box['q1'], median=box['median'], q3=box['q3'], mean=box['mean'],
+                           lowerfence=box['lower_fence'], upperfence=box['upper_fence'], name=''))
+    fig.update_layout(title=title, yaxis_title=ylabel)
+    fig.update_xaxes(tickangle=45)
+    return fig
+
+def parse_in_background(upload_key, data):
+    """Parse on a worker thread behind a live progress bar; Cancel (or a new upload) stops it."""
+    job = st.session_state.get("parse_job")
+    if job is not None and job.key != upload_key:
+        # A different file was uploaded while the previous one was still parsing
+        job.cancel()
+        job = None
+    if st.session_state.get("parse_cancelled") == upload_key:
+        st.info("⏹️ Parsing cancelled. Upload another file, or parse this one again.")
+        if not st.button("🔄 Parse again"):
+            st.stop()
+        del st.session_state["parse_cancelled"]
+    if job is None:
+        job = st.session_state.parse_job = preprocessor.ParseJob(data, key=upload_key)
+
+    cancel_slot = st.empty()
+    if cancel_slot.button("⏹️ Cancel parsing"):
+        job.cancel()
+        del st.session_state["parse_job"]
+        st.session_state.parse_cancelled = upload_key
+        st.rerun()
+    # Reruns triggered by widgets stop this loop; the next run picks the same job up again
+    bar = st.progress(0.0, text="Processing chat data...")
+    while not job.done():
+        progress = job.progress
+        stage = (progress['stage'] or 'starting').replace('_', ' ')
+        bar.progress(progress['fraction'],
+                     text=f"Processing chat data: {stage} · {progress['messages']:,} messages · "
+                          f"{progress['chars_done'] / 1e6:.1f} of {progress['chars_total'] / 1e6:.1f} M characters")
+        time.sleep(0.2)
+    bar.empty()
+    cancel_slot.empty()
+    del st.session_state["parse_job"]
+    df = job.result()
+    # Keep the parsed chat so reruns skip parsing
+    st.session_state.parsed_chat = (upload_key, df)
+    return df
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def cached_comparison(name, chats_key, _combined, **kwargs):
+    # `_combined` is not hashed; chats_key identifies the uploads it was built from
+    return getattr(multichat, name)(_combined, **kwargs)
+
+def compare_chats_page():
+    """Several exports side by side, parsed concurrently; each metric is one grouped pass over all chats."""
+    uploads = st.sidebar.file_uploader(
+        "Choose WhatsApp chat text or zip files",
+        type=['txt', 'zip'],
+        accept_multiple_files=True,
+        help="Upload two or more exports (a zip with several chats counts as several)"
+    )
+    st.title("🆚 Compare Chats")
+    if not uploads:
+        st.info("👈 Upload two or more chat exports in the sidebar to compare them.")
+        return
+
+    # Parse once per set of uploads
+    chats_key = tuple(upload.file_id for upload in uploads)
+    compared = st.session_state.get("compared_chats")
+    if compared is None or compared[0] != chats_key:
+        try:
+            sources = multichat.upload_sources([(upload.name, upload.getvalue()) for upload in uploads])
+        except zipfile.BadZipFile:
+            st.error("❌ One of the uploaded .zip files is corrupted or not a valid zip archive.")
+            return
+        bar = st.progress(0.0, text=f"Parsing {len(sources)} chats...")
+        frames, errors = multichat.parse_sources(
+            sources, on_done=lambda label, done, total: bar.progress(done / total, text=f"Parsed {done} of {total} chats"))
+        bar.empty()
+        compared = (chats_key, multichat.combine(frames), errors)
+        st.session_state.compared_chats = compared
+    _, combined, errors = compared
+    for label, error in errors.items():
+        st.warning(f"⚠️ Could not parse {label}: {error}")
+    chats = combined['chat'].cat.categories.tolist() if not combined.empty else []
+    if len(chats) < 2:
+        st.info("Need at least two chats with messages to compare.")
+        return
+
+    def comparison(name, **kwargs):
+        return cached_comparison(name, chats_key, combined, **kwargs)
+
+    st.subheader("📋 Overview")
+    overview = comparison('chat_overview')
+    st.dataframe(overview, hide_index=True, use_container_width=True)
+
+    tabs = st.tabs(["📈 Message Volume", "👥 Top Users", "📊 Sentiment Mix", "🔥 Heatmaps"],
+                   key="compare_tab", on_change="rerun")
+    if tabs[0].open:
+        with tabs[0]:
+            freq = st.radio("Granularity", ["Monthly", "Daily"], horizontal=True)
+            volume = comparison('message_volume', freq='M' if freq == "Monthly" else 'D')
+            fig = px.line(volume, x='period', y='message', color='chat', markers=freq == "Monthly",
+                          labels={'period': 'Date', 'message': 'Messages', 'chat': 'Chat'},
+                          title=f"{freq} Messages per Chat")
+            fig.update_layout(hovermode='x unified')
+            st.plotly_chart(fig, use_container_width=True)
+    if tabs[1].open:
+        with tabs[1]:
+            ranked = comparison('top_users', n=5)
+            columns = st.columns(min(len(chats), 3))
+            for i, chat in enumerate(chats):
+                with columns[i % len(columns)]:
+                    st.markdown(f"**{chat}**")
+                    st.dataframe(ranked[ranked['chat'] == chat].drop(columns='chat').style.format({'Percent': '{:.1f}%'}),
+                                 hide_index=True, use_container_width=True)
+    if tabs[2].open:
+        with tabs[2]:
+            mix = comparison('sentiment_mix')
+            fig = px.bar(mix, x='chat', y='Percent', color='Sentiment', hover_data=['Count'],
+                         labels={'chat': 'Chat', 'Percent': 'Share of Messages (%)'}, title='Sentiment Mix',
+                         color_discrete_map={'Positive': 'green', 'Negative': 'red', 'Neutral': 'blue'})
+            st.plotly_chart(fig, use_container_width=True)
+    if tabs[3].open:
+        with tabs[3]:
+            maps = comparison('heatmaps')
+            columns = st.columns(2)
+            for i, chat in enumerate(chats):
+                if chat in maps:
+                    with columns[i % 2]:
+                        fig = px.imshow(maps[chat], aspect='auto', color_continuous_scale='YlOrRd',
+                                        labels={'x': 'Time Period', 'y': 'Day of Week', 'color': 'Messages'},
+                                        title=str(chat))
+                        st.plotly_chart(fig, use_container_width=True)
+
+# Structured timing logs on stderr when ANALYZER_PERF_LOG is set
+if os.environ.get("ANALYZER_PERF_LOG"):
+    instrumentation.configure_logging()
+# Prometheus metrics on a local port when ANALYZER_METRICS_PORT is set (started once per process)
+if os.environ.get("ANALYZER_METRICS_PORT"):
+    analyzer_metrics.start_http_server(int(os.environ["ANALYZER_METRICS_PORT"]))
 
 # Configure page
 st.set_page_config(
@@ -32,22 +201,34 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Timings of every parser stage and helper call in this render
+perf_records = instrumentation.start_collection()
+run_ctx = get_script_run_ctx()
+if run_ctx is not None:
+    analyzer_metrics.touch_session(run_ctx.session_id)
+
 st.title("💬 WhatsApp Chat Analyzer")
 st.markdown("### Analyze your WhatsApp chat exports with detailed insights and visualizations")
 
 # Sidebar for file upload
 st.sidebar.title("📁 Upload Chat File")
 st.sidebar.markdown("Export your WhatsApp chat as a text file or zip and upload it here.")
-uploaded_file = st.sidebar.file_uploader(
-    "Choose a WhatsApp chat text or zip file", 
-    type=['txt', 'zip'],
-    help="Export chat from WhatsApp and select the .txt or .zip file"
-)
+mode = st.sidebar.radio("Mode", ["Single chat", "Compare chats"], horizontal=True)
+if mode == "Compare chats":
+    compare_chats_page()
+    uploaded_file = None
+else:
+    uploaded_file = st.sidebar.file_uploader(
+        "Choose a WhatsApp chat text or zip file", 
+        type=['txt', 'zip'],
+        help="Export chat from WhatsApp and select the .txt or .zip file"
+    )
 if uploaded_file is not None:
     try:
+        # getvalue() shares the upload's buffer; only the zip directory is read here
         if uploaded_file.name.endswith('.zip'):
             with zipfile.ZipFile(io.BytesIO(uploaded_file.getvalue())) as z:
-                txt_files = [f for f in z.namelist() if f.lower().endswith('.txt')]
+                txt_files = loader.chat_members(z)
                 if not txt_files:
                     st.error("❌ No .txt file found in the uploaded .zip archive.")
                     st.stop()
@@ -58,15 +239,20 @@ if uploaded_file is not None:
                     )
                 else:
                     txt_choice = txt_files[0]
-                with z.open(txt_choice) as txt_file:
-                    data = txt_file.read().decode("utf-8")
+                media_files = media_inventory(uploaded_file.file_id, z)
         else:
-            bytes_data = uploaded_file.getvalue()
-            data = bytes_data.decode("utf-8")
+            txt_choice = None
+            media_files = None
+        upload_key = (uploaded_file.file_id, txt_choice)
+        # The chat text is decompressed and decoded chunk by chunk as the parser reads it
+        data = loader.TextStream(uploaded_file.getvalue(), txt_choice)
         
-        # Process the chat data
-        with st.spinner("Processing chat data..."):
-            df = preprocessor.preprocess(data)
+        # Process the chat data (once per upload)
+        parsed_chat = st.session_state.get("parsed_chat")
+        if parsed_chat is not None and parsed_chat[0] == upload_key:
+            df = parsed_chat[1]
+        else:
+            df = parse_in_background(upload_key, data)
         
         if df.empty:
             st.error("❌ The uploaded file does not contain valid chat data. Please upload a valid WhatsApp chat file.")
@@ -78,11 +264,14 @@ if uploaded_file is not None:
                    "5. Save the .txt or .zip file and upload it here")
             st.stop()
         
+        # Index @mentions once per upload
+        mentions = cached_analysis('extract_mentions', helper.chat_fingerprint(df), df)
+        
         # Success message
         st.success(f"✅ Chat data processed successfully! Found {len(df)} messages.")
         
     except UnicodeDecodeError:
-        st.error("❌ Error reading the file. Please ensure it's a valid text file with UTF-8 encoding.")
+        st.error("❌ Error reading the file. Please ensure it's a valid text file with UTF-8 or UTF-16 encoding.")
         st.stop()
     except zipfile.BadZipFile:
         st.error("❌ The uploaded .zip file is corrupted or not a valid zip archive.")
@@ -116,12 +305,60 @@ if uploaded_file is not None:
     total_users = len([u for u in df["users"].unique() if u not in system_users])
     st.sidebar.info(f"👥 **{total_users}** active users\n\n📅 **{len(df)}** total messages")
     
+    # Analysis window; helpers slice the time-sorted chat by binary search
+    first_day, last_day = df['date'].min().date(), df['date'].max().date()
+    date_range = st.sidebar.date_input(
+        "Date range",
+        value=(first_day, last_day),
+        min_value=first_day,
+        max_value=last_day,
+        help="Limit every analysis to messages in this period"
+    )
+    # The picker returns one date while a range is half-selected
+    range_start = pd.Timestamp(date_range[0]) if date_range else None
+    range_end = pd.Timestamp(date_range[-1]) if date_range else None
+    chat_df = df
+    chat_key = helper.chat_fingerprint(chat_df)
+    # Windows of a fingerprinted chat get their own key
+    df = helper.slice_date_range(chat_df, range_start, range_end)
+    window_key = helper.chat_fingerprint(df)
+    if df.empty:
+        st.warning("⚠️ No messages in the selected date range.")
+        st.stop()
+    
+    session_gap = st.sidebar.number_input(
+        "Conversation gap (minutes)",
+        min_value=5,
+        max_value=1440,
+        value=120,
+        step=5,
+        help="Idle time after which a new conversation session starts"
+    )
+    approximate = st.sidebar.toggle(
+        "≈ Approximate mode",
+        value=len(chat_df) >= sketches.APPROXIMATE_ABOVE,
+        help="Top words, emojis and domains and distinct counts from fixed-memory sketches, with error bounds"
+    )
+    
+    # Save the parsed chat so later sessions can skip parsing
+    if storage.ARROW_AVAILABLE:
+        st.sidebar.download_button(
+            label="💾 Download parsed chat (Parquet)",
+            data=parsed_chat_parquet(chat_df, chat_key),
+            file_name="whatsapp_chat.parquet",
+            mime="application/octet-stream",
+            help="Reload it later with storage.load_chat() instead of re-parsing the export"
+        )
+    
     # Analysis button
-    show_analysis = st.sidebar.button('🚀 Show Detailed Analysis', type="primary")
+    if st.sidebar.button('🚀 Show Detailed Analysis', type="primary"):
+        st.session_state.show_analysis = True
+    # Keep the analysis open while widgets inside it trigger reruns
+    show_analysis = st.session_state.get("show_analysis", False)
     # Top Statistics Section
     if show_analysis:
         try:
-            num_messages, words, media, num_links = helper.fetch_stats(selected_user, df)
+            num_messages, words, media, num_links = cached_analysis('fetch_stats', window_key, df, selected_user)
             
             st.sidebar.markdown("---")
             st.sidebar.markdown(f"**Selected:** {selected_user}")
@@ -166,323 +403,451 @@ if uploaded_file is not None:
         st.info("👆 Click 'Show Detailed Analysis' in the sidebar to start the analysis!")
         st.stop()
             
-    # Timeline Analysis Section
-    st.title("📈 Timeline Analysis")
+    def analysis(name, *args, **kwargs):
+        # helper.<name> on the analysis window, cached across reruns
+        return cached_analysis(name, window_key, df, *args, **kwargs)
+
+    def timeline_note(timeline):
+        # Long chats are plotted per week, month, ... with each point the period's exact total
+        resolution = helper.timeline_resolution(timeline)
+        if resolution != 'day':
+            st.caption(f"{len(timeline):,} points, one per {resolution}; each is the exact total for its {resolution}.")
+        return resolution
+
+    def approximate_note(overcount, distinct=None):
+        # Approximate numbers are always labelled, with their error bound
+        if overcount:
+            note = f"≈ Approximate: each count may be overstated by at most {overcount:,}."
+        else:
+            note = "≈ Approximate mode: every distinct item fit the sketch, so these counts are exact."
+        if distinct is not None:
+            label, (estimate, error) = distinct
+            note += f" {label}: ≈ {estimate:,} (±{error:.1%} standard error)."
+        st.caption(note)
+
+    # Searching reruns only this fragment, not the analyses below
+    @st.fragment
+    def search_section():
+        # Message Search Section
+        st.title("🔎 Search Messages")
+        search_query = st.text_input(
+            "Search messages",
+            placeholder='e.g. party "see you"',
+            help="All words must appear; wrap phrases in double quotes. Uses the sidebar date range."
+        )
+        if search_query:
+            try:
+                hits = search.search_messages(
+                    chat_df, search_query, selected_user=selected_user,
+                    start=range_start, end=range_end, limit=100
+                )
+                if not hits.empty:
+                    st.dataframe(hits, use_container_width=True)
+                else:
+                    st.info("No messages match your search.")
+            except Exception as e:
+                st.error(f"❌ Error searching messages: {str(e)}")
+
+    search_section()
+
+    @st.fragment
+    def timelines_section():
+        # Timeline Analysis Section
+        st.title("📈 Timeline Analysis")
     
-    col1, col2 = st.columns(2)
+        col1, col2 = st.columns(2)
     
-    with col1:
-        st.subheader("📅 Monthly Timeline")
-        try:
-            timeline = helper.monthly_timeline(selected_user, df)
-            if not timeline.empty:
-                fig = px.line(
-                    timeline, 
-                    x='time', 
-                    y='message', 
-                    labels={'time': 'Month-Year', 'message': 'Total Messages'},
-                    title=f"Monthly Activity - {selected_user}",
-                    markers=True
-                )
-                fig.update_xaxes(tickangle=45)
-                fig.update_layout(hovermode='x unified')
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.info("📊 No data available for monthly timeline.")
-        except Exception as e:
-            st.error(f"❌ Error generating monthly timeline: {str(e)}")
+        with col1:
+            st.subheader("📅 Monthly Timeline")
+            try:
+                timeline = analysis('monthly_timeline', selected_user)
+                if not timeline.empty:
+                    fig = px.line(
+                        timeline, 
+                        x='time', 
+                        y='message', 
+                        labels={'time': 'Month-Year', 'message': 'Total Messages'},
+                        title=f"Monthly Activity - {selected_user}",
+                        markers=True
+                    )
+                    fig.update_xaxes(tickangle=45)
+                    fig.update_layout(hovermode='x unified')
+                    st.plotly_chart(fig, use_container_width=True)
+                else:
+                    st.info("📊 No data available for monthly timeline.")
+            except Exception as e:
+                st.error(f"❌ Error generating monthly timeline: {str(e)}")
     
-    with col2:
-        st.subheader("📊 Daily Timeline")
-        try:
-            daily_timeline = helper.daily_timeline(selected_user, df)
-            if not daily_timeline.empty:
-                fig = px.line(
-                    daily_timeline, 
-                    x='specific_date', 
-                    y='message', 
-                    labels={'specific_date': 'Date', 'message': 'Messages'},
-                    title=f"Daily Activity - {selected_user}",
-                    color_discrete_sequence=['green']
-                )
-                fig.update_xaxes(tickangle=45)
-                fig.update_layout(hovermode='x unified')
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.info("📊 No data available for daily timeline.")
-        except Exception as e:
-            st.error(f"❌ Error generating daily timeline: {str(e)}")
+        with col2:
+            st.subheader("📊 Daily Timeline")
+            try:
+                daily_timeline = analysis('daily_timeline', selected_user, max_points=helper.TIMELINE_MAX_POINTS)
+                if not daily_timeline.empty:
+                    resolution = timeline_note(daily_timeline)
+                    fig = px.line(
+                        daily_timeline, 
+                        x='specific_date', 
+                        y='message', 
+                        hover_data=['period'],
+                        labels={'specific_date': 'Date', 'message': 'Messages', 'period': resolution.title()},
+                        title=f"Messages per {resolution.title()} - {selected_user}",
+                        color_discrete_sequence=['green']
+                    )
+                    fig.update_xaxes(tickangle=45)
+                    fig.update_layout(hovermode='x unified')
+                    st.plotly_chart(fig, use_container_width=True)
+                else:
+                    st.info("📊 No data available for daily timeline.")
+            except Exception as e:
+                st.error(f"❌ Error generating daily timeline: {str(e)}")
 
-    # Activity Maps Section
-    st.title("🗓️ Activity Patterns")
+    @st.fragment
+    def activity_section():
+        # Activity Maps Section
+        st.title("🗓️ Activity Patterns")
     
-    col1, col2 = st.columns(2)
+        col1, col2 = st.columns(2)
     
-    with col1:
-        st.subheader("📅 Most Active Days")
-        try:
-            busy_day = helper.week_activity_map(selected_user, df)
-            if not busy_day.empty:
-                fig = px.bar(
-                    x=busy_day.index, 
-                    y=busy_day.values, 
-                    labels={'x': 'Day of Week', 'y': 'Message Count'},
-                    title=f"Weekly Activity - {selected_user}",
-                    color=busy_day.values,
-                    color_continuous_scale='Blues'
-                )
-                fig.update_xaxes(tickangle=45)
-                st.plotly_chart(fig, use_container_width=True)
+        with col1:
+            st.subheader("📅 Most Active Days")
+            try:
+                busy_day = analysis('week_activity_map', selected_user)
+                if not busy_day.empty:
+                    fig = px.bar(
+                        x=busy_day.index, 
+                        y=busy_day.values, 
+                        labels={'x': 'Day of Week', 'y': 'Message Count'},
+                        title=f"Weekly Activity - {selected_user}",
+                        color=busy_day.values,
+                        color_continuous_scale='Blues'
+                    )
+                    fig.update_xaxes(tickangle=45)
+                    st.plotly_chart(fig, use_container_width=True)
                 
-                # Show peak day
-                peak_day = busy_day.idxmax()
-                peak_count = busy_day.max()
-                st.info(f"📈 Peak day: **{peak_day}** with {peak_count:,} messages")
-            else:
-                st.info("📊 No data for weekly activity.")
-        except Exception as e:
-            st.error(f"❌ Error generating weekly activity: {str(e)}")
+                    # Show peak day
+                    peak_day = busy_day.idxmax()
+                    peak_count = busy_day.max()
+                    st.info(f"📈 Peak day: **{peak_day}** with {peak_count:,} messages")
+                else:
+                    st.info("📊 No data for weekly activity.")
+            except Exception as e:
+                st.error(f"❌ Error generating weekly activity: {str(e)}")
+    
+        with col2:
+            st.subheader("📆 Most Active Months")
+            try:
+                busy_month = analysis('month_activity_map', selected_user)
+                if not busy_month.empty:
+                    fig = px.bar(
+                        x=busy_month.index, 
+                        y=busy_month.values, 
+                        labels={'x': 'Month', 'y': 'Message Count'},
+                        title=f"Monthly Activity - {selected_user}",
+                        color=busy_month.values,
+                        color_continuous_scale='Reds'
+                    )
+                    fig.update_xaxes(tickangle=45)
+                    st.plotly_chart(fig, use_container_width=True)
+                
+                    # Show peak month
+                    peak_month = busy_month.idxmax()
+                    peak_count = busy_month.max()
+                    st.info(f"📈 Peak month: **{peak_month}** with {peak_count:,} messages")
+                else:
+                    st.info("📊 No data for monthly activity.")
+            except Exception as e:
+                st.error(f"❌ Error generating monthly activity: {str(e)}")
+
+        # Activity Heatmap Section
+        st.title("🔥 Activity Heatmap")
+        st.markdown("**Hourly activity patterns throughout the week**")
     
-    with col2:
-        st.subheader("📆 Most Active Months")
         try:
-            busy_month = helper.month_activity_map(selected_user, df)
-            if not busy_month.empty:
-                fig = px.bar(
-                    x=busy_month.index, 
-                    y=busy_month.values, 
-                    labels={'x': 'Month', 'y': 'Message Count'},
-                    title=f"Monthly Activity - {selected_user}",
-                    color=busy_month.values,
-                    color_continuous_scale='Reds'
+            user_heatmap = analysis('activity_heatmap', selected_user)
+        
+            if user_heatmap.empty or user_heatmap.isnull().values.all():
+                st.warning("⚠️ No data available to generate the heatmap.")
+            else:
+                fig, ax = plt.subplots(figsize=(12, 6))
+                sns.heatmap(
+                    user_heatmap, 
+                    annot=True, 
+                    fmt='g', 
+                    cmap='YlOrRd',
+                    cbar_kws={'label': 'Number of Messages'},
+                    ax=ax
                 )
-                fig.update_xaxes(tickangle=45)
-                st.plotly_chart(fig, use_container_width=True)
+                ax.set_title(f'Activity Heatmap - {selected_user}', fontsize=16, pad=20)
+                ax.set_xlabel('Time Period', fontsize=12)
+                ax.set_ylabel('Day of Week', fontsize=12)
+                plt.xticks(rotation=45)
+                plt.tight_layout()
+                st.pyplot(fig)
+            
+                # Additional insights
+                if not user_heatmap.empty:
+                    max_activity = user_heatmap.max().max()
+                    max_pos = user_heatmap.stack().idxmax()
+                    st.info(f"🔥 Peak activity at **{max_pos}** with {max_activity:.0f} messages")
                 
-                # Show peak month
-                peak_month = busy_month.idxmax()
-                peak_count = busy_month.max()
-                st.info(f"📈 Peak month: **{peak_month}** with {peak_count:,} messages")
-            else:
-                st.info("📊 No data for monthly activity.")
         except Exception as e:
-            st.error(f"❌ Error generating monthly activity: {str(e)}")
+            st.error(f"❌ Error generating heatmap: {str(e)}")
 
-    # Activity Heatmap Section
-    st.title("🔥 Activity Heatmap")
-    st.markdown("**Hourly activity patterns throughout the week**")
-    
-    try:
-        user_heatmap = helper.activity_heatmap(selected_user, df)
+    @st.fragment
+    def users_section():
+        # Most Active Users (Only for Overall view)
+        if selected_user == "Overall":
+            st.title("👥 Most Active Users")
         
-        if user_heatmap.empty or user_heatmap.isnull().values.all():
-            st.warning("⚠️ No data available to generate the heatmap.")
-        else:
-            fig, ax = plt.subplots(figsize=(12, 6))
-            sns.heatmap(
-                user_heatmap, 
-                annot=True, 
-                fmt='g', 
-                cmap='YlOrRd',
-                cbar_kws={'label': 'Number of Messages'},
-                ax=ax
-            )
-            ax.set_title(f'Activity Heatmap - {selected_user}', fontsize=16, pad=20)
-            ax.set_xlabel('Time Period', fontsize=12)
-            ax.set_ylabel('Day of Week', fontsize=12)
-            plt.xticks(rotation=45)
-            plt.tight_layout()
-            st.pyplot(fig)
+            try:
+                x, new_df = analysis('most_busy_user')
             
-            # Additional insights
-            if not user_heatmap.empty:
-                max_activity = user_heatmap.max().max()
-                max_pos = user_heatmap.stack().idxmax()
-                st.info(f"🔥 Peak activity at **{max_pos}** with {max_activity:.0f} messages")
+                if not x.empty and not new_df.empty:
+                    col1, col2 = st.columns(2)
                 
-    except Exception as e:
-        st.error(f"❌ Error generating heatmap: {str(e)}")
-    # Most Active Users (Only for Overall view)
-    if selected_user == "Overall":
-        st.title("👥 Most Active Users")
-        
+                    with col1:
+                        st.subheader("📊 User Activity")
+                        fig = px.bar(
+                            x=x.index, 
+                            y=x.values, 
+                            labels={'x': 'User', 'y': 'Message Count'},
+                            title="Most Active Users",
+                            color=x.values,
+                            color_continuous_scale='viridis'
+                        )
+                        fig.update_xaxes(tickangle=45)
+                        st.plotly_chart(fig, use_container_width=True)
+                
+                    with col2:
+                        st.subheader("📈 Activity Percentage")
+                        # Create a pie chart for better visualization
+                        fig_pie = px.pie(
+                            new_df.head(10), 
+                            values='Percent', 
+                            names='Name',
+                            title="Chat Contribution %"
+                        )
+                        st.plotly_chart(fig_pie, use_container_width=True)
+                
+                    # Display table with better formatting
+                    st.subheader("📋 Detailed Statistics")
+                    st.dataframe(
+                        new_df.style.format({'Percent': '{:.1f}%'}),
+                        use_container_width=True
+                    )
+                else:
+                    st.info("📊 No user activity data available.")
+                
+            except Exception as e:
+                st.error(f"❌ Error analyzing user activity: {str(e)}")
+        # Mentions Section
+        st.title("📣 Mentions")
         try:
-            x, new_df = helper.most_busy_user(df)
-            
-            if not x.empty and not new_df.empty:
+            mention_counts = helper.mention_summary(selected_user, mentions, start=range_start, end=range_end)
+            if not mention_counts.empty:
                 col1, col2 = st.columns(2)
-                
+            
                 with col1:
-                    st.subheader("📊 User Activity")
-                    fig = px.bar(
-                        x=x.index, 
-                        y=x.values, 
-                        labels={'x': 'User', 'y': 'Message Count'},
-                        title="Most Active Users",
-                        color=x.values,
-                        color_continuous_scale='viridis'
-                    )
-                    fig.update_xaxes(tickangle=45)
+                    st.subheader("Most Mentioned Users" if selected_user == "Overall" else f"Mentioned by {selected_user}")
+                    fig = px.bar(mention_counts.head(15), y='User', x='Mentions', orientation='h',
+                                 labels={'User': 'User', 'Mentions': 'Times Mentioned'},
+                                 title='Top Mentioned Users', color='Mentions', color_continuous_scale='purples')
+                    fig.update_layout(yaxis={'categoryorder': 'total ascending'})
                     st.plotly_chart(fig, use_container_width=True)
-                
+            
                 with col2:
-                    st.subheader("📈 Activity Percentage")
-                    # Create a pie chart for better visualization
-                    fig_pie = px.pie(
-                        new_df.head(10), 
-                        values='Percent', 
-                        names='Name',
-                        title="Chat Contribution %"
-                    )
-                    st.plotly_chart(fig_pie, use_container_width=True)
-                
-                # Display table with better formatting
-                st.subheader("📋 Detailed Statistics")
+                    st.subheader("Mention Pairs")
+                    pairs = helper.mention_matrix(mentions, start=range_start, end=range_end)
+                    if selected_user != "Overall":
+                        pairs = pairs[(pairs['mentioner'] == selected_user) | (pairs['mentioned'] == selected_user)]
+                    st.dataframe(pairs.head(50), use_container_width=True)
+            
+                # Drill down into the messages behind a mention
+                mentioned_user = st.selectbox("Show messages mentioning", mention_counts['User'].tolist())
+                mentioner = None if selected_user == "Overall" else selected_user
                 st.dataframe(
-                    new_df.style.format({'Percent': '{:.1f}%'}),
+                    helper.mention_messages(chat_df, helper.slice_date_range(mentions, range_start, range_end),
+                                            mentioner=mentioner, mentioned=mentioned_user).head(200),
                     use_container_width=True
                 )
             else:
-                st.info("📊 No user activity data available.")
-                
+                st.info("No @mentions found.")
         except Exception as e:
-            st.error(f"❌ Error analyzing user activity: {str(e)}")
-    # Word Analysis Section
-    st.title("📝 Word Analysis")
+            st.error(f"❌ Error analyzing mentions: {str(e)}")
+
+    @st.fragment
+    def words_section():
+        # Word Analysis Section
+        st.title("📝 Word Analysis")
     
-    col1, col2 = st.columns(2)
+        col1, col2 = st.columns(2)
     
-    with col1:
-        try:
-            df_wc = helper.create_wordcloud(selected_user, df)
-            if df_wc is None:
-                st.warning("⚠️ No data available to generate the word cloud.")
-                st.info("💡 This could be because:\n"
-                       "- All messages are media files\n"
-                       "- Messages contain only stop words\n"
-                       "- No valid text content found")
-            else:
-                fig, ax = plt.subplots(figsize=(10, 6))
-                ax.imshow(df_wc, interpolation='bilinear')
-                ax.axis("off")
-                st.pyplot(fig)
-        except Exception as e:
-            st.error(f"❌ Error generating word cloud: {str(e)}")
+        with col1:
+            try:
+                wc_placeholder = st.empty()
+                if not helper.wordcloud_cached(selected_user, df):
+                    # Show a quick low-resolution preview while the full cloud renders
+                    preview_wc = helper.create_wordcloud(selected_user, df, preview=True)
+                    if preview_wc is not None:
+                        wc_placeholder.image(preview_wc.to_array(), use_container_width=True)
+                df_wc = helper.create_wordcloud(selected_user, df)
+                if df_wc is None:
+                    st.warning("⚠️ No data available to generate the word cloud.")
+                    st.info("💡 This could be because:\n"
+                           "- All messages are media files\n"
+                           "- Messages contain only stop words\n"
+                           "- No valid text content found")
+                else:
+                    wc_placeholder.image(df_wc.to_array(), use_container_width=True)
+            except Exception as e:
+                st.error(f"❌ Error generating word cloud: {str(e)}")
     
-    with col2:
-        st.subheader("📊 Most Common Words")
-        try:
-            most_common_df = helper.most_common_words(selected_user, df)
-            if not most_common_df.empty:
-                fig = px.bar(
-                    most_common_df.head(15), 
-                    y='Word', 
-                    x='Frequency', 
-                    orientation='h',
-                    labels={'Word': 'Word', 'Frequency': 'Count'},
-                    title=f"Top 15 Words - {selected_user}",
-                    color='Frequency',
-                    color_continuous_scale='blues'
-                )
-                fig.update_layout(yaxis={'categoryorder': 'total ascending'})
-                st.plotly_chart(fig, use_container_width=True)
+        with col2:
+            st.subheader("📊 Most Common Words" + (" (≈)" if approximate else ""))
+            try:
+                if approximate:
+                    sketch = cached_sketch(window_key, df, selected_user)
+                    most_common_df = sketch.most_common_words()
+                    approximate_note(sketch.error_bounds()['words'], ("Distinct words", sketch.vocabulary_size()))
+                else:
+                    most_common_df = analysis('most_common_words', selected_user)
+                if not most_common_df.empty:
+                    fig = px.bar(
+                        most_common_df.head(15), 
+                        y='Word', 
+                        x='Frequency', 
+                        orientation='h',
+                        labels={'Word': 'Word', 'Frequency': 'Count'},
+                        title=f"Top 15 Words - {selected_user}",
+                        color='Frequency',
+                        color_continuous_scale='blues'
+                    )
+                    fig.update_layout(yaxis={'categoryorder': 'total ascending'})
+                    st.plotly_chart(fig, use_container_width=True)
                 
-                # Show top 3 words
-                top_words = most_common_df.head(3)
-                st.info(f"🔝 Top words: **{', '.join(top_words['Word'].tolist())}**")
-            else:
-                st.info("📊 No common words data to display.")
-        except Exception as e:
-            st.error(f"❌ Error analyzing common words: {str(e)}")
-    
-    # Sentiment Analysis Section
-    st.title("📊 Sentiment Analysis")
+                    # Show top 3 words
+                    top_words = most_common_df.head(3)
+                    st.info(f"🔝 Top words: **{', '.join(top_words['Word'].tolist())}**")
+                else:
+                    st.info("📊 No common words data to display.")
+            except Exception as e:
+                st.error(f"❌ Error analyzing common words: {str(e)}")
+
+    @st.fragment
+    def sentiment_section():
+        # Sentiment Analysis Section
+        st.title("📊 Sentiment Analysis")
     
-    # Sentiment Summary
-    sentiment_summary = helper.sentiment_summary(selected_user, df)
-    if not sentiment_summary.empty:
-        col1, col2 = st.columns(2)
+        # Sentiment Summary
+        sentiment_summary = analysis('sentiment_summary', selected_user)
+        if not sentiment_summary.empty:
+            col1, col2 = st.columns(2)
         
-        with col1:
-            st.subheader("Sentiment Distribution")
-            fig = px.pie(sentiment_summary, values='Count', names='Sentiment', title='Sentiment Distribution',
-                         color_discrete_map={'Positive':'green', 'Negative':'red', 'Neutral':'blue'})
-            st.plotly_chart(fig)
+            with col1:
+                st.subheader("Sentiment Distribution")
+                fig = px.pie(sentiment_summary, values='Count', names='Sentiment', title='Sentiment Distribution',
+                             color_discrete_map={'Positive':'green', 'Negative':'red', 'Neutral':'blue'})
+                st.plotly_chart(fig)
         
-        with col2:
-            st.subheader("Sentiment Summary")
-            st.dataframe(sentiment_summary)
-    
-    # Emotion Timeline
-    st.subheader("Sentiment Over Time")
-    emotion_timeline = helper.emotion_timeline(selected_user, df)
-    if not emotion_timeline.empty:
-        # Melt the DataFrame for Plotly Express
-        plot_df = emotion_timeline.melt(id_vars=['specific_date'], value_vars=['Positive', 'Negative', 'Neutral'],
-                                        var_name='Sentiment', value_name='Message Count')
-        fig = px.line(plot_df, x='specific_date', y='Message Count', color='Sentiment',
-                      title='Sentiment Over Time', markers=True,
-                      labels={'specific_date': 'Date', 'Message Count': 'Number of Messages'},
-                      color_discrete_map={'Positive':'green', 'Negative':'red', 'Neutral':'blue'})
-        fig.update_xaxes(tickangle=45)
-        st.plotly_chart(fig)
-    else:
-        st.info("No data for sentiment over time.")
+            with col2:
+                st.subheader("Sentiment Summary")
+                st.dataframe(sentiment_summary)
     
-    # Emoji Analysis
-    st.title("😊 Emoji Analysis")
-    emoji_df = helper.emoji_analysis(selected_user, df)
-    if not emoji_df.empty:
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.subheader("Most Used Emojis")
-            fig = px.bar(emoji_df.head(10), y='Emoji', x='Count', orientation='h',
-                         labels={'Emoji': 'Emoji', 'Count': 'Frequency'}, title='Top 10 Emojis'
-            )
-            fig.update_layout(yaxis={'categoryorder':'total ascending'})
+        # Emotion Timeline
+        st.subheader("Sentiment Over Time")
+        emotion_timeline = analysis('emotion_timeline', selected_user, max_points=helper.TIMELINE_MAX_POINTS)
+        if not emotion_timeline.empty:
+            resolution = timeline_note(emotion_timeline)
+            # Melt the DataFrame for Plotly Express
+            sentiments = [name for name in ['Positive', 'Negative', 'Neutral'] if name in emotion_timeline]
+            plot_df = emotion_timeline.melt(id_vars=['specific_date', 'period'], value_vars=sentiments,
+                                            var_name='Sentiment', value_name='Message Count')
+            fig = px.line(plot_df, x='specific_date', y='Message Count', color='Sentiment',
+                          title='Sentiment Over Time', markers=True, hover_data=['period'],
+                          labels={'specific_date': 'Date', 'Message Count': 'Number of Messages',
+                                  'period': resolution.title()},
+                          color_discrete_map={'Positive':'green', 'Negative':'red', 'Neutral':'blue'})
+            fig.update_xaxes(tickangle=45)
             st.plotly_chart(fig)
+        else:
+            st.info("No data for sentiment over time.")
+
+    @st.fragment
+    def messages_section():
+        # Emoji Analysis
+        st.title("😊 Emoji Analysis")
+        if approximate:
+            sketch = cached_sketch(window_key, df, selected_user)
+            emoji_df = sketch.emoji_analysis()
+            approximate_note(sketch.error_bounds()['emojis'])
+        else:
+            emoji_df = analysis('emoji_analysis', selected_user)
+        if not emoji_df.empty:
+            col1, col2 = st.columns(2)
         
-        with col2:
-            st.subheader("Emoji Usage Statistics")
-            st.dataframe(emoji_df.head(10))
+            with col1:
+                st.subheader("Most Used Emojis")
+                fig = px.bar(emoji_df.head(10), y='Emoji', x='Count', orientation='h',
+                             labels={'Emoji': 'Emoji', 'Count': 'Frequency'}, title='Top 10 Emojis'
+                )
+                fig.update_layout(yaxis={'categoryorder':'total ascending'})
+                st.plotly_chart(fig)
+        
+            with col2:
+                st.subheader("Emoji Usage Statistics")
+                st.dataframe(emoji_df.head(10))
     
-    # Message Length Analysis
-    st.title("📝 Message Patterns")
-    message_stats = helper.message_length_analysis(selected_user, df)
-    if not message_stats.empty:
-        col1, col2 = st.columns(2)
+        # Message Length Analysis
+        st.title("📝 Message Patterns")
+        length_bins = st.slider("Message length bins", 10, 100, 30, step=5, key="length_bins")
+        lengths = analysis('message_length_distribution', selected_user, bins=length_bins)
+        if lengths['count']:
+            quantiles = lengths['quantiles']
+            st.caption(f"{lengths['count']:,} messages · median {quantiles[0.5]:.0f} · "
+                       f"90th percentile {quantiles[0.9]:.0f} · 99th percentile {quantiles[0.99]:.0f} characters")
+            col1, col2 = st.columns(2)
         
-        with col1:
-            st.subheader("Average Message Length by User")
-            if selected_user == "Overall":
-                avg_length = message_stats.groupby('users')['message_length'].mean().sort_values(ascending=False)
-                if not avg_length.empty:
-                    fig = px.bar(avg_length.head(10), x=avg_length.head(10).index, y=avg_length.head(10).values,
-                                 labels={'index': 'User', 'y': 'Average Characters'},
-                                 title='Average Message Length by User')
-                    fig.update_xaxes(tickangle=45)
-                    st.plotly_chart(fig)
-                else:
-                    st.info("No data for average message length by user.")
+            with col1:
+                st.subheader("Average Message Length by User")
+                if selected_user == "Overall":
+                    avg_length = lengths['box'].set_index('group')['mean'].sort_values(ascending=False)
+                    if not avg_length.empty:
+                        fig = px.bar(avg_length.head(10), x=avg_length.head(10).index, y=avg_length.head(10).values,
+                                     labels={'index': 'User', 'y': 'Average Characters'},
+                                     title='Average Message Length by User')
+                        fig.update_xaxes(tickangle=45)
+                        st.plotly_chart(fig)
+                    else:
+                        st.info("No data for average message length by user.")
         
-        with col2:
-            st.subheader("Message Length Distribution")
-            fig = px.histogram(message_stats, x='message_length', nbins=30,
-                               labels={'message_length': 'Message Length (characters)', 'count': 'Frequency'},
-                               title='Message Length Distribution')
-            st.plotly_chart(fig)
-    
-    # Response Time Analysis (only for Overall view)
-    if selected_user == "Overall":
+            with col2:
+                st.subheader("Message Length Distribution")
+                st.plotly_chart(histogram_figure(lengths['histogram'], 'Message Length (characters)',
+                                                 'Message Length Distribution'))
+
+            if selected_user == "Overall":
+                st.subheader("Message Length Spread by User")
+                st.plotly_chart(box_figure(lengths['box'], 'Message Length (characters)', 'Busiest 10 Members'))
+
+    @st.fragment
+    def conversations_section():
+        # Response times, starters and sessions compare members, so they need the whole group
+        if selected_user != "Overall":
+            st.info("👥 Select 'Overall' to compare response times, conversation starters and sessions.")
+            return
+
         st.title("⚡ Response Time Analysis")
-        response_times = helper.response_time_analysis(df)
-        if not response_times.empty:
+        response_bins = st.slider("Response time bins", 10, 100, 20, step=5, key="response_bins")
+        responses = analysis('response_time_distribution', bins=response_bins)
+        if responses['count']:
+            quantiles = responses['quantiles']
+            st.caption(f"{responses['count']:,} replies · median {quantiles[0.5]:.1f} · "
+                       f"90th percentile {quantiles[0.9]:.1f} · 99th percentile {quantiles[0.99]:.1f} minutes")
             col1, col2 = st.columns(2)
-            
+
             with col1:
                 st.subheader("Average Response Time by User")
-                avg_response = response_times.groupby('responder')['response_time_minutes'].mean().sort_values()
+                avg_response = responses['box'].set_index('group')['mean'].sort_values()
                 if not avg_response.empty:
                     fig = px.bar(avg_response, y=avg_response.index, x=avg_response.values, orientation='h',
                                  labels={'index': 'User', 'x': 'Average Response Time (minutes)'})
@@ -490,487 +855,210 @@ if uploaded_file is not None:
                     st.plotly_chart(fig)
                 else:
                     st.info("No data for average response time.")
-            
+
             with col2:
                 st.subheader("Response Time Distribution")
-                fig = px.histogram(response_times, x='response_time_minutes', nbins=20,
-                                   labels={'response_time_minutes': 'Response Time (minutes)', 'count': 'Frequency'},
-                                   title='Response Time Distribution', color_discrete_sequence=['lightcoral'])
-                st.plotly_chart(fig)
-        
+                st.plotly_chart(histogram_figure(responses['histogram'], 'Response Time (minutes)',
+                                                 'Response Time Distribution', color='lightcoral'))
+
+            st.subheader("Response Time Spread by User")
+            st.plotly_chart(box_figure(responses['box'], 'Response Time (minutes)', 'Busiest 10 Responders'))
+
         # Conversation Starters
         st.title("🚀 Conversation Starters")
-        starters = helper.conversation_starters(df)
+        sessions = analysis('build_sessions', gap_minutes=session_gap)
+        starters = helper.conversation_starters(df, sessions=sessions)
         if not starters.empty:
             col1, col2 = st.columns(2)
-            
+
             with col1:
                 st.subheader("Who Starts Conversations Most?")
                 fig = px.pie(starters, values='Conversations_Started', names='User',
                              title='Conversation Starters')
                 st.plotly_chart(fig)
-            
+
             with col2:
                 st.subheader("Conversation Starter Statistics")
                 st.dataframe(starters)
-    
-    # URL Analysis Section
-    st.title("🔗 URL Analysis")
-    url_analysis_df = helper.analyze_urls(selected_user, df)
-    if not url_analysis_df.empty:
+
+        # Conversation Sessions
+        st.title("🧵 Conversation Sessions")
+        if not sessions.empty:
+            col1, col2 = st.columns(2)
+
+            with col1:
+                st.subheader("Sessions Per Day")
+                per_day = helper.sessions_per_day(df, sessions=sessions, max_points=helper.TIMELINE_MAX_POINTS)
+                resolution = timeline_note(per_day)
+                fig = px.line(per_day, x='specific_date', y='sessions', hover_data=['period'],
+                              labels={'specific_date': 'Date', 'sessions': 'Sessions', 'period': resolution.title()},
+                              title=f'Sessions Per {resolution.title()}', color_discrete_sequence=['purple'])
+                fig.update_xaxes(tickangle=45)
+                st.plotly_chart(fig)
+
+            with col2:
+                st.subheader("Session Length Distribution")
+                lengths = helper.session_length_distribution(df, sessions=sessions)
+                binned = helper.binned_distribution(lengths['message_count'], bins=30)
+                st.plotly_chart(histogram_figure(binned['histogram'], 'Messages per Session',
+                                                 'Session Length Distribution', ylabel='Sessions'))
+
+            st.info(f"🧵 **{len(sessions):,}** sessions, averaging "
+                    f"{sessions['message_count'].mean():.1f} messages and "
+                    f"{sessions['duration_minutes'].mean():.0f} minutes")
+        else:
+            st.info("No conversation sessions found.")
+
+    @st.fragment
+    def urls_section():
+        # URL Analysis Section
+        st.title("🔗 URL Analysis")
+        if approximate:
+            sketch = cached_sketch(window_key, df, selected_user)
+            url_analysis_df = sketch.analyze_urls()
+            approximate_note(sketch.error_bounds()['domains'], ("Distinct links", sketch.unique_links()))
+        else:
+            url_analysis_df = analysis('analyze_urls', selected_user)
+        if not url_analysis_df.empty:
+            col1, col2 = st.columns(2)
+            with col1:
+                st.subheader("Top Shared Domains")
+                # Display top 10 domains
+                fig = px.bar(url_analysis_df.head(10), y='Domain', x='Count', orientation='h',
+                             labels={'Domain': 'Domain', 'Count': 'Times Shared'}, title='Top 10 Shared Domains')
+                fig.update_layout(yaxis={'categoryorder':'total ascending'})
+                st.plotly_chart(fig)
+            with col2:
+                st.subheader("Domain Share Statistics")
+                st.dataframe(url_analysis_df)
+        else:
+            st.info("No URLs found or no data to analyze for URLs.")
+
+    @st.fragment
+    def media_section():
+        # Attachments of an export "with media", sized from the zip directory
+        st.title("📎 Shared Media")
+        shared = cached_attachments(window_key, df)
+        if selected_user != "Overall":
+            shared = shared[shared['users'] == selected_user]
+        if shared.empty:
+            st.info("No attached files in this period.")
+            return
+        by_user = chat_media.usage_by_user(shared, media_files)
+        col1, col2, col3 = st.columns(3)
+        col1.metric("📎 Files Shared", f"{len(shared):,}")
+        col2.metric("💾 Total Size", f"{by_user['bytes'].sum() / 1e6:,.1f} MB")
+        col3.metric("❓ Missing From Zip", f"{int(by_user['missing'].sum()):,}",
+                    help="Attachments mentioned in the chat but not included in the export")
+
         col1, col2 = st.columns(2)
         with col1:
-            st.subheader("Top Shared Domains")
-            # Display top 10 domains
-            fig = px.bar(url_analysis_df.head(10), y='Domain', x='Count', orientation='h',
-                         labels={'Domain': 'Domain', 'Count': 'Times Shared'}, title='Top 10 Shared Domains')
-            fig.update_layout(yaxis={'categoryorder':'total ascending'})
+            st.subheader("Media by Type")
+            by_type = by_user.groupby('type', as_index=False)[['files', 'bytes']].sum()
+            fig = px.pie(by_type, values='files', names='type', title='Files Shared by Type')
             st.plotly_chart(fig)
         with col2:
-            st.subheader("Domain Share Statistics")
-            st.dataframe(url_analysis_df)
-    else:
-        st.info("No URLs found or no data to analyze for URLs.")
-    
-    # Chat Insights Summary
-    st.title("📈 Chat Insights Summary")
+            st.subheader("Size by Type")
+            fig = px.bar(by_type, x='type', y='bytes', labels={'type': 'Type', 'bytes': 'Bytes in Zip'},
+                         title='Storage by Type')
+            st.plotly_chart(fig)
+
+        st.subheader("Media per Member")
+        st.dataframe(by_user, use_container_width=True)
+
+    def summary_section():
+        # Chat Insights Summary
+        st.title("📈 Chat Insights Summary")
     
-    insights = helper.get_chat_insights(selected_user, df)
-    summary_text = helper.export_analysis_summary(selected_user, df)
+        insights = analysis('get_chat_insights', selected_user)
+        summary_text = analysis('export_analysis_summary', selected_user)
     
-    # Display key insights
-    col1, col2, col3 = st.columns(3)
+        # Display key insights
+        col1, col2, col3 = st.columns(3)
     
-    with col1:
-        st.metric("Total Messages", f"{insights.get('total_messages', 0):,}")
-        st.metric("Duration (Days)", insights.get('date_range', {}).get('duration_days', 0))
+        with col1:
+            st.metric("Total Messages", f"{insights.get('total_messages', 0):,}")
+            st.metric("Duration (Days)", insights.get('date_range', {}).get('duration_days', 0))
     
-    with col2:
-        st.metric("Messages/Day", f"{insights.get('avg_messages_per_day', 0):.1f}")
-        st.metric("Peak Day", insights.get('peak_activity', {}).get('day', 'N/A'))
+        with col2:
+            st.metric("Messages/Day", f"{insights.get('avg_messages_per_day', 0):.1f}")
+            st.metric("Peak Day", insights.get('peak_activity', {}).get('day', 'N/A'))
     
-    with col3:
-        st.metric("Peak Hour", f"{insights.get('peak_activity', {}).get('hour', 'N/A')}:00")
-        st.metric("Peak Month", insights.get('peak_activity', {}).get('month', 'N/A'))
+        with col3:
+            st.metric("Peak Hour", f"{insights.get('peak_activity', {}).get('hour', 'N/A')}:00")
+            st.metric("Peak Month", insights.get('peak_activity', {}).get('month', 'N/A'))
     
-    # Exportable summary
-    st.subheader("📄 Exportable Analysis Report")
-    st.text_area("Analysis Summary (Copy to save)", summary_text, height=300)
-
-    # --- PDF Export: Full Report (metrics, charts, summary) ---
-    import tempfile
-    from io import BytesIO
-    from PIL import Image
-    import base64
-
-    def fig_to_img_bytes(fig):
-        buf = BytesIO()
-        fig.savefig(buf, format="png", bbox_inches="tight")
-        buf.seek(0)
-        return buf
-
-    def px_fig_to_img_bytes(px_fig):
-        buf = BytesIO()
-        px_fig.write_image(buf, format="png")
-        buf.seek(0)
-        return buf
-
-    def add_image(pdf, img_bytes, w=180):
-        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-            # Handle both BytesIO objects and raw bytes
-            if hasattr(img_bytes, 'seek'):
-                img_bytes.seek(0)  # Reset buffer position
-                data = img_bytes.read()
-            else:
-                data = img_bytes
-            tmp.write(data)
-            tmp.flush()
-            pdf.image(tmp.name, w=w)
-            # Clean up temp file
-            try:
-                os.unlink(tmp.name)
-            except:
-                pass
+        # Exportable summary
+        st.subheader("📄 Exportable Analysis Report")
+        st.text_area("Analysis Summary (Copy to save)", summary_text, height=300)
 
-    def export_full_pdf(summary_text, chart_imgs, metrics, tables):
-        from fpdf import FPDF, XPos, YPos
-        
-        pdf = FPDF()
-        pdf.add_page()
-        
-        # Try to use Unicode font with fallback to Arial
-        font_found = False
-        font_name = "Arial"  # default fallback
-        
-        try:
-            # First try to find system fonts
-            font_paths = [
-                "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",  # Linux (Debian/Ubuntu)
-                "/usr/share/fonts/TTF/DejaVuSans.ttf",  # Some Linux distros
-                "/usr/share/fonts/dejavu/DejaVuSans.ttf",  # Alpine Linux
-                "/System/Library/Fonts/Arial.ttf",  # macOS
-                "C:/Windows/Fonts/arial.ttf",  # Windows
-            ]
-            
-            for font_path in font_paths:
-                if os.path.exists(font_path):
-                    try:
-                        # Use TrueType font for proper Unicode support
-                        pdf.add_font("CustomFont", "", font_path)
-                        font_name = "CustomFont"
-                        font_found = True
-                        print(f"Successfully loaded Unicode font: {font_path}")
-                        break
-                    except Exception as e:
-                        print(f"Failed to load font {font_path}: {e}")
-                        continue
-            
-            # If no system font found, try to download DejaVu Sans
-            if not font_found:
-                try:
-                    import urllib.request
-                    font_url = "https://github.com/dejavu-fonts/dejavu-fonts/raw/master/ttf/DejaVuSans.ttf"
-                    
-                    with tempfile.NamedTemporaryFile(suffix=".ttf", delete=False) as tmp_font:
-                        print("Downloading DejaVu Sans font for Unicode support...")
-                        urllib.request.urlretrieve(font_url, tmp_font.name)
-                        pdf.add_font("CustomFont", "", tmp_font.name)
-                        font_name = "CustomFont"
-                        font_found = True
-                        print("Unicode font downloaded and loaded successfully")
-                        
-                        # Clean up temp font file after use
-                        try:
-                            os.unlink(tmp_font.name)
-                        except:
-                            pass
-                            
-                except Exception as e:
-                    print(f"Failed to download Unicode font: {e}")
-            
-            if not font_found:
-                print("No Unicode font found, using Arial (limited Unicode support)")
-        except Exception as e:
-            print(f"Font loading error: {e}")
-        
-        pdf.set_font(font_name, size=16)
-        pdf.cell(0, 12, "WhatsApp Chat Analyzer Report", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="C")
-        pdf.ln(2)
-        
-        # Use the determined font name
-        pdf.set_font(font_name, size=12)
-        # Add metrics
-        pdf.cell(0, 10, "Top Statistics:", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-        for label, value in metrics.items():
-            try:
-                # Try to use Unicode text directly
-                text = f"{label}: {str(value)}"
-                pdf.cell(0, 8, text, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-            except Exception as e:
-                # Only fall back to safe encoding if there's an actual error
-                print(f"Warning: Could not display text '{label}: {value}' - {e}")
-                safe_value = str(value).encode('utf-8', 'ignore').decode('utf-8')
-                safe_label = str(label).encode('utf-8', 'ignore').decode('utf-8')
-                pdf.cell(0, 8, f"{safe_label}: {safe_value}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-        pdf.ln(2)
-        
-        # Add summary text
-        pdf.set_font(font_name, size=11)
-        try:
-            pdf.multi_cell(0, 8, summary_text)
-        except Exception as e:
-            # Handle Unicode characters in summary text - use UTF-8 encoding
-            print(f"Warning: Could not display summary text - {e}")
-            safe_summary = summary_text.encode('utf-8', 'ignore').decode('utf-8')
-            pdf.multi_cell(0, 8, safe_summary)
-        pdf.ln(2)
-        
-        # Add tables (as text)
-        for table_title, df in tables.items():
-            pdf.set_font(font_name, size=12)
-            try:
-                pdf.cell(0, 10, table_title, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-            except Exception as e:
-                print(f"Warning: Could not display table title '{table_title}' - {e}")
-                safe_title = table_title.encode('utf-8', 'ignore').decode('utf-8')
-                pdf.cell(0, 10, safe_title, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-            pdf.set_font(font_name, size=9)
-            if not df.empty:
-                # Add table header
-                header = ' | '.join(str(col) for col in df.columns)
+        # --- PDF Export: Full Report (metrics, charts, summary) ---
+        # Built only on request, in a background worker; while it builds the fragment polls it without rerunning the page
+        if PDF_EXPORT_AVAILABLE and summary_text:
+            report_key = report.report_key(selected_user, df, session_gap)
+
+            def pdf_job():
+                if st.session_state.get("pdf_report_key") != report_key:
+                    return None
+                return st.session_state.get("pdf_report")
+
+            job = pdf_job()
+            polling = job is not None and not job.done()
+
+            @st.fragment(run_every=1.0 if polling else None)
+            def pdf_report_panel():
+                future = pdf_job()
+                if future is None:
+                    if not st.button("Generate Full PDF Report"):
+                        return
+                    st.session_state.pdf_report = report.submit_report(selected_user, df, session_gap)
+                    st.session_state.pdf_report_key = report_key
+                    # Rerun the page so the panel is set up again, now polling
+                    st.rerun()
+                if not future.done():
+                    st.info("Building the PDF report in the background...")
+                    return
+                if polling:
+                    # Finished; set the panel up again without the timer
+                    st.rerun()
                 try:
-                    pdf.cell(0, 7, header, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+                    pdf_bytes = future.result()
                 except Exception as e:
-                    print(f"Warning: Could not display table header - {e}")
-                    safe_header = header.encode('utf-8', 'ignore').decode('utf-8')
-                    pdf.cell(0, 7, safe_header, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-                
-                # Add table rows
-                for _, row in df.iterrows():
-                    row_str = ' | '.join(str(x) for x in row)
-                    try:
-                        pdf.cell(0, 7, row_str, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-                    except Exception as e:
-                        print(f"Warning: Could not display table row - {e}")
-                        safe_row = row_str.encode('utf-8', 'ignore').decode('utf-8')
-                        pdf.cell(0, 7, safe_row, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-            pdf.ln(2)
-        # Add charts
-        for img_bytes in chart_imgs:
-            pdf.add_page()
-            add_image(pdf, img_bytes)
-        
-        # Ensure we return bytes, not bytearray (removed deprecated dest parameter)
-        pdf_output = pdf.output()
-        if isinstance(pdf_output, bytearray):
-            return bytes(pdf_output)
-        return pdf_output
-
-    # --- Collect all metrics, tables, and figures for PDF ---
-    metrics = {
-        "Total Messages": f"{insights.get('total_messages', 0):,}",
-        "Duration (Days)": insights.get('date_range', {}).get('duration_days', 0),
-        "Messages/Day": f"{insights.get('avg_messages_per_day', 0):.1f}",
-        "Peak Day": insights.get('peak_activity', {}).get('day', 'N/A'),
-        "Peak Hour": f"{insights.get('peak_activity', {}).get('hour', 'N/A')}:00",
-        "Peak Month": insights.get('peak_activity', {}).get('month', 'N/A'),
-        "Total Links Shared": insights.get('total_links_shared', 0),
-        "Unique Links Shared": insights.get('unique_links_shared', 0)
-    }
-    tables = {}
-    # Add user stats table if available
-    if selected_user == "Overall":
-        x, new_df = helper.most_busy_user(df)
-        if not new_df.empty:
-            tables["Most Active Users"] = new_df.head(10)
-    # Add emoji stats table if available
-    emoji_df = helper.emoji_analysis(selected_user, df)
-    if not emoji_df.empty:
-        tables["Top Emojis"] = emoji_df.head(10)
-    # Add domain stats table if available
-    url_analysis_df = helper.analyze_urls(selected_user, df)
-    if not url_analysis_df.empty:
-        tables["Top Shared Domains"] = url_analysis_df.head(10)
-    # --- Collect all main figures for PDF ---
-    chart_imgs = []
-    # Monthly Timeline
-    try:
-        timeline = helper.monthly_timeline(selected_user, df)
-        if not timeline.empty:
-            fig = px.line(
-                timeline, x='time', y='message',
-                labels={'time': 'Month-Year', 'message': 'Total Messages'},
-                title=f"Monthly Activity - {selected_user}", markers=True
-            )
-            buf = px_fig_to_img_bytes(fig)
-            chart_imgs.append(buf)
-    except Exception:
-        pass
-    # Daily Timeline
-    try:
-        daily_timeline = helper.daily_timeline(selected_user, df)
-        if not daily_timeline.empty:
-            fig = px.line(
-                daily_timeline, x='specific_date', y='message',
-                labels={'specific_date': 'Date', 'message': 'Messages'},
-                title=f"Daily Activity - {selected_user}", color_discrete_sequence=['green']
-            )
-            buf = px_fig_to_img_bytes(fig)
-            chart_imgs.append(buf)
-    except Exception:
-        pass
-    # Most Active Days (Weekly Activity)
-    try:
-        busy_day = helper.week_activity_map(selected_user, df)
-        if not busy_day.empty:
-            fig = px.bar(
-                x=busy_day.index,
-                y=busy_day.values,
-                labels={'x': 'Day of Week', 'y': 'Message Count'},
-                title=f"Weekly Activity - {selected_user}",
-                color=busy_day.values,
-                color_continuous_scale='Blues'
-            )
-            fig.update_xaxes(tickangle=45)
-            buf = px_fig_to_img_bytes(fig)
-            chart_imgs.append(buf)
-    except Exception:
-        pass
-    # Most Active Months
-    try:
-        busy_month = helper.month_activity_map(selected_user, df)
-        if not busy_month.empty:
-            fig = px.bar(
-                x=busy_month.index,
-                y=busy_month.values,
-                labels={'x': 'Month', 'y': 'Message Count'},
-                title=f"Monthly Activity - {selected_user}",
-                color=busy_month.values,
-                color_continuous_scale='Reds'
-            )
-            fig.update_xaxes(tickangle=45)
-            buf = px_fig_to_img_bytes(fig)
-            chart_imgs.append(buf)
-    except Exception:
-        pass
-    # Activity Percentage Pie (if Overall)
-    try:
-        if selected_user == "Overall":
-            x, new_df = helper.most_busy_user(df)
-            if not new_df.empty:
-                fig_pie = px.pie(
-                    new_df.head(10),
-                    values='Percent',
-                    names='Name',
-                    title="Chat Contribution %"
+                    st.error(f"Could not build the PDF report: {e}")
+                    del st.session_state["pdf_report"]
+                    return
+                st.download_button(
+                    label="Download Full PDF Report",
+                    data=pdf_bytes,
+                    file_name="whatsapp_chat_full_analysis.pdf",
+                    mime="application/pdf"
                 )
-                buf = px_fig_to_img_bytes(fig_pie)
-                chart_imgs.append(buf)
-    except Exception:
-        pass
-    # Activity Heatmap
-    try:
-        user_heatmap = helper.activity_heatmap(selected_user, df)
-        if not user_heatmap.empty and not user_heatmap.isnull().values.all():
-            fig, ax = plt.subplots(figsize=(12, 6))
-            sns.heatmap(user_heatmap, annot=True, fmt='g', cmap='YlOrRd', cbar_kws={'label': 'Number of Messages'}, ax=ax)
-            ax.set_title(f'Activity Heatmap - {selected_user}', fontsize=16, pad=20)
-            ax.set_xlabel('Time Period', fontsize=12)
-            ax.set_ylabel('Day of Week', fontsize=12)
-            plt.xticks(rotation=45)
-            plt.tight_layout()
-            buf = fig_to_img_bytes(fig)
-            chart_imgs.append(buf)
-            plt.close(fig)
-    except Exception:
-        pass
-    # Word Cloud
-    try:
-        df_wc = helper.create_wordcloud(selected_user, df)
-        if df_wc is not None:
-            fig, ax = plt.subplots(figsize=(10, 6))
-            ax.imshow(df_wc, interpolation='bilinear')
-            ax.axis("off")
-            buf = fig_to_img_bytes(fig)
-            chart_imgs.append(buf)
-            plt.close(fig)
-    except Exception:
-        pass
-    # Most Common Words
-    try:
-        most_common_df = helper.most_common_words(selected_user, df)
-        if not most_common_df.empty:
-            fig = px.bar(
-                most_common_df.head(15), y='Word', x='Frequency', orientation='h',
-                labels={'Word': 'Word', 'Frequency': 'Count'},
-                title=f"Top 15 Words - {selected_user}", color='Frequency', color_continuous_scale='blues'
-            )
-            fig.update_layout(yaxis={'categoryorder': 'total ascending'})
-            buf = px_fig_to_img_bytes(fig)
-            chart_imgs.append(buf)
-    except Exception:
-        pass
-    # Sentiment Pie
-    try:
-        sentiment_summary = helper.sentiment_summary(selected_user, df)
-        if not sentiment_summary.empty:
-            fig = px.pie(sentiment_summary, values='Count', names='Sentiment', title='Sentiment Distribution',
-                         color_discrete_map={'Positive':'green', 'Negative':'red', 'Neutral':'blue'})
-            buf = px_fig_to_img_bytes(fig)
-            chart_imgs.append(buf)
-    except Exception:
-        pass
-    # Sentiment Over Time
-    try:
-        emotion_timeline = helper.emotion_timeline(selected_user, df)
-        if not emotion_timeline.empty:
-            plot_df = emotion_timeline.melt(id_vars=['specific_date'], value_vars=['Positive', 'Negative', 'Neutral'],
-                                            var_name='Sentiment', value_name='Message Count')
-            fig = px.line(plot_df, x='specific_date', y='Message Count', color='Sentiment',
-                          title='Sentiment Over Time', markers=True,
-                          labels={'specific_date': 'Date', 'Message Count': 'Number of Messages'},
-                          color_discrete_map={'Positive':'green', 'Negative':'red', 'Neutral':'blue'})
-            fig.update_xaxes(tickangle=45)
-            buf = px_fig_to_img_bytes(fig)
-            chart_imgs.append(buf)
-    except Exception:
-        pass
-    # Emoji Bar
-    try:
-        emoji_df = helper.emoji_analysis(selected_user, df)
-        if not emoji_df.empty:
-            fig = px.bar(emoji_df.head(10), y='Emoji', x='Count', orientation='h',
-                         labels={'Emoji': 'Emoji', 'Count': 'Frequency'}, title='Top 10 Emojis')
-            fig.update_layout(yaxis={'categoryorder': 'total ascending'})
-            buf = px_fig_to_img_bytes(fig)
-            chart_imgs.append(buf)
-    except Exception:
-        pass
-    # Message Length Distribution
-    try:
-        message_stats = helper.message_length_analysis(selected_user, df)
-        if not message_stats.empty:
-            fig = px.histogram(message_stats, x='message_length', nbins=30,
-                               labels={'message_length': 'Message Length (characters)', 'count': 'Frequency'},
-                               title='Message Length Distribution')
-            buf = px_fig_to_img_bytes(fig)
-            chart_imgs.append(buf)
-    except Exception:
-        pass
-    # Average Message Length by User (if Overall)
-    try:
-        if selected_user == "Overall":
-            message_stats = helper.message_length_analysis(selected_user, df)
-            avg_length = message_stats.groupby('users')['message_length'].mean().sort_values(ascending=False)
-            if not avg_length.empty:
-                fig = px.bar(avg_length.head(10), x=avg_length.head(10).index, y=avg_length.head(10).values,
-                             labels={'index': 'User', 'y': 'Average Characters'},
-                             title='Average Message Length by User')
-                fig.update_xaxes(tickangle=45)
-                buf = px_fig_to_img_bytes(fig)
-                chart_imgs.append(buf)
-    except Exception:
-        pass
-    # Response Time Distribution (if Overall)
-    try:
-        if selected_user == "Overall":
-            response_times = helper.response_time_analysis(df)
-            if not response_times.empty:
-                fig = px.histogram(response_times, x='response_time_minutes', nbins=20,
-                                   labels={'response_time_minutes': 'Response Time (minutes)', 'count': 'Frequency'},
-                                   title='Response Time Distribution', color_discrete_sequence=['lightcoral'])
-                buf = px_fig_to_img_bytes(fig)
-                chart_imgs.append(buf)
-    except Exception:
-        pass
-    # Conversation Starters Pie (if Overall)
-    try:
-        if selected_user == "Overall":
-            starters = helper.conversation_starters(df)
-            if not starters.empty:
-                fig = px.pie(starters, values='Conversations_Started', names='User',
-                             title='Conversation Starters')
-                buf = px_fig_to_img_bytes(fig)
-                chart_imgs.append(buf)
-    except Exception:
-        pass
-    # Top Shared Domains
-    try:
-        url_analysis_df = helper.analyze_urls(selected_user, df)
-        if not url_analysis_df.empty:
-            fig = px.bar(url_analysis_df.head(10), y='Domain', x='Count', orientation='h',
-                         labels={'Domain': 'Domain', 'Count': 'Times Shared'}, title='Top 10 Shared Domains')
-            fig.update_layout(yaxis={'categoryorder':'total ascending'})
-            buf = px_fig_to_img_bytes(fig)
-            chart_imgs.append(buf)
-    except Exception:
-        pass
-
-    if PDF_EXPORT_AVAILABLE and summary_text:
-        pdf_bytes = export_full_pdf(summary_text, chart_imgs, metrics, tables)
-        st.download_button(
-            label="Download Full PDF Report",
-            data=pdf_bytes,
-            file_name="whatsapp_chat_full_analysis.pdf",
-            mime="application/pdf"
-        )
\ No newline at end of file
+
+            pdf_report_panel()
+
+    # Only the open tab computes; switching tabs reruns the page, widgets inside a section rerun just that section
+    sections = {
+        "📈 Timelines": timelines_section,
+        "🗓️ Activity": activity_section,
+        "👥 Users & Mentions": users_section,
+        "📝 Words": words_section,
+        "📊 Sentiment": sentiment_section,
+        "😊 Emoji & Messages": messages_section,
+        "⚡ Conversations": conversations_section,
+        "🔗 URLs": urls_section,
+        "📄 Summary & Report": summary_section,
+    }
+    if media_files is not None and not media_files.empty:
+        sections["📎 Media"] = media_section
+    tabs = st.tabs(list(sections), key="analysis_tab", on_change="rerun")
+    for tab, section in zip(tabs, sections.values()):
+        if tab.open:
+            with tab:
+                section()
+
+# Performance panel for the current render
+if perf_records:
+    with st.sidebar.expander("⏱️ Performance", expanded=False):
+        top_level = [r for r in perf_records if r['depth'] == 0]
+        st.caption(f"{sum(r['duration_ms'] for r in top_level):,.0f} ms in {len(top_level)} parser/analysis calls this render")
+        st.dataframe(instrumentation.summarize(perf_records), hide_index=True, use_container_width=True)
@@ -0,0 +1,190 @@
+import sqlite3
+import pandas as pd
+import helper
+
+SYSTEM_USERS = ['group_notification', 'unknown_user', 'empty_message', 'error_processing']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    chat_id TEXT PRIMARY KEY,
+    name TEXT,
+    message_count INTEGER NOT NULL,
+    imported_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS messages (
+    chat_id TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    user TEXT NOT NULL,
+    message TEXT,
+    year INTEGER NOT NULL,
+    month_num INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    specific_date TEXT NOT NULL,
+    day_name TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    period TEXT NOT NULL,
+    word_count INTEGER NOT NULL,
+    link_count INTEGER NOT NULL,
+    is_media INTEGER NOT NULL,
+    is_system INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_chat_user_ts ON messages (chat_id, user, ts);
+CREATE INDEX IF NOT EXISTS idx_messages_chat_ts ON messages (chat_id, ts);
+"""
+
+INSERT_SQL = """
+INSERT INTO messages (chat_id, ts, user, message, year, month_num, month, specific_date,
+                      day_name, hour, period, word_count, link_count, is_media, is_system)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def connect(path='chats.sqlite3'):
+    """Open (and create if needed) a chat archive."""
+    conn = sqlite3.connect(str(path), check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def import_chat(conn, df, chat_id=None, name=None, batch_size=50000):
+    """Bulk-load preprocess output into the archive, replacing any previous copy."""
+    chat_id = chat_id or helper.chat_fingerprint(df)
+    messages = df['message'].astype(str)
+
+    # Per-message features computed once so the SQL side only has to sum
+    rows = pd.DataFrame({
+        'chat_id': chat_id,
+        'ts': (pd.to_datetime(df['date']) - pd.Timestamp(0)) // pd.Timedelta(seconds=1),
+        'user': df['users'].astype(str),
+        'message': messages,
+        'year': df['year'].astype(int),
+        'month_num': df['month_num'].astype(int),
+        'month': df['month'].astype(str),
+        'specific_date': pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d'),
+        'day_name': df['day_name'].astype(str),
+        'hour': df['hour'].astype(int),
+        'period': df['period'].astype(str),
+        'word_count': messages.str.split().str.len().fillna(0).astype(int),
+        'link_count': messages.str.count(r'https?://\S+|www\.\S+').fillna(0).astype(int),
+        'is_media': helper.is_media(messages).astype(int),
+        'is_system': df['users'].isin(SYSTEM_USERS).astype(int),
+    })
+
+    with conn:
+        conn.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+        conn.execute("DELETE FROM chats WHERE chat_id = ?", (chat_id,))
+        for start in range(0, len(rows), batch_size):
+            batch = rows.iloc[start:start + batch_size]
+            conn.executemany(INSERT_SQL, zip(*(batch[column].tolist() for column in batch.columns)))
+        conn.execute("INSERT INTO chats (chat_id, name, message_count) VALUES (?, ?, ?)",
+                     (chat_id, name, len(rows)))
+    return chat_id
+
+
+def list_chats(conn):
+    """Archived chats and their sizes."""
+    return pd.read_sql_query("SELECT chat_id, name, message_count, imported_at FROM chats ORDER BY imported_at", conn)
+
+
+def delete_chat(conn, chat_id):
+    with conn:
+        conn.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+        conn.execute("DELETE FROM chats WHERE chat_id = ?", (chat_id,))
+
+
+def list_users(conn, chat_id):
+    """Non-system users of an archived chat."""
+    rows = conn.execute("SELECT DISTINCT user FROM messages WHERE chat_id = ? AND is_system = 0 ORDER BY user",
+                        (chat_id,)).fetchall()
+    return [row[0] for row in rows]
+
+
+def _where(selected_user, chat_id, exclude_system=False):
+    clauses = ["chat_id = ?"]
+    params = [chat_id]
+    if selected_user != 'Overall':
+        clauses.append("user = ?")
+        params.append(selected_user)
+    if exclude_system:
+        clauses.append("is_system = 0")
+    return " AND ".join(clauses), params
+
+
+def fetch_stats(selected_user, conn, chat_id):
+    # Stats: msgs, words, media, links (same as helper.fetch_stats).
+    where, params = _where(selected_user, chat_id, exclude_system=True)
+    row = conn.execute(
+        f"SELECT COUNT(*), SUM(word_count), SUM(is_media), SUM(link_count) FROM messages WHERE {where}",
+        params).fetchone()
+    if not row or not row[0]:
+        return 0, 0, 0, 0
+    return row[0], row[1] or 0, row[2] or 0, row[3] or 0
+
+
+def most_busy_user(conn, chat_id):
+    """Return active users and their percentages."""
+    user_df = pd.read_sql_query(
+        "SELECT user, COUNT(*) AS count FROM messages WHERE chat_id = ? AND is_system = 0 "
+        "GROUP BY user ORDER BY count DESC, user", conn, params=[chat_id])
+    if user_df.empty:
+        return pd.Series(dtype='int'), pd.DataFrame(columns=['Name', 'Percent'])
+    counts = pd.Series(user_df['count'].to_numpy(), index=pd.Index(user_df['user'], name='users'), name='count')
+    percent_df = pd.DataFrame({'Name': user_df['user'], 'Percent': round(user_df['count'] / user_df['count'].sum() * 100, 2)})
+    return counts.head(), percent_df
+
+
+def monthly_timeline(selected_user, conn, chat_id):
+    # Monthly timeline.
+    where, params = _where(selected_user, chat_id)
+    timeline = pd.read_sql_query(
+        f"SELECT year, month, month_num, COUNT(message) AS message FROM messages WHERE {where} "
+        "GROUP BY year, month, month_num ORDER BY year, month, month_num", conn, params=params)
+    if timeline.empty:
+        return pd.DataFrame(columns=['year', 'month', 'month_num', 'message', 'time'])
+    timeline['time'] = timeline['month'] + '-' + timeline['year'].astype(str)
+    return timeline
+
+
+def daily_timeline(selected_user, conn, chat_id):
+    # Daily timeline.
+    where, params = _where(selected_user, chat_id)
+    timeline = pd.read_sql_query(
+        f"SELECT specific_date, COUNT(message) AS message FROM messages WHERE {where} "
+        "GROUP BY specific_date ORDER BY specific_date", conn, params=params)
+    if timeline.empty:
+        return pd.DataFrame(columns=['specific_date', 'message'])
+    timeline['specific_date'] = pd.to_datetime(timeline['specific_date']).dt.date
+    return timeline
+
+
+def _value_counts(selected_user, conn, chat_id, column):
+    where, params = _where(selected_user, chat_id)
+    counts = pd.read_sql_query(
+        f"SELECT {column}, COUNT(*) AS count FROM messages WHERE {where} "
+        f"GROUP BY {column} ORDER BY count DESC", conn, params=params)
+    if counts.empty:
+        return pd.Series(dtype='int')
+    return pd.Series(counts['count'].to_numpy(), index=pd.Index(counts[column], name=column), name='count')
+
+
+def week_activity_map(selected_user, conn, chat_id):
+    # Weekly activity map.
+    return _value_counts(selected_user, conn, chat_id, 'day_name')
+
+
+def month_activity_map(selected_user, conn, chat_id):
+    # Monthly activity map.
+    return _value_counts(selected_user, conn, chat_id, 'month')
+
+
+def activity_heatmap(selected_user, conn, chat_id):
+    # Activity heatmap.
+    where, params = _where(selected_user, chat_id)
+    cells = pd.read_sql_query(
+        f"SELECT day_name, period, COUNT(message) AS count FROM messages WHERE {where} "
+        "GROUP BY day_name, period", conn, params=params)
+    if cells.empty:
+        return pd.DataFrame()
+    return cells.pivot(index='day_name', columns='period', values='count').fillna(0)
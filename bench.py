@@ -0,0 +1,371 @@
+"""Benchmarks for the preprocessing stages and the helper analyses.
+
+    python bench.py run --sizes 10000,100000 --out benchmarks/baseline.json
+    python bench.py run --out benchmarks/latest.json --baseline benchmarks/baseline.json
+    python bench.py compare benchmarks/baseline.json benchmarks/latest.json --threshold 0.2
+    python bench.py memory --sizes 10000,100000,1000000 --out benchmarks/memory.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import helper
+import metrics
+import pipeline
+import preprocessor
+import search
+import synthetic
+
+DEFAULT_SIZES = [10000, 50000, 100000]
+
+# Stage name -> (function, name of the stage whose output it consumes)
+STAGES = {
+    'split_messages': (preprocessor.split_messages, 'text'),
+    'parse_dates': (preprocessor.parse_dates, 'split_messages'),
+    'split_users': (preprocessor.split_users, 'parse_dates'),
+    'time_features': (preprocessor.add_time_features, 'split_users'),
+    'total': (preprocessor.preprocess, 'text'),
+}
+
+# Every helper analysis, called on the parsed chat for the whole group
+HELPERS = {
+    'fetch_stats': lambda df: helper.fetch_stats('Overall', df),
+    'most_busy_user': helper.most_busy_user,
+    'monthly_timeline': lambda df: helper.monthly_timeline('Overall', df),
+    'daily_timeline': lambda df: helper.daily_timeline('Overall', df),
+    'week_activity_map': lambda df: helper.week_activity_map('Overall', df),
+    'month_activity_map': lambda df: helper.month_activity_map('Overall', df),
+    'activity_heatmap': lambda df: helper.activity_heatmap('Overall', df),
+    'most_common_words': lambda df: helper.most_common_words('Overall', df),
+    'word_frequencies': lambda df: helper.word_frequencies('Overall', df),
+    'create_wordcloud': lambda df: helper.create_wordcloud('Overall', df),
+    'emoji_analysis': lambda df: helper.emoji_analysis('Overall', df),
+    'analyze_urls': lambda df: helper.analyze_urls('Overall', df),
+    'message_length_analysis': lambda df: helper.message_length_analysis('Overall', df),
+    'response_time_analysis': helper.response_time_analysis,
+    'message_length_distribution': lambda df: helper.message_length_distribution('Overall', df),
+    'response_time_distribution': helper.response_time_distribution,
+    'build_sessions': helper.build_sessions,
+    'conversation_starters': helper.conversation_starters,
+    'sessions_per_day': helper.sessions_per_day,
+    'extract_mentions': helper.extract_mentions,
+    'get_chat_insights': lambda df: helper.get_chat_insights('Overall', df),
+    'analyze_sentiment': lambda df: helper.analyze_sentiment('Overall', df),
+    'slice_date_range': lambda df: helper.slice_date_range(df, df['date'].iloc[len(df) // 4], df['date'].iloc[len(df) // 2]),
+    'search_index': search.SearchIndex,
+}
+
+def _reset_caches(df):
+    """Forget cached results so every repeat measures the full computation."""
+    helper._word_frequency_cache.clear()
+    helper._wordcloud_cache.clear()
+    search._index_cache.clear()
+    helper._fingerprints.pop(id(df), None)
+
+
+def _time(fn, arg, repeat, copy=False):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        value = arg.copy() if copy else arg
+        if isinstance(value, pd.DataFrame):
+            _reset_caches(value)
+        tick = time.perf_counter()
+        result = fn(value)
+        timings.append(time.perf_counter() - tick)
+    return result, timings
+
+
+def _record(name, size, timings):
+    best = min(timings)
+    return {
+        'benchmark': name,
+        'size': size,
+        'seconds': round(best, 6),
+        'mean_seconds': round(sum(timings) / len(timings), 6),
+        'messages_per_sec': round(size / best, 1) if best > 0 else None,
+        'repeat': len(timings),
+    }
+
+
+def run_benchmarks(sizes=None, repeat=3, seed=0, only=None, skip=(), log=print):
+    """Time every stage and helper on generated chats; returns the result document."""
+    sizes = sizes or DEFAULT_SIZES
+    selected = [name for name in [f'preprocess.{s}' for s in STAGES] + [f'helper.{h}' for h in HELPERS]
+                if (not only or any(name.endswith('.' + o) or name == o for o in only))
+                and not any(name.endswith('.' + s) or name == s for s in skip)]
+    results = []
+    for size in sizes:
+        log(f"Generating {size} messages (seed {seed})")
+        outputs = {'text': synthetic.generate_text(size, seed=seed)}
+        for stage, (fn, source) in STAGES.items():
+            output, timings = _time(fn, outputs[source], repeat, copy=source != 'text')
+            outputs[stage] = output
+            if f'preprocess.{stage}' in selected:
+                results.append(_record(f'preprocess.{stage}', size, timings))
+                log(f"  preprocess.{stage:<22} {min(timings):9.4f}s")
+        df = outputs['total']
+        for name, fn in HELPERS.items():
+            if f'helper.{name}' not in selected:
+                continue
+            _, timings = _time(fn, df, repeat)
+            results.append(_record(f'helper.{name}', size, timings))
+            log(f"  helper.{name:<26} {min(timings):9.4f}s")
+    return {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+            'seed': seed,
+            'repeat': repeat,
+            'sizes': list(sizes),
+        },
+        'results': results,
+    }
+
+
+def compare_results(baseline, current, threshold=0.2, min_seconds=0.002):
+    """Rows comparing two result documents; a row regresses if it slowed by more than threshold."""
+    base = {(r['benchmark'], r['size']): r for r in baseline['results']}
+    rows = []
+    for r in current['results']:
+        old = base.get((r['benchmark'], r['size']))
+        if old is None:
+            continue
+        ratio = r['seconds'] / old['seconds'] if old['seconds'] > 0 else float('inf')
+        # Sub-millisecond timings are mostly noise
+        noisy = max(r['seconds'], old['seconds']) < min_seconds
+        rows.append({
+            'benchmark': r['benchmark'],
+            'size': r['size'],
+            'baseline': old['seconds'],
+            'current': r['seconds'],
+            'ratio': round(ratio, 3),
+            'regression': not noisy and ratio > 1 + threshold,
+            'improvement': not noisy and ratio < 1 / (1 + threshold),
+        })
+    return rows
+
+
+def print_comparison(rows, threshold):
+    print(f"{'benchmark':<36}{'size':>9}{'baseline':>11}{'current':>11}{'ratio':>8}")
+    for row in rows:
+        flag = '  REGRESSION' if row['regression'] else ('  faster' if row['improvement'] else '')
+        print(f"{row['benchmark']:<36}{row['size']:>9}{row['baseline']:>10.4f}s{row['current']:>10.4f}s"
+              f"{row['ratio']:>7.2f}x{flag}")
+    regressions = [row for row in rows if row['regression']]
+    print(f"{len(regressions)} regression(s) beyond {threshold:.0%} across {len(rows)} comparisons")
+    return regressions
+
+
+class RSSSampler:
+    """Polls RSS on a background thread and keeps the highest value seen."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        value = metrics.rss_bytes()
+        if value is not None and (self.peak is None or value > self.peak):
+            self.peak = value
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self.start = metrics.rss_bytes()
+        self.peak = self.start
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        return False
+
+
+def _measure(name, size, fn, *args):
+    """Run fn once, tracking Python allocations and process RSS; returns (result, record)."""
+    gc.collect()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    with RSSSampler() as rss:
+        tick = time.perf_counter()
+        result = fn(*args)
+        seconds = time.perf_counter() - tick
+    current, peak = tracemalloc.get_traced_memory()
+    record = {
+        'benchmark': name,
+        'size': size,
+        'seconds': round(seconds, 6),
+        # Extra memory needed while the step ran, and what its result still holds afterwards
+        'peak_bytes': peak - before,
+        'retained_bytes': current - before,
+        'rss_start_bytes': rss.start,
+        'rss_peak_bytes': (rss.peak - rss.start) if rss.start is not None else None,
+    }
+    return result, record
+
+
+def _log_memory(log, record):
+    log(f"  {record['benchmark']:<38} peak {record['peak_bytes'] / 1e6:9.1f} MB"
+        f"  retained {record['retained_bytes'] / 1e6:9.1f} MB")
+
+
+def scaling_report(records, slope_limit=1.2, min_bytes=1 << 20):
+    """Log-log slope of peak memory against input size per step; steeper than slope_limit is flagged."""
+    by_name = {}
+    for r in records:
+        by_name.setdefault(r['benchmark'], []).append((r['size'], r['peak_bytes']))
+    report = []
+    for name, points in by_name.items():
+        points = sorted((size, peak) for size, peak in points if peak > 0)
+        if len(points) < 2:
+            continue
+        xs = np.log([size for size, _ in points])
+        ys = np.log([peak for _, peak in points])
+        slope = float(np.polyfit(xs, ys, 1)[0])
+        # Steps that stay small are not worth flagging even if the curve bends
+        large = points[-1][1] >= min_bytes
+        report.append({'benchmark': name, 'slope': round(slope, 3), 'largest_peak_bytes': int(points[-1][1]),
+                       'superlinear': bool(large and slope > slope_limit)})
+    return report
+
+
+def run_memory(sizes=None, seed=0, skip=(), slope_limit=1.2, log=print):
+    """Peak and retained memory of each parsing stage and app analysis step across sizes."""
+    sizes = sizes or DEFAULT_SIZES
+    records, frames = [], []
+    tracemalloc.start()
+    try:
+        for size in sizes:
+            log(f"Generating {size} messages (seed {seed})")
+            text = synthetic.generate_text(size, seed=seed)
+            output = text
+            for stage, (fn, source) in STAGES.items():
+                if stage == 'total' or stage in skip:
+                    continue
+                output, record = _measure(f'preprocess.{stage}', size, fn, output)
+                records.append(record)
+                _log_memory(log, record)
+            del output
+            df, record = _measure('preprocess.total', size, preprocessor.preprocess, text)
+            records.append(record)
+            _log_memory(log, record)
+            del text
+
+            frame_bytes = int(df.memory_usage(deep=True).sum())
+            frames.append({'size': size, 'rows': len(df), 'frame_bytes': frame_bytes,
+                           'bytes_per_message': round(frame_bytes / max(len(df), 1), 1)})
+            log(f"  parsed frame: {frame_bytes / 1e6:.1f} MB ({frames[-1]['bytes_per_message']} bytes/message)")
+
+            # Keep every result alive, as the app does while the page is rendered
+            results = {}
+            _reset_caches(df)
+            for name, fn in pipeline.APP_PAGE.items():
+                if name in skip:
+                    continue
+                results[name], record = _measure(f'app.{name}', size, fn, 'Overall', df, results)
+                records.append(record)
+                _log_memory(log, record)
+            del results, df
+            _reset_caches(pd.DataFrame())
+    finally:
+        tracemalloc.stop()
+
+    scaling = scaling_report(records, slope_limit)
+    for row in scaling:
+        if row['superlinear']:
+            log(f"SUPERLINEAR: {row['benchmark']} peak memory grows ~n^{row['slope']}")
+    return {
+        'meta': {'created': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+                 'pandas': pd.__version__, 'seed': seed, 'sizes': list(sizes), 'slope_limit': slope_limit},
+        'frames': frames,
+        'results': records,
+        'scaling': scaling,
+    }
+
+
+def _load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _names(value):
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing and helper analyses.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="Run the benchmarks and save the results as JSON")
+    run.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help="Comma-separated message counts")
+    run.add_argument('--repeat', type=int, default=3, help="Runs per benchmark; the fastest is kept")
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--only', help="Comma-separated benchmark names to run (e.g. parse_dates,fetch_stats)")
+    run.add_argument('--skip', help="Comma-separated benchmark names to skip (e.g. analyze_sentiment)")
+    run.add_argument('--out', default=os.path.join('benchmarks', 'latest.json'))
+    run.add_argument('--baseline', help="Compare against this result file after running")
+    run.add_argument('--threshold', type=float, default=0.2, help="Allowed slowdown before flagging (0.2 = 20%%)")
+
+    compare = commands.add_parser('compare', help="Compare two result files")
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=0.2, help="Allowed slowdown before flagging (0.2 = 20%%)")
+    compare.add_argument('--min-seconds', type=float, default=0.002, help="Ignore benchmarks faster than this")
+
+    memory = commands.add_parser('memory', help="Measure peak and retained memory per stage and size")
+    memory.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help="Comma-separated message counts")
+    memory.add_argument('--seed', type=int, default=0)
+    memory.add_argument('--skip', help="Comma-separated steps to skip (e.g. sentiment_summary,emotion_timeline)")
+    memory.add_argument('--slope', type=float, default=1.2, help="Flag steps whose peak grows faster than n^slope")
+    memory.add_argument('--out', default=os.path.join('benchmarks', 'memory.json'))
+    args = parser.parse_args(argv)
+
+    if args.command == 'memory':
+        report = run_memory([int(size) for size in _names(args.sizes)], args.seed, _names(args.skip), args.slope)
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved memory report to {args.out}")
+        return 1 if any(row['superlinear'] for row in report['scaling']) else 0
+
+    if args.command == 'run':
+        results = run_benchmarks([int(size) for size in _names(args.sizes)], args.repeat, args.seed,
+                                 _names(args.only), _names(args.skip))
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved {len(results['results'])} results to {args.out}")
+        if not args.baseline:
+            return 0
+        baseline, current, min_seconds = _load(args.baseline), results, 0.002
+    else:
+        baseline, current, min_seconds = _load(args.baseline), _load(args.current), args.min_seconds
+
+    regressions = print_comparison(compare_results(baseline, current, args.threshold, min_seconds), args.threshold)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""Headless batch analysis of WhatsApp exports.
+
+    python cli.py exports/ --out results/ --analyses stats,monthly_timeline --workers 4
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+import loader
+import pipeline
+import preprocessor
+import storage
+
+
+def _safe_name(label):
+    return re.sub(r'[^\w.-]+', '_', label).strip('_') or 'chat'
+
+
+def analyze_export(path, member, label, analyses, out_dir, selected_user='Overall', write_parquet=False):
+    """Parse one chat and run the selected analyses; returns its run record."""
+    record = {'file': path, 'chat': label, 'status': 'ok', 'timings': {}}
+    started = time.perf_counter()
+    try:
+        tick = time.perf_counter()
+        data = loader.read_export(path, member)
+        record['timings']['read'] = round(time.perf_counter() - tick, 4)
+
+        tick = time.perf_counter()
+        df = preprocessor.preprocess(data)
+        record['timings']['preprocess'] = round(time.perf_counter() - tick, 4)
+        record['messages'] = int(len(df))
+        del data
+        if df.empty:
+            record['status'] = 'empty'
+            record['seconds'] = round(time.perf_counter() - started, 4)
+            return record
+
+        chat_dir = os.path.join(out_dir, _safe_name(label))
+        os.makedirs(chat_dir, exist_ok=True)
+        results = {}
+        for name in analyses:
+            tick = time.perf_counter()
+            try:
+                result = pipeline.run_analysis(name, df, selected_user)
+                results[name] = pipeline.to_jsonable(result)
+                if write_parquet and isinstance(result, pd.DataFrame) and not result.empty:
+                    frame = result.reset_index() if not isinstance(result.index, pd.RangeIndex) else result
+                    frame.columns = [str(column) for column in frame.columns]
+                    frame.to_parquet(os.path.join(chat_dir, f"{name}.parquet"), index=False)
+            except Exception as e:
+                results[name] = None
+                record.setdefault('errors', {})[name] = str(e)
+            record['timings'][name] = round(time.perf_counter() - tick, 4)
+
+        with open(os.path.join(chat_dir, 'results.json'), 'w', encoding='utf-8') as f:
+            json.dump({'chat': label, 'file': path, 'user': selected_user, 'results': results},
+                      f, ensure_ascii=False, indent=2)
+        if write_parquet:
+            storage.save_chat(df, os.path.join(chat_dir, 'messages.parquet'))
+        record['output'] = chat_dir
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = str(e)
+    record['seconds'] = round(time.perf_counter() - started, 4)
+    return record
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Analyze WhatsApp chat exports without the UI.")
+    parser.add_argument('inputs', nargs='+', help="Export files (.txt/.zip), directories or glob patterns")
+    parser.add_argument('--out', default='results', help="Output directory (default: results)")
+    parser.add_argument('--analyses', default='default',
+                        help="Comma-separated analyses, 'default' or 'all'. Available: " + ', '.join(pipeline.ANALYSES))
+    parser.add_argument('--user', default='Overall', help="Analyze a single user instead of the whole chat")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Parallel worker processes")
+    parser.add_argument('--parquet', action='store_true', help="Also write the parsed chat and table results as Parquet")
+    parser.add_argument('--recursive', action='store_true', help="Search directories recursively")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        analyses = pipeline.parse_analyses(args.analyses)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    jobs = []
+    for path in loader.find_exports(args.inputs, recursive=args.recursive):
+        try:
+            jobs.extend((path, member, label) for label, member in loader.iter_chats(path))
+        except Exception as e:
+            print(f"Skipping {path}: {e}", file=sys.stderr)
+    if not jobs:
+        print("No .txt or .zip exports found.", file=sys.stderr)
+        return 1
+
+    os.makedirs(args.out, exist_ok=True)
+    started = time.perf_counter()
+    records = []
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = [pool.submit(analyze_export, path, member, label, analyses, args.out, args.user, args.parquet)
+                   for path, member, label in jobs]
+        for future in as_completed(futures):
+            record = future.result()
+            records.append(record)
+            print(f"[{record['status']}] {record['chat']} ({record.get('messages', 0)} messages, {record['seconds']:.2f}s)")
+
+    records.sort(key=lambda r: r['chat'])
+    summary = {
+        'analyses': analyses,
+        'user': args.user,
+        'workers': args.workers,
+        'chats': len(records),
+        'failed': sum(1 for r in records if r['status'] == 'error'),
+        'messages': sum(r.get('messages', 0) for r in records),
+        'seconds': round(time.perf_counter() - started, 4),
+        'runs': records,
+    }
+    with open(os.path.join(args.out, 'summary.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    print(f"Analyzed {summary['chats']} chats ({summary['failed']} failed) in {summary['seconds']:.2f}s")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
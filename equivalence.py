@@ -0,0 +1,383 @@
+"""Differential checks: candidate implementations against the current helper outputs.
+
+    python equivalence.py                              # every registered candidate
+    python equivalence.py --target fetch_stats --messages 20000 --seeds 1,2,3
+
+A faster path is registered as a candidate for a target and must match the
+reference on generated and edge-case chats before it is switched on by default.
+"""
+import argparse
+import functools
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import archive
+import helper
+import loader
+import preprocessor
+import sketches
+import storage
+import synthetic
+
+# Chats that have broken parsers or helpers before; each is a raw export text
+EDGE_CASES = {
+    'empty': '',
+    'no_timestamps': 'just some text\nwithout any dates',
+    'single_message': '12/03/21, 10:15 - Alice: hello',
+    'only_notifications': ('12/03/21, 10:15 - Messages and calls are end-to-end encrypted.\n'
+                           '12/03/21, 10:16 - Alice added Bob\n12/03/21, 10:17 - Bob left'),
+    'multiline_and_colons': ('12/03/21, 10:15 - Alice: first line\nsecond line: with a colon\nthird\n'
+                             '12/03/21, 10:16 - Bob: time is 10:30: ok?\n'
+                             '12/03/21, 10:17 - Alice: https://example.com/a www.test.org see https://example.com/b'),
+    'unicode_and_numbers': ('01/01/22, 00:00 - অমিত দাস: শুভ নববর্ষ 🎉🎉\n'
+                            '01/01/22, 00:01 - +91 98765 43210: Happy new year ❤️ @অমিত দাস\n'
+                            '01/01/22, 23:59 - অমিত দাস: <Media omitted>\n'
+                            '02/01/22, 00:00 - +91 98765 43210: 😂😂😂 ok ok'),
+    'same_timestamp_ties': '\n'.join(f'05/06/20, 18:{minute:02d} - {user}: msg {i}'
+                                     for i, (minute, user) in enumerate([(0, 'A'), (0, 'B'), (0, 'C'), (1, 'B'),
+                                                                         (1, 'A'), (1, 'C'), (2, 'C'), (2, 'A')])),
+    'twelve_hour_and_long_year': ('3/4/2021, 11:59 pm - Alice: late\n3/4/2021, 12:00 am - Bob: midnight?\n'
+                                  '4/4/2021, 12:01 pm - Alice: noon'),
+    'media_only': '\n'.join(f'07/07/21, 09:0{i} - {"AB"[i % 2]}: <Media omitted>' for i in range(6)),
+    'long_silences': ('01/01/21, 08:00 - A: morning\n01/01/21, 08:05 - B: hi\n'
+                      '02/01/21, 20:00 - A: anyone?\n05/01/21, 07:00 - B: back\n05/01/21, 07:02 - A: great'),
+}
+
+
+def generated_cases(seeds=(0, 1), messages=3000):
+    """Generated chats covering both clocks and small and large groups."""
+    cases = {}
+    for seed in seeds:
+        cases[f'synthetic_{seed}_24h'] = synthetic.generate_text(messages, seed=seed, n_users=25)
+        cases[f'synthetic_{seed}_12h_pair'] = synthetic.generate_text(messages, seed=seed, clock='12h', n_users=2)
+    return cases
+
+
+# Comparison rules. Each returns a list of differences; an empty list means equal.
+
+def compare(expected, actual, rtol=1e-9, atol=0.0, unordered=False, ignore_index=False):
+    """Structural comparison; floats within tolerance, rows in any order if unordered."""
+    if isinstance(expected, pd.DataFrame) or isinstance(actual, pd.DataFrame):
+        return _compare_frames(expected, actual, rtol, atol, unordered, ignore_index)
+    if isinstance(expected, pd.Series) or isinstance(actual, pd.Series):
+        if not (isinstance(expected, pd.Series) and isinstance(actual, pd.Series)):
+            return [f"expected {type(expected).__name__}, got {type(actual).__name__}"]
+        return _compare_frames(expected.reset_index(), actual.reset_index(), rtol, atol, unordered)
+    if isinstance(expected, dict):
+        if not isinstance(actual, dict) or set(expected) != set(actual):
+            return [f"keys differ: {sorted(map(str, expected))} vs {sorted(map(str, actual)) if isinstance(actual, dict) else actual!r}"]
+        return [f"[{key!r}] {p}" for key in expected for p in compare(expected[key], actual[key], rtol, atol, unordered)]
+    if isinstance(expected, (list, tuple)):
+        if not isinstance(actual, (list, tuple)) or len(expected) != len(actual):
+            return [f"expected {expected!r}, got {actual!r}"]
+        return [f"[{i}] {p}" for i, (e, a) in enumerate(zip(expected, actual))
+                for p in compare(e, a, rtol, atol, unordered)]
+    if isinstance(expected, (float, np.floating)) or isinstance(actual, (float, np.floating)):
+        try:
+            if np.isclose(float(expected), float(actual), rtol=rtol, atol=atol, equal_nan=True):
+                return []
+        except (TypeError, ValueError):
+            pass
+        return [f"expected {expected!r}, got {actual!r}"]
+    if expected != actual:
+        return [f"expected {expected!r}, got {actual!r}"]
+    return []
+
+
+def _sorted_rows(frame):
+    if frame.empty:
+        return frame.reset_index(drop=True)
+    keys = frame.astype(str)
+    order = keys.sort_values(list(keys.columns), kind='mergesort').index
+    return frame.loc[order].reset_index(drop=True)
+
+
+def _compare_frames(expected, actual, rtol, atol, unordered, ignore_index=False):
+    if not (isinstance(expected, pd.DataFrame) and isinstance(actual, pd.DataFrame)):
+        return [f"expected {type(expected).__name__}, got {type(actual).__name__}"]
+    if list(map(str, expected.columns)) != list(map(str, actual.columns)):
+        return [f"columns differ: {list(expected.columns)} vs {list(actual.columns)}"]
+    if expected.empty and actual.empty:
+        return []
+    if unordered:
+        expected, actual = _sorted_rows(expected), _sorted_rows(actual)
+    elif ignore_index:
+        expected, actual = expected.reset_index(drop=True), actual.reset_index(drop=True)
+    try:
+        pd.testing.assert_frame_equal(expected, actual, check_dtype=False, check_index_type=False,
+                                      check_column_type=False, check_categorical=False,
+                                      check_exact=False, rtol=rtol, atol=atol)
+    except AssertionError as e:
+        return [' '.join(str(e).split())[:500]]
+    return []
+
+
+def compare_ranked(expected, actual, label, value, limit=20):
+    """Top-N tables where items with equal counts may come in any order.
+
+    Counts must match rank by rank and every tie group must hold the same items,
+    except the last group when the table was cut at limit (which tied items made
+    the cut is arbitrary).
+    """
+    if isinstance(expected, pd.Series):
+        expected, actual = expected.rename_axis(label).rename(value).reset_index(), \
+            actual.rename_axis(label).rename(value).reset_index()
+    problems = compare(expected[value].tolist(), actual[value].tolist()) if len(expected) == len(actual) else \
+        [f"expected {len(expected)} rows, got {len(actual)}"]
+    if problems or expected.empty:
+        return problems
+    truncated = len(expected) >= limit
+    last = expected[value].iloc[-1]
+    for count, group in expected.groupby(value, sort=False):
+        if truncated and count == last:
+            continue
+        other = actual.loc[actual[value] == count, label]
+        if set(group[label]) != set(other):
+            problems.append(f"items with {value}={count} differ: {sorted(map(str, group[label]))} vs {sorted(map(str, other))}")
+    return problems
+
+
+EXACT = compare
+UNORDERED = functools.partial(compare, unordered=True)
+CLOSE = functools.partial(compare, rtol=1e-6, atol=1e-9)
+# Row labels of a parsed chat only need to be consistent within the chat itself
+SAME_ROWS = functools.partial(compare, ignore_index=True)
+
+
+def _ranked(label, value, limit=20):
+    return functools.partial(compare_ranked, label=label, value=value, limit=limit)
+
+
+def _replies(expected, actual):
+    # The loop returned a frame without columns when nobody replied; the helper keeps its columns
+    if isinstance(expected, pd.DataFrame) and expected.empty and not len(expected.columns):
+        return [] if isinstance(actual, pd.DataFrame) and actual.empty else [f"expected no replies, got {len(actual)}"]
+    return EXACT(expected, actual)
+
+
+def _busy_users(expected, actual):
+    return compare_ranked(expected[0], actual[0], 'users', 'count', limit=5) + UNORDERED(expected[1], actual[1])
+
+
+# Loop implementations that helper.py replaced with vectorized ones. They stay the
+# references for those targets, and the helpers are checked against them as candidates.
+
+def baseline_response_time_analysis(df):
+    df_sorted = df.sort_values('date')
+    df_sorted = df_sorted[~df_sorted['users'].isin(['group_notification', 'unknown_user', 'empty_message', 'error_processing'])]
+    if df_sorted.empty or df_sorted.shape[0] < 2:
+        return pd.DataFrame(columns=['responder', 'response_time_minutes'])
+    response_times = []
+    prev_user = None
+    prev_time = None
+    for idx, row in df_sorted.iterrows():
+        user = row['users']
+        time = row['date']
+        if prev_user is not None and user != prev_user:
+            diff = (time - prev_time).total_seconds() / 60.0
+            if 0 < diff < 720:  # Ignore gaps > 12 hours
+                response_times.append({'responder': user, 'response_time_minutes': diff})
+        prev_user = user
+        prev_time = time
+    return pd.DataFrame(response_times)
+
+
+def baseline_conversation_starters(df):
+    df_sorted = df.sort_values('date')
+    df_sorted = df_sorted[~df_sorted['users'].isin(['group_notification', 'unknown_user', 'empty_message', 'error_processing'])]
+    if df_sorted.empty or df_sorted.shape[0] < 2:
+        return pd.DataFrame(columns=['User', 'Conversations_Started'])
+    starters = []
+    prev_time = None
+    for idx, row in df_sorted.iterrows():
+        user = row['users']
+        time = row['date']
+        if prev_time is None or (time - prev_time).total_seconds() > 7200:
+            starters.append(user)
+        prev_time = time
+    starter_counts = Counter(starters)
+    starter_df = pd.DataFrame(starter_counts.items(), columns=['User', 'Conversations_Started'])
+    starter_df = starter_df.sort_values('Conversations_Started', ascending=False).reset_index(drop=True)
+    return starter_df
+
+
+# Target -> reference and comparison rule. Every reference takes (df, user) except
+# preprocess, which takes the raw export text.
+TARGETS = {
+    'preprocess': {'reference': lambda text, user: preprocessor.preprocess(text), 'compare': SAME_ROWS, 'input': 'text'},
+    'fetch_stats': {'reference': lambda df, user: helper.fetch_stats(user, df), 'compare': EXACT},
+    'most_busy_user': {'reference': lambda df, user: helper.most_busy_user(df), 'compare': _busy_users},
+    'monthly_timeline': {'reference': lambda df, user: helper.monthly_timeline(user, df), 'compare': EXACT},
+    'daily_timeline': {'reference': lambda df, user: helper.daily_timeline(user, df), 'compare': EXACT},
+    'week_activity_map': {'reference': lambda df, user: helper.week_activity_map(user, df), 'compare': UNORDERED},
+    'month_activity_map': {'reference': lambda df, user: helper.month_activity_map(user, df), 'compare': UNORDERED},
+    'activity_heatmap': {'reference': lambda df, user: helper.activity_heatmap(user, df), 'compare': EXACT},
+    'most_common_words': {'reference': lambda df, user: helper.most_common_words(user, df),
+                          'compare': _ranked('Word', 'Frequency')},
+    'emoji_analysis': {'reference': lambda df, user: helper.emoji_analysis(user, df),
+                       'compare': _ranked('Emoji', 'Count')},
+    'analyze_urls': {'reference': lambda df, user: helper.analyze_urls(user, df),
+                     'compare': _ranked('Domain', 'Count', limit=float('inf'))},
+    'message_length_analysis': {'reference': lambda df, user: helper.message_length_analysis(user, df), 'compare': EXACT},
+    'response_time_analysis': {'reference': lambda df, user: baseline_response_time_analysis(df), 'compare': _replies},
+    'build_sessions': {'reference': lambda df, user: helper.build_sessions(df), 'compare': EXACT},
+    'conversation_starters': {'reference': lambda df, user: baseline_conversation_starters(df),
+                              'compare': _ranked('User', 'Conversations_Started', limit=float('inf'))},
+    'sessions_per_day': {'reference': lambda df, user: helper.sessions_per_day(df), 'compare': EXACT},
+    'extract_mentions': {'reference': lambda df, user: helper.extract_mentions(df), 'compare': EXACT},
+    'get_chat_insights': {'reference': lambda df, user: helper.get_chat_insights(user, df), 'compare': EXACT},
+    'sentiment_summary': {'reference': lambda df, user: helper.sentiment_summary(user, df), 'compare': UNORDERED},
+    'analyze_sentiment': {'reference': lambda df, user: helper.analyze_sentiment(user, df), 'compare': CLOSE},
+}
+
+# Target -> {label: candidate}; candidates take the same arguments as the reference
+CANDIDATES = {}
+
+
+def register(target, label, fn):
+    """Register a candidate implementation to be checked against a target's reference."""
+    if target not in TARGETS:
+        raise ValueError(f"Unknown target: {target}")
+    CANDIDATES.setdefault(target, {})[label] = fn
+    return fn
+
+
+def candidate(target, label):
+    """Decorator form of register()."""
+    return lambda fn: register(target, label, fn)
+
+
+def _call(fn, *args):
+    tick = time.perf_counter()
+    try:
+        return fn(*args), None, time.perf_counter() - tick
+    except Exception as e:
+        return None, e, time.perf_counter() - tick
+
+
+def check(target, fn, cases=None, label='candidate'):
+    """Run one candidate against the reference on every case; returns a list of result rows."""
+    spec = TARGETS[target]
+    cases = cases if cases is not None else dict(EDGE_CASES, **generated_cases())
+    rows = []
+    for case, text in cases.items():
+        if spec.get('input') == 'text':
+            inputs = [(text, 'Overall')]
+        else:
+            df, _, _ = _call(preprocessor.preprocess, text)
+            users = ['Overall']
+            if df is not None and not df.empty:
+                users.append(df['users'].value_counts().index[0])
+            inputs = [(df, user) for user in users]
+        for arg, user in inputs:
+            expected, expected_error, reference_seconds = _call(spec['reference'], arg, user)
+            actual, actual_error, candidate_seconds = _call(fn, arg, user)
+            if expected_error or actual_error:
+                same = type(expected_error) is type(actual_error)
+                problems = [] if same else [f"reference raised {expected_error!r}, candidate raised {actual_error!r}"]
+            else:
+                problems = spec['compare'](expected, actual)
+            rows.append({
+                'target': target, 'candidate': label, 'case': case, 'user': user, 'ok': not problems,
+                'problems': problems, 'reference_seconds': reference_seconds, 'candidate_seconds': candidate_seconds,
+            })
+    return rows
+
+
+def run_checks(targets=None, cases=None):
+    """Check every registered candidate (optionally only some targets)."""
+    cases = cases if cases is not None else dict(EDGE_CASES, **generated_cases())
+    rows = []
+    for target, candidates in CANDIDATES.items():
+        if targets and target not in targets:
+            continue
+        for label, fn in candidates.items():
+            rows.extend(check(target, fn, cases, label))
+    return rows
+
+
+# SQL aggregations in archive.py answer the same questions from SQLite
+_archives = {}
+
+
+def _archived(df):
+    key = helper.chat_fingerprint(df)
+    if key not in _archives:
+        conn = archive.connect(':memory:')
+        archive.import_chat(conn, df, chat_id='chat')
+        _archives.clear()
+        _archives[key] = conn
+    return _archives[key]
+
+
+register('fetch_stats', 'archive', lambda df, user: archive.fetch_stats(user, _archived(df), 'chat'))
+register('most_busy_user', 'archive', lambda df, user: archive.most_busy_user(_archived(df), 'chat'))
+register('monthly_timeline', 'archive', lambda df, user: archive.monthly_timeline(user, _archived(df), 'chat'))
+register('daily_timeline', 'archive', lambda df, user: archive.daily_timeline(user, _archived(df), 'chat'))
+register('week_activity_map', 'archive', lambda df, user: archive.week_activity_map(user, _archived(df), 'chat'))
+register('month_activity_map', 'archive', lambda df, user: archive.month_activity_map(user, _archived(df), 'chat'))
+register('activity_heatmap', 'archive', lambda df, user: archive.activity_heatmap(user, _archived(df), 'chat'))
+
+# Space-Saving is exact while the distinct items fit its counters
+register('most_common_words', 'sketch',
+         lambda df, user: sketches.sketch_chat(user, df).most_common_words().drop(columns='Error'))
+register('emoji_analysis', 'sketch', lambda df, user: sketches.sketch_chat(user, df).emoji_analysis().drop(columns='Error'))
+register('analyze_urls', 'sketch', lambda df, user: sketches.sketch_chat(user, df).analyze_urls().drop(columns='Error'))
+
+# The helpers in use, against the loops they replaced
+register('response_time_analysis', 'vectorized', lambda df, user: helper.response_time_analysis(df))
+register('conversation_starters', 'sessions', lambda df, user: helper.conversation_starters(df))
+
+@candidate('preprocess', 'utf16_stream')
+def _utf16_stream(text, user):
+    return preprocessor.preprocess(loader.TextStream(text.encode('utf-16'), chunk_size=4096))
+
+
+if storage.ARROW_AVAILABLE:
+    @candidate('preprocess', 'parquet_roundtrip')
+    def _parquet_roundtrip(text, user):
+        df = preprocessor.preprocess(text)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'chat.parquet')
+            storage.save_chat(df, path)
+            return storage.load_chat(path, memory_map=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check candidate implementations against the helper outputs.")
+    parser.add_argument('--target', action='append', help="Only check these targets (repeatable)")
+    parser.add_argument('--messages', type=int, default=3000, help="Size of the generated chats")
+    parser.add_argument('--seeds', default='0,1', help="Comma-separated seeds for generated chats")
+    parser.add_argument('--no-edge-cases', action='store_true')
+    args = parser.parse_args(argv)
+
+    cases = {} if args.no_edge_cases else dict(EDGE_CASES)
+    cases.update(generated_cases([int(seed) for seed in args.seeds.split(',') if seed.strip()], args.messages))
+    rows = run_checks(args.target, cases)
+
+    failures = [row for row in rows if not row['ok']]
+    summary = {}
+    for row in rows:
+        entry = summary.setdefault((row['target'], row['candidate']), [0, 0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += row['ok']
+        entry[2] += row['reference_seconds']
+        entry[3] += row['candidate_seconds']
+    for (target, label), (total, passed, reference_seconds, candidate_seconds) in summary.items():
+        speedup = reference_seconds / candidate_seconds if candidate_seconds > 0 else float('inf')
+        print(f"{'PASS' if passed == total else 'FAIL'}  {target:<24} {label:<20} {passed}/{total} cases"
+              f"  {speedup:6.2f}x vs reference")
+    for row in failures:
+        print(f"  {row['target']} [{row['candidate']}] {row['case']} ({row['user']}):")
+        for problem in row['problems'][:5]:
+            print(f"      {problem}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,12 @@
+import logging
+import os
 import re
+import threading
+import weakref
+import numpy as np
 import pandas as pd
-from wordcloud import WordCloud
-from collections import Counter
+from wordcloud import WordCloud, STOPWORDS
+from collections import Counter, OrderedDict
 from textblob import TextBlob
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 import emoji
@@ -9,9 +14,27 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from urllib.parse import urlparse
+from instrumentation import timed
+import metrics
 
-def fetch_stats(selected_user, df_original):
+log = logging.getLogger(__name__)
+
+# Resolved next to this module so batch tools work from any directory
+STOP_WORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bengali_stop_words.txt')
+_stop_words = None
+
+# "<Media omitted>" in exports without media; attached-file lines in exports that include it
+MEDIA_PATTERN = '(?i)<Media omitted>|^\u200e?' + r'[^\n]*?\S \(file attached\)|<attached: [^>]+>'
+
+
+def is_media(messages):
+    """Boolean mask of the messages that stand for a shared file."""
+    return messages.astype(str).str.contains(MEDIA_PATTERN, regex=True, na=False)
+
+@timed
+def fetch_stats(selected_user, df_original, start=None, end=None):
     # Stats: msgs, words, media, links.
+    df_original = slice_date_range(df_original, start, end)
     df = df_original.copy()
     
     # Filter data based on selected user
@@ -41,88 +64,188 @@ def fetch_stats(selected_user, df_original):
             links.extend(urls)
     
     # Count media messages
-    media_messages_df = df[df['message'].astype(str).str.contains("<Media omitted>", case=False, na=False)]
-    media_count = media_messages_df.shape[0]
+    media_count = int(is_media(df['message']).sum())
     
     return num_messages, len(words), media_count, len(links)
 
 # Active users and percentages.
-def most_busy_user(df):
+@timed
+def most_busy_user(df, start=None, end=None):
     """Return active users and their percentages."""
+    df = slice_date_range(df, start, end)
     user_df = df[~df['users'].isin(['group_notification', 'unknown_user', 'empty_message', 'error_processing'])]
     
     if user_df.empty:
         return pd.Series(dtype='int'), pd.DataFrame(columns=['Name', 'Percent'])
     
-    x = user_df['users'].value_counts().head()
+    # Categorical users (chats from storage.load_chat) also count the filtered-out names as 0
+    counts = user_df['users'].value_counts()
+    counts = counts[counts > 0]
+    x = counts.head()
     
     # Calculate percentages
-    percent_df = round(((user_df['users'].value_counts()) / user_df.shape[0]) * 100, 2).reset_index()
+    percent_df = round((counts / user_df.shape[0]) * 100, 2).reset_index()
     percent_df.columns = ['Name', 'Percent']
     
     return x, percent_df
 
-# Create word cloud.
-def create_wordcloud(selected_user, df):
-    """Generate a word cloud for messages."""
+# Word cloud caches, keyed by chat fingerprint and user
+_WORDCLOUD_CACHE_SIZE = 32
+_word_frequency_cache = OrderedDict()
+_wordcloud_cache = OrderedDict()
+# Every Streamlit session thread shares these caches
+_cache_lock = threading.Lock()
+# Fingerprints by frame id; an entry is dropped when its frame is collected
+_fingerprints = {}
+
+def _cache_get(cache, key, name):
+    with _cache_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+    metrics.cache_lookup(name, value is not None)
+    return value
+
+def _cache_put(cache, key, value):
+    with _cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > _WORDCLOUD_CACHE_SIZE:
+            cache.popitem(last=False)
+
+def load_stop_words():
+    """Load Bengali stop words once per process."""
+    global _stop_words
+    if _stop_words is None:
+        try:
+            with open(STOP_WORDS_PATH, 'r', encoding='utf-8') as f:
+                _stop_words = frozenset(line.strip() for line in f if line.strip())
+        except FileNotFoundError:
+            log.warning("bengali_stop_words.txt not found. Using empty stop words set.")
+            _stop_words = frozenset()
+        except Exception as e:
+            log.error(f"Error reading stop words file: {e}")
+            _stop_words = frozenset()
+    return _stop_words
+
+def remember_fingerprint(df, chat_id):
+    """Use chat_id as the fingerprint of this frame object until it is garbage collected."""
+    key = id(df)
+    if key not in _fingerprints:
+        weakref.finalize(df, _fingerprints.pop, key, None)
+    _fingerprints[key] = chat_id
+    return chat_id
+
+def chat_fingerprint(df):
+    """Stable key for the rows of a parsed chat, used to cache derived results.
+
+    The rows are hashed once per frame object; parsed chats are not modified
+    in place, so the key stays valid for the frame's lifetime.
+    """
+    chat_id = _fingerprints.get(id(df))
+    if chat_id is not None:
+        return chat_id
+    if df.empty:
+        return 'empty'
+    hashed = pd.util.hash_pandas_object(df[['date', 'users', 'message']], index=False)
+    return remember_fingerprint(df, f"{len(df)}-{int(hashed.sum()) & 0xFFFFFFFFFFFFFFFF:016x}")
+
+def window_end(end):
+    """First instant after a window ending at end; an end without a time of day includes that whole day."""
+    end = pd.Timestamp(end)
+    if end == end.normalize():
+        return np.datetime64(end + pd.Timedelta(days=1))
+    return np.datetime64(end + pd.Timedelta(nanoseconds=1))
+
+def slice_date_range(df, start=None, end=None):
+    """Rows with start <= date <= end, found by binary search on the sorted dates.
+
+    An end without a time of day ('2019-03-31', a date, or midnight) includes that whole day.
+    """
+    if (start is None and end is None) or df.empty:
+        return df
+    # O(n) check; parsed chats are already in order, stacked or re-sorted frames may not be
+    if not df['date'].is_monotonic_increasing:
+        df = df.sort_values('date', kind='mergesort')
+    dates = df['date'].to_numpy()
+    lo = dates.searchsorted(np.datetime64(pd.Timestamp(start)), side='left') if start is not None else 0
+    hi = dates.searchsorted(window_end(end), side='left') if end is not None else len(dates)
+    if lo == 0 and hi == len(df):
+        return df
+    window = df.iloc[lo:hi]
+    chat_id = _fingerprints.get(id(df))
+    if chat_id is not None:
+        # Key the window by its chat and bounds rather than hashing its rows again
+        remember_fingerprint(window, f"{chat_id}@{lo}:{hi}")
+    return window
+
+@timed
+def word_frequencies(selected_user, df, top_k=200, start=None, end=None):
+    """Return the top_k word cloud terms and their counts."""
+    df = slice_date_range(df, start, end)
+    key = (chat_fingerprint(df), selected_user, top_k)
+    cached = _cache_get(_word_frequency_cache, key, 'word_frequencies')
+    if cached is not None:
+        return cached
+
     if selected_user != 'Overall':
         df_filtered = df[df['users'] == selected_user]
     else:
-        df_filtered = df.copy()
+        df_filtered = df
     
     # Remove media messages and null values
     temp = df_filtered[~df_filtered['message'].astype(str).str.contains("<Media omitted>", case=False, na=False)]
     temp = temp.dropna(subset=['message'])
     
     if temp.empty:
-        return None
-    
-    # Load Bengali stop words with better error handling
-    try:
-        with open('bengali_stop_words.txt', 'r', encoding='utf-8') as f:
-            stop_words = set([line.strip() for line in f if line.strip()])
-    except FileNotFoundError:
-        print("Warning: bengali_stop_words.txt not found. Using empty stop words set.")
-        stop_words = set()
-    except Exception as e:
-        print(f"Error reading stop words file: {e}")
-        stop_words = set()
-    
-    # Filter messages by removing stop words
-    filtered_messages = []
-    for message in temp['message']:
-        if pd.notna(message) and str(message).strip():
-            words = [w for w in str(message).split() if w.lower() not in stop_words and len(w) > 1]
-            if words:  # Only add if there are words left after filtering
-                filtered_messages.append(' '.join(words))
-    
-    if not filtered_messages:
-        return None
+        return {}
     
-    text_for_wc = ' '.join(filtered_messages)
-    if not text_for_wc.strip():
+    # Count terms once instead of handing WordCloud a giant joined string
+    stop_words = load_stop_words() | STOPWORDS
+    words = temp['message'].astype(str).str.lower().str.findall(r"\w[\w']+").explode().dropna()
+    words = words[~words.isin(stop_words)]
+    frequencies = words.value_counts().head(top_k).to_dict()
+    _cache_put(_word_frequency_cache, key, frequencies)
+    return frequencies
+
+def wordcloud_cached(selected_user, df, width=500, height=500, top_k=200, start=None, end=None):
+    """Whether the full-size word cloud is already rendered."""
+    df = slice_date_range(df, start, end)
+    return (chat_fingerprint(df), selected_user, width, height, top_k) in _wordcloud_cache
+
+# Create word cloud.
+@timed
+def create_wordcloud(selected_user, df, width=500, height=500, top_k=200, preview=False, start=None, end=None):
+    """Generate a word cloud from precomputed term frequencies."""
+    df = slice_date_range(df, start, end)
+    if preview:
+        # Quarter-size render with fewer terms, shown while the full image renders
+        width, height, top_k = max(width // 4, 50), max(height // 4, 50), min(top_k, 50)
+    key = (chat_fingerprint(df), selected_user, width, height, top_k)
+    cached = _cache_get(_wordcloud_cache, key, 'wordcloud')
+    if cached is not None:
+        return cached
+
+    frequencies = word_frequencies(selected_user, df, top_k=top_k)
+    if not frequencies:
         return None
     
     try:
-        wc = WordCloud(width=500, height=500, min_font_size=10, background_color="white").generate(text_for_wc)
+        min_font_size = 4 if preview else 10
+        wc = WordCloud(width=width, height=height, min_font_size=min_font_size, max_words=top_k,
+                       background_color="white").generate_from_frequencies(frequencies)
+        _cache_put(_wordcloud_cache, key, wc)
         return wc
     except Exception as e:
-        print(f"Error generating word cloud: {e}")
+        log.exception(f"Error generating word cloud: {e}")
         return None
 
 # Most common words.
-def most_common_words(selected_user, df):
+@timed
+def most_common_words(selected_user, df, start=None, end=None):
     """Return 20 most common words."""
-    # Load stop words with better error handling
-    try:
-        with open('bengali_stop_words.txt', 'r', encoding='utf-8') as f:
-            stop_words = set([line.strip() for line in f if line.strip()])
-    except FileNotFoundError:
-        print("Warning: bengali_stop_words.txt not found. Using empty stop words set.")
-        stop_words = set()
-    except Exception as e:
-        print(f"Error reading stop words file: {e}")
-        stop_words = set()
+    df = slice_date_range(df, start, end)
+    stop_words = load_stop_words()
     
     if selected_user != 'Overall':
         df_filtered = df[df['users'] == selected_user]
@@ -150,8 +273,10 @@ def most_common_words(selected_user, df):
     most_common_df = pd.DataFrame(Counter(words).most_common(20), columns=['Word', 'Frequency'])
     return most_common_df
     
-def monthly_timeline(selected_user, df):
+@timed
+def monthly_timeline(selected_user, df, start=None, end=None):
     # Monthly timeline.
+    df = slice_date_range(df, start, end)
     if selected_user != 'Overall':
         df_filtered = df[df['users'] == selected_user]
     else:
@@ -171,11 +296,47 @@ def monthly_timeline(selected_user, df):
         
         return timeline
     except Exception as e:
-        print(f"Error in monthly_timeline: {e}")
+        log.exception(f"Error in monthly_timeline: {e}")
         return pd.DataFrame(columns=['year', 'month', 'month_num', 'message', 'time'])
 
-def daily_timeline(selected_user, df):
-    # Daily timeline.
+# Points a downsampled timeline may plot; longer spans are summed into weeks, months, ...
+TIMELINE_MAX_POINTS = 500
+TIMELINE_RESOLUTIONS = [('D', 'day'), ('W', 'week'), ('M', 'month'), ('Q', 'quarter'), ('Y', 'year')]
+
+def downsample_timeline(timeline, date_column='specific_date', max_points=TIMELINE_MAX_POINTS):
+    """Sum a per-day timeline into the finest of days, weeks, months, quarters or years that fits max_points.
+
+    Every other column is a count and is summed, so each point holds the exact
+    total of its period and column totals are unchanged. A 'period' column
+    labels each point for hover text and a 'resolution' column names the
+    period ('day', 'week', ...; see timeline_resolution).
+    """
+    values = [column for column in timeline.columns if column != date_column]
+    if timeline.empty:
+        return pd.DataFrame(columns=[date_column, *values, 'period', 'resolution'])
+    dates = pd.to_datetime(timeline[date_column])
+    for code, resolution in TIMELINE_RESOLUTIONS:
+        periods = dates.dt.to_period(code)
+        if periods.max().ordinal - periods.min().ordinal + 1 <= max_points:
+            break
+    totals = timeline[values].groupby(pd.PeriodIndex(periods)).sum()
+    result = pd.DataFrame({date_column: totals.index.start_time.date})
+    for column in values:
+        result[column] = totals[column].to_numpy()
+    result['period'] = totals.index.astype(str)
+    result['resolution'] = resolution
+    return result
+
+def timeline_resolution(timeline):
+    """'day', 'week', 'month', 'quarter' or 'year': the period of each point of a (downsampled) timeline."""
+    if 'resolution' not in timeline.columns or timeline.empty:
+        return 'day'
+    return timeline['resolution'].iloc[0]
+
+@timed
+def daily_timeline(selected_user, df, start=None, end=None, max_points=None):
+    # Daily timeline; with max_points, summed into coarser periods for long chats (see downsample_timeline).
+    df = slice_date_range(df, start, end)
     if selected_user != 'Overall':
         df_filtered = df[df['users'] == selected_user]
     else:
@@ -186,13 +347,17 @@ def daily_timeline(selected_user, df):
     
     try:
         daily_timeline_df = df_filtered.groupby('specific_date').count()['message'].reset_index()
+        if max_points:
+            return downsample_timeline(daily_timeline_df, max_points=max_points)
         return daily_timeline_df
     except Exception as e:
-        print(f"Error in daily_timeline: {e}")
+        log.exception(f"Error in daily_timeline: {e}")
         return pd.DataFrame(columns=['specific_date', 'message'])
 
-def week_activity_map(selected_user, df):
+@timed
+def week_activity_map(selected_user, df, start=None, end=None):
     # Weekly activity map.
+    df = slice_date_range(df, start, end)
     if selected_user != 'Overall':
         df_filtered = df[df['users'] == selected_user]
     else:
@@ -204,11 +369,13 @@ def week_activity_map(selected_user, df):
     try:
         return df_filtered["day_name"].value_counts()
     except Exception as e:
-        print(f"Error in week_activity_map: {e}")
+        log.exception(f"Error in week_activity_map: {e}")
         return pd.Series(dtype='int')
 
-def month_activity_map(selected_user, df):
+@timed
+def month_activity_map(selected_user, df, start=None, end=None):
     # Monthly activity map.
+    df = slice_date_range(df, start, end)
     if selected_user != 'Overall':
         df_filtered = df[df['users'] == selected_user]
     else:
@@ -220,11 +387,13 @@ def month_activity_map(selected_user, df):
     try:
         return df_filtered["month"].value_counts()
     except Exception as e:
-        print(f"Error in month_activity_map: {e}")
+        log.exception(f"Error in month_activity_map: {e}")
         return pd.Series(dtype='int')
 
-def activity_heatmap(selected_user, df):
+@timed
+def activity_heatmap(selected_user, df, start=None, end=None):
     # Activity heatmap.
+    df = slice_date_range(df, start, end)
     if df.empty:
         return pd.DataFrame()
     
@@ -245,12 +414,22 @@ def activity_heatmap(selected_user, df):
         ).fillna(0)
         return user_heatmap
     except Exception as e:
-        print(f"Error in activity_heatmap: {e}")
+        log.exception(f"Error in activity_heatmap: {e}")
         return pd.DataFrame()
 
+def sentiment_label(compound):
+    """Positive, Negative or Neutral from a VADER compound score."""
+    if compound >= 0.05:
+        return 'Positive'
+    if compound <= -0.05:
+        return 'Negative'
+    return 'Neutral'
+
 # Analyze sentiment.
-def analyze_sentiment(selected_user, df):
+@timed
+def analyze_sentiment(selected_user, df, start=None, end=None):
     """Perform sentiment analysis per message."""
+    df = slice_date_range(df, start, end)
     if selected_user != 'Overall':
         df_filtered = df[df['users'] == selected_user]
     else:
@@ -266,12 +445,7 @@ def analyze_sentiment(selected_user, df):
     for message in temp['message']:
         text = str(message)
         vs = analyzer.polarity_scores(text)
-        if vs['compound'] >= 0.05:
-            sentiments.append('Positive')
-        elif vs['compound'] <= -0.05:
-            sentiments.append('Negative')
-        else:
-            sentiments.append('Neutral')
+        sentiments.append(sentiment_label(vs['compound']))
         tb = TextBlob(text)
         polarities.append(tb.polarity)
         subjectivities.append(tb.subjectivity)
@@ -282,27 +456,33 @@ def analyze_sentiment(selected_user, df):
     return temp
 
 # Sentiment summary.
-def sentiment_summary(selected_user, df):
+@timed
+def sentiment_summary(selected_user, df, start=None, end=None):
     """Summarize sentiment counts."""
-    sentiment_df = analyze_sentiment(selected_user, df)
+    sentiment_df = analyze_sentiment(selected_user, df, start, end)
     if sentiment_df.empty or 'sentiment' not in sentiment_df.columns:
         return pd.DataFrame(columns=['Sentiment', 'Count'])
     summary = sentiment_df['sentiment'].value_counts().reset_index()
     summary.columns = ['Sentiment', 'Count']
     return summary
 
-def emotion_timeline(selected_user, df):
-    # Emotion timeline.
-    sentiment_df = analyze_sentiment(selected_user, df)
+@timed
+def emotion_timeline(selected_user, df, start=None, end=None, max_points=None):
+    # Emotion timeline; max_points as in daily_timeline.
+    sentiment_df = analyze_sentiment(selected_user, df, start, end)
     if sentiment_df.empty:
         return pd.DataFrame()
     sentiment_df['date'] = pd.to_datetime(sentiment_df['date'])
     sentiment_df['specific_date'] = sentiment_df['date'].dt.date  # Add this line for plotting
     timeline = sentiment_df.groupby(['specific_date', 'sentiment']).size().unstack(fill_value=0).reset_index()
+    if max_points:
+        return downsample_timeline(timeline, max_points=max_points)
     return timeline
 
-def emoji_analysis(selected_user, df):
+@timed
+def emoji_analysis(selected_user, df, start=None, end=None):
     # Emoji analysis.
+    df = slice_date_range(df, start, end)
     if selected_user != 'Overall':
         df_filtered = df[df['users'] == selected_user]
     else:
@@ -317,8 +497,10 @@ def emoji_analysis(selected_user, df):
     emoji_df = pd.DataFrame(Counter(emojis).most_common(20), columns=['Emoji', 'Count'])
     return emoji_df
 
-def message_length_analysis(selected_user, df):
+@timed
+def message_length_analysis(selected_user, df, start=None, end=None):
     # Message length analysis.
+    df = slice_date_range(df, start, end)
     if selected_user != 'Overall':
         df_filtered = df[df['users'] == selected_user]
     else:
@@ -334,51 +516,250 @@ def message_length_analysis(selected_user, df):
         temp['users'] = df_filtered['users']
     return temp[['users', 'message_length']]
 
-def response_time_analysis(df):
+@timed
+def response_time_analysis(df, start=None, end=None):
     # Response time analysis.
     # Only for overall, not per user
+    df = slice_date_range(df, start, end)
     df_sorted = df.sort_values('date')
     df_sorted = df_sorted[~df_sorted['users'].isin(['group_notification', 'unknown_user', 'empty_message', 'error_processing'])]
     if df_sorted.empty or df_sorted.shape[0] < 2:
         return pd.DataFrame(columns=['responder', 'response_time_minutes'])
-    response_times = []
-    prev_user = None
-    prev_time = None
-    for idx, row in df_sorted.iterrows():
-        user = row['users']
-        time = row['date']
-        if prev_user is not None and user != prev_user:
-            diff = (time - prev_time).total_seconds() / 60.0
-            if 0 < diff < 720:  # Ignore gaps > 12 hours
-                response_times.append({'responder': user, 'response_time_minutes': diff})
-        prev_user = user
-        prev_time = time
-    return pd.DataFrame(response_times)
-
-def conversation_starters(df):
-    # Conversation starters.
-    # A conversation is started if the time gap from previous message is > 2 hours
-    df_sorted = df.sort_values('date')
+    # A reply is a message by someone other than the previous sender
+    users = df_sorted['users'].to_numpy()
+    nanoseconds = np.diff(df_sorted['date'].to_numpy()).astype('timedelta64[ns]').astype(np.int64)
+    minutes = nanoseconds / 1e9 / 60.0
+    replies = (users[1:] != users[:-1]) & (minutes > 0) & (minutes < 720)  # Ignore gaps > 12 hours
+    return pd.DataFrame({'responder': users[1:][replies], 'response_time_minutes': minutes[replies]})
+
+# Quantiles reported with every binned distribution
+DISTRIBUTION_QUANTILES = (0.25, 0.5, 0.75, 0.9, 0.99)
+
+def _box_stats(values, groups):
+    """Tukey box-plot statistics per group, busiest group first."""
+    columns = ['group', 'count', 'mean', 'lower_fence', 'q1', 'median', 'q3', 'upper_fence', 'outliers']
+    if not len(values):
+        return pd.DataFrame(columns=columns)
+    frame = pd.DataFrame({'group': np.asarray(groups), 'value': values})
+    grouped = frame.groupby('group', sort=False)['value']
+    stats = grouped.agg(['count', 'mean'])
+    quartiles = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    stats['q1'], stats['median'], stats['q3'] = quartiles[0.25], quartiles[0.5], quartiles[0.75]
+    # Whiskers end at the most extreme values within 1.5 IQR of the quartiles
+    reach = 1.5 * (stats['q3'] - stats['q1'])
+    inside = frame['value'].between(frame['group'].map(stats['q1'] - reach), frame['group'].map(stats['q3'] + reach))
+    fences = frame[inside].groupby('group', sort=False)['value'].agg(['min', 'max'])
+    stats['lower_fence'], stats['upper_fence'] = fences['min'], fences['max']
+    stats['outliers'] = (~inside).groupby(frame['group'], sort=False).sum()
+    stats = stats.rename_axis('group').reset_index().sort_values('count', ascending=False, kind='mergesort')
+    return stats[columns].reset_index(drop=True)
+
+def binned_distribution(values, groups=None, bins=30, value_range=None):
+    """Histogram, quantiles and per-group box statistics of values, sized by bins rather than by len(values).
+
+    Returns a dict with 'count', 'mean', 'quantiles' ({q: value} for
+    DISTRIBUTION_QUANTILES), 'histogram' (bin_start, bin_end, count) and,
+    when groups are given, 'box' (one row per group, see _box_stats).
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values):
+        counts, edges = np.histogram(values, bins=bins, range=value_range)
+        quantiles = dict(zip(DISTRIBUTION_QUANTILES, np.quantile(values, DISTRIBUTION_QUANTILES).tolist()))
+    else:
+        counts, edges, quantiles = np.zeros(0, dtype=np.int64), np.zeros(1), {}
+    distribution = {
+        'count': int(len(values)),
+        'mean': float(values.mean()) if len(values) else None,
+        'quantiles': quantiles,
+        'histogram': pd.DataFrame({'bin_start': edges[:-1], 'bin_end': edges[1:], 'count': counts}),
+    }
+    if groups is not None:
+        distribution['box'] = _box_stats(values, groups)
+    return distribution
+
+@timed
+def message_length_distribution(selected_user, df, bins=30, start=None, end=None):
+    """Message lengths pre-binned for charts, with per-user box statistics (see binned_distribution)."""
+    lengths = message_length_analysis(selected_user, df, start, end)
+    return binned_distribution(lengths['message_length'], lengths['users'], bins)
+
+@timed
+def response_time_distribution(df, bins=20, start=None, end=None):
+    """Response times in minutes pre-binned for charts, with per-responder box statistics."""
+    responses = response_time_analysis(df, start, end)
+    return binned_distribution(responses['response_time_minutes'], responses['responder'], bins)
+
+@timed
+def build_sessions(df, gap_minutes=120, start=None, end=None):
+    """Split the chat into conversation sessions separated by idle gaps."""
+    df = slice_date_range(df, start, end)
+    columns = ['session_id', 'start', 'end', 'duration_minutes', 'message_count',
+               'participant_count', 'participants', 'starter', 'closer']
+    # Sorted before filtering, like the loop this replaced, so messages with equal
+    # timestamps come in the same order and the same one starts a session
+    df_sorted = df[['date', 'users']].sort_values('date')
     df_sorted = df_sorted[~df_sorted['users'].isin(['group_notification', 'unknown_user', 'empty_message', 'error_processing'])]
-    if df_sorted.empty or df_sorted.shape[0] < 2:
+    if df_sorted.empty:
+        return pd.DataFrame(columns=columns)
+
+    # A new session starts whenever the gap from the previous message exceeds the threshold
+    gaps = df_sorted['date'].diff()
+    new_session = (gaps > pd.Timedelta(minutes=gap_minutes)) | gaps.isna()
+    session_ids = new_session.cumsum().to_numpy() - 1
+    df_sorted = df_sorted.assign(session_id=session_ids)
+
+    grouped = df_sorted.groupby('session_id', sort=True)
+    sessions = grouped.agg(
+        start=('date', 'first'),
+        end=('date', 'last'),
+        message_count=('date', 'size'),
+        participant_count=('users', 'nunique'),
+        starter=('users', 'first'),
+        closer=('users', 'last'),
+    )
+    participants = df_sorted.drop_duplicates(['session_id', 'users']).astype({'users': object})
+    sessions['participants'] = participants.groupby('session_id')['users'].agg(list)
+    # Plain labels even when users is categorical, so starter counts skip absent members
+    sessions[['starter', 'closer']] = sessions[['starter', 'closer']].astype(object)
+    sessions['duration_minutes'] = (sessions['end'] - sessions['start']).dt.total_seconds() / 60.0
+    return sessions.reset_index()[columns]
+
+@timed
+def conversation_starters(df, sessions=None, gap_minutes=120, start=None, end=None):
+    # Conversation starters.
+    # A conversation is started if the time gap from previous message is > gap_minutes (2 hours by default)
+    if sessions is None:
+        df = slice_date_range(df, start, end)
+        if df[~df['users'].isin(['group_notification', 'unknown_user', 'empty_message', 'error_processing'])].shape[0] < 2:
+            return pd.DataFrame(columns=['User', 'Conversations_Started'])
+        sessions = build_sessions(df, gap_minutes)
+    if sessions.empty:
         return pd.DataFrame(columns=['User', 'Conversations_Started'])
-    starters = []
-    prev_time = None
-    prev_user = None
-    for idx, row in df_sorted.iterrows():
-        user = row['users']
-        time = row['date']
-        if prev_time is None or (time - prev_time).total_seconds() > 7200:
-            starters.append(user)
-        prev_time = time
-        prev_user = user
-    starter_counts = Counter(starters)
-    starter_df = pd.DataFrame(starter_counts.items(), columns=['User', 'Conversations_Started'])
+    starter_df = sessions['starter'].value_counts().reset_index()
+    starter_df.columns = ['User', 'Conversations_Started']
     starter_df = starter_df.sort_values('Conversations_Started', ascending=False).reset_index(drop=True)
     return starter_df
 
-def get_chat_insights(selected_user, df):
+@timed
+def session_length_distribution(df, sessions=None, gap_minutes=120, start=None, end=None):
+    # Session lengths (messages and minutes) for distribution charts.
+    if sessions is None:
+        sessions = build_sessions(df, gap_minutes, start, end)
+    if sessions.empty:
+        return pd.DataFrame(columns=['message_count', 'duration_minutes'])
+    return sessions[['message_count', 'duration_minutes']]
+
+@timed
+def sessions_per_day(df, sessions=None, gap_minutes=120, start=None, end=None, max_points=None):
+    # Number of sessions started per day; max_points as in daily_timeline.
+    if sessions is None:
+        sessions = build_sessions(df, gap_minutes, start, end)
+    if sessions.empty:
+        return pd.DataFrame(columns=['specific_date', 'sessions'])
+    per_day = sessions.groupby(sessions['start'].dt.date).size().reset_index()
+    per_day.columns = ['specific_date', 'sessions']
+    if max_points:
+        return downsample_timeline(per_day, max_points=max_points)
+    return per_day
+
+@timed
+def extract_mentions(df, start=None, end=None):
+    """Find @mentions in one pass and resolve them against known users."""
+    df = slice_date_range(df, start, end)
+    columns = ['message_index', 'date', 'mentioner', 'mentioned']
+    system_users = ['group_notification', 'unknown_user', 'empty_message', 'error_processing']
+    user_df = df[~df['users'].isin(system_users)]
+    users = sorted(user_df['users'].unique().tolist())
+    if not users:
+        return pd.DataFrame(columns=columns)
+
+    # Lookup from normalized name (and digits for phone numbers) to user
+    lookup = {}
+    max_words = 1
+    for user in users:
+        words = str(user).lower().split()
+        if not words:
+            continue
+        lookup[' '.join(words)] = user
+        max_words = max(max_words, len(words))
+        digits = re.sub(r'\D', '', str(user))
+        if len(digits) >= 6 and not re.search(r'[^\d\s+()-]', str(user)):
+            lookup[digits] = user
+
+    candidates = user_df['message'].astype(str)
+    candidates = candidates[candidates.str.contains('@', regex=False)]
+    if candidates.empty:
+        return pd.DataFrame(columns=columns)
+    mention_pattern = r'(?<!\w)@([^\s@]+(?:[ \t]+[^\s@]+){0,%d})' % (max_words - 1)
+    found = candidates.str.extractall(mention_pattern)[0]
+    if found.empty:
+        return pd.DataFrame(columns=columns)
+
+    # Longest known name wins, so "@Bob Smith" beats "@Bob"
+    resolved = []
+    for text in found:
+        words = [w.strip('.,!?:;()"\'') for w in text.lower().split()]
+        match = None
+        for n in range(len(words), 0, -1):
+            match = lookup.get(' '.join(words[:n]))
+            if match is not None:
+                break
+        if match is None and words:
+            match = lookup.get(re.sub(r'\D', '', words[0]))
+        resolved.append(match)
+
+    message_index = found.index.get_level_values(0)
+    mentions = pd.DataFrame({
+        'message_index': message_index,
+        'date': user_df.loc[message_index, 'date'].to_numpy(),
+        'mentioner': user_df.loc[message_index, 'users'].to_numpy(),
+        'mentioned': resolved,
+    }).dropna(subset=['mentioned'])
+    mentions['mentioner'] = pd.Categorical(mentions['mentioner'], categories=users)
+    mentions['mentioned'] = pd.Categorical(mentions['mentioned'], categories=users)
+    return mentions.reset_index(drop=True)
+
+@timed
+def mention_matrix(mentions, start=None, end=None):
+    """Sparse mentioner x mentioned counts (only non-zero pairs)."""
+    mentions = slice_date_range(mentions, start, end)
+    if mentions.empty:
+        return pd.DataFrame(columns=['mentioner', 'mentioned', 'count'])
+    counts = mentions.groupby(['mentioner', 'mentioned'], observed=True).size().reset_index(name='count')
+    counts = counts.sort_values('count', ascending=False).reset_index(drop=True)
+    return counts
+
+@timed
+def mention_summary(selected_user, mentions, start=None, end=None):
+    # Most mentioned users, or who a user mentions and is mentioned by.
+    mentions = slice_date_range(mentions, start, end)
+    if mentions.empty:
+        return pd.DataFrame(columns=['User', 'Mentions'])
+    if selected_user != 'Overall':
+        counts = mentions.loc[mentions['mentioner'] == selected_user, 'mentioned'].value_counts()
+    else:
+        counts = mentions['mentioned'].value_counts()
+    counts = counts[counts > 0]
+    summary = counts.reset_index()
+    summary.columns = ['User', 'Mentions']
+    return summary
+
+@timed
+def mention_messages(df, mentions, mentioner=None, mentioned=None):
+    # Messages behind a mention pair, for drill-down.
+    selected = mentions
+    if mentioner is not None:
+        selected = selected[selected['mentioner'] == mentioner]
+    if mentioned is not None:
+        selected = selected[selected['mentioned'] == mentioned]
+    if selected.empty:
+        return pd.DataFrame(columns=['date', 'users', 'message'])
+    return df.loc[selected['message_index'].unique(), ['date', 'users', 'message']]
+
+@timed
+def get_chat_insights(selected_user, df, start=None, end=None):
     # Chat insights summary.
+    df = slice_date_range(df, start, end)
     if df.empty:
         return {}
     if selected_user != 'Overall':
@@ -426,8 +807,10 @@ def get_chat_insights(selected_user, df):
         'unique_links_shared': len(set(links))
     }
 
-def analyze_urls(selected_user, df):
+@timed
+def analyze_urls(selected_user, df, start=None, end=None):
     # Analyze URL domains.
+    df = slice_date_range(df, start, end)
     if selected_user != 'Overall':
         df_filtered = df[df['users'] == selected_user]
     else:
@@ -465,8 +848,10 @@ def analyze_urls(selected_user, df):
     domain_df = pd.DataFrame(domain_counts.items(), columns=['Domain', 'Count']).sort_values(by='Count', ascending=False)
     return domain_df
 
-def export_analysis_summary(selected_user, df):
+@timed
+def export_analysis_summary(selected_user, df, start=None, end=None):
     # Export analysis summary.
+    df = slice_date_range(df, start, end)
     insights = get_chat_insights(selected_user, df)
     if not insights:
         return "No data available."
@@ -0,0 +1,167 @@
+"""Stage timings for the parser and the helper analyses.
+
+Every instrumented call produces a record with its duration, input rows and
+output size. Records go to the active collection (the app shows the ones from
+the current render) and, when enabled, to the ``analyzer.perf`` logger as
+structured JSON lines:
+
+    ANALYZER_PERF_LOG=1 streamlit run app.py
+"""
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import sys
+import time
+
+import pandas as pd
+
+log = logging.getLogger('analyzer.perf')
+
+_records = contextvars.ContextVar('perf_records', default=None)
+_depth = contextvars.ContextVar('perf_depth', default=0)
+_observers = []
+
+
+def _size(value):
+    """Rows in a frame-like result (first frame of a tuple), items in a container, else None."""
+    if isinstance(value, (pd.DataFrame, pd.Series, list, dict)):
+        return len(value)
+    if isinstance(value, tuple):
+        for item in value:
+            if isinstance(item, (pd.DataFrame, pd.Series)):
+                return len(item)
+    return None
+
+
+def _input_rows(args, kwargs):
+    for value in list(args) + list(kwargs.values()):
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            return len(value)
+    return None
+
+
+def add_observer(fn):
+    """Call fn(record) for every finished stage, e.g. to feed metrics."""
+    if fn not in _observers:
+        _observers.append(fn)
+
+
+def _emit(record):
+    records = _records.get()
+    if records is not None:
+        records.append(record)
+    for observer in _observers:
+        try:
+            observer(record)
+        except Exception:
+            log.exception("Timing observer failed")
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("%s took %.1f ms", record['stage'], record['duration_ms'], extra={'perf': record})
+
+
+@contextlib.contextmanager
+def stage(name, rows_in=None):
+    """Time a block; set record['rows_out'] inside it to report the output size."""
+    record = {'stage': name, 'duration_ms': None, 'rows_in': rows_in, 'rows_out': None,
+              'depth': _depth.get(), 'ok': True}
+    token = _depth.set(record['depth'] + 1)
+    started = time.perf_counter()
+    try:
+        yield record
+    except BaseException:
+        record['ok'] = False
+        raise
+    finally:
+        _depth.reset(token)
+        record['duration_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        _emit(record)
+
+
+def timed(fn=None, *, name=None):
+    """Decorator recording a stage() for every call; usable as @timed or @timed(name=...)."""
+    if fn is None:
+        return functools.partial(timed, name=name)
+    label = name or f"{fn.__module__}.{fn.__name__}"
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with stage(label, _input_rows(args, kwargs)) as record:
+            result = fn(*args, **kwargs)
+            record['rows_out'] = _size(result)
+            return result
+    return wrapper
+
+
+@contextlib.contextmanager
+def collect():
+    """Gather the records of every instrumented call made inside the block."""
+    records = []
+    token = _records.set(records)
+    try:
+        yield records
+    finally:
+        _records.reset(token)
+
+
+def call_collected(fn, *args, **kwargs):
+    """fn(*args, **kwargs) and the records it produced, for work run in another process."""
+    with collect() as records:
+        result = fn(*args, **kwargs)
+    return result, records
+
+
+def start_collection():
+    """Start a fresh collection for the rest of this thread's work (one Streamlit render)."""
+    records = []
+    _records.set(records)
+    return records
+
+
+def summarize(records):
+    """One row per stage: calls, total and slowest time, largest input and output."""
+    columns = ['Stage', 'Calls', 'Total ms', 'Max ms', 'Rows in', 'Rows out']
+    if not records:
+        return pd.DataFrame(columns=columns)
+    frame = pd.DataFrame(records)
+    summary = frame.groupby('stage', sort=False).agg(
+        calls=('duration_ms', 'size'),
+        total=('duration_ms', 'sum'),
+        slowest=('duration_ms', 'max'),
+        rows_in=('rows_in', 'max'),
+        rows_out=('rows_out', 'max'),
+    ).reset_index()
+    summary.columns = columns
+    summary['Total ms'] = summary['Total ms'].round(1)
+    summary['Max ms'] = summary['Max ms'].round(1)
+    return summary.sort_values('Total ms', ascending=False).reset_index(drop=True)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per log line, with the timing record's fields at the top level."""
+
+    def format(self, record):
+        payload = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        payload.update(getattr(record, 'perf', {}))
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def configure_logging(level=logging.DEBUG, stream=None, loggers=('analyzer.perf', 'preprocessor', 'helper')):
+    """Send timing records and parser/helper logs to stream (stderr) as JSON lines."""
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter())
+    for name in loggers:
+        logger = logging.getLogger(name)
+        # Repeated calls (e.g. Streamlit reruns) must not stack handlers
+        if not any(isinstance(h.formatter, JsonFormatter) for h in logger.handlers):
+            logger.addHandler(handler)
+        logger.setLevel(level)
+    return handler
@@ -0,0 +1,158 @@
+import codecs
+import contextlib
+import glob
+import io
+import os
+import zipfile
+
+EXPORT_EXTENSIONS = ('.txt', '.zip')
+ZIP_MAGIC = b'PK\x03\x04'
+# Bytes decoded per chunk when streaming chat text
+CHUNK_SIZE = 1 << 20
+# Bytes inspected to pick the encoding
+PREFIX_SIZE = 4096
+# UTF-32 first: its little-endian BOM starts with the UTF-16 one
+BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+
+def find_exports(inputs, recursive=False):
+    """Expand files, directories and glob patterns into export paths."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            pattern = os.path.join(item, '**', '*') if recursive else os.path.join(item, '*')
+            candidates = glob.glob(pattern, recursive=recursive)
+        else:
+            candidates = glob.glob(item, recursive=recursive) or [item]
+        for path in sorted(candidates):
+            if os.path.isfile(path) and path.lower().endswith(EXPORT_EXTENSIONS) and path not in paths:
+                paths.append(path)
+    return paths
+
+
+def chat_members(zip_file):
+    """Names of the chat text files inside an export zip."""
+    return [name for name in zip_file.namelist() if name.lower().endswith('.txt')]
+
+
+def detect_encoding(prefix):
+    """Codec for chat text starting with these bytes: a BOM if present, else UTF-16 by its zero bytes, else UTF-8."""
+    for bom, encoding in BOMS:
+        if prefix.startswith(bom):
+            return encoding
+    # Mostly-ASCII UTF-16 without a BOM has a zero in every other byte
+    sample = prefix[:PREFIX_SIZE - PREFIX_SIZE % 2]
+    half = len(sample) // 2
+    if half:
+        even_zeros, odd_zeros = sample[0::2].count(0), sample[1::2].count(0)
+        if odd_zeros > half * 0.3 and even_zeros < half * 0.05:
+            return 'utf-16-le'
+        if even_zeros > half * 0.3 and odd_zeros < half * 0.05:
+            return 'utf-16-be'
+    return 'utf-8'
+
+
+class TextStream:
+    """Chat text of a .txt export, or of one .txt inside a .zip export, decoded in chunks.
+
+    source is a path, the export's bytes or a seekable binary file. Iterating
+    opens it and yields str chunks, so only one chunk of raw and decoded text
+    is held at a time; zip members are decompressed as they are read.
+    """
+
+    def __init__(self, source, member=None, chunk_size=CHUNK_SIZE):
+        self.source = source
+        self.member = member
+        self.chunk_size = chunk_size
+        self.encoding = None
+        self.size = None
+        self.bytes_read = 0
+
+    @property
+    def chars_hint(self):
+        """Estimated characters of text, known once iteration has started (0 before)."""
+        if not self.size:
+            return 0
+        width = 4 if self.encoding == 'utf-32' else 2 if self.encoding and self.encoding.startswith('utf-16') else 1
+        return self.size // width
+
+    @contextlib.contextmanager
+    def _open(self):
+        source = self.source
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            # BytesIO shares a bytes object's buffer instead of copying it
+            fileobj, close = io.BytesIO(source), False
+        elif isinstance(source, (str, os.PathLike)):
+            fileobj, close = open(source, 'rb'), True
+        else:
+            fileobj, close = source, False
+            fileobj.seek(0)
+        try:
+            head = fileobj.read(len(ZIP_MAGIC))
+            fileobj.seek(-len(head), io.SEEK_CUR)
+            if head == ZIP_MAGIC:
+                with zipfile.ZipFile(fileobj) as z:
+                    members = chat_members(z)
+                    if not members:
+                        raise ValueError("No .txt file found in the .zip export")
+                    info = z.getinfo(self.member or members[0])
+                    self.size = info.file_size
+                    with z.open(info) as txt_file:
+                        yield txt_file
+            else:
+                start = fileobj.tell()
+                self.size = fileobj.seek(0, io.SEEK_END) - start
+                fileobj.seek(start)
+                yield fileobj
+        finally:
+            if close:
+                fileobj.close()
+
+    def __iter__(self):
+        with self._open() as raw:
+            prefix = raw.read(PREFIX_SIZE)
+            self.encoding = detect_encoding(prefix)
+            decoder = codecs.getincrementaldecoder(self.encoding)()
+            self.bytes_read = len(prefix)
+            text = decoder.decode(prefix)
+            if text:
+                yield text
+            for block in iter(lambda: raw.read(self.chunk_size), b''):
+                self.bytes_read += len(block)
+                text = decoder.decode(block)
+                if text:
+                    yield text
+            text = decoder.decode(b'', final=True)
+            if text:
+                yield text
+
+    def read(self):
+        """The whole text as one string."""
+        return ''.join(self)
+
+
+def read_export(path, member=None):
+    """Return the chat text of a .txt export or of one .txt inside a .zip export."""
+    return TextStream(path, member).read()
+
+
+def decode_export(payload, member=None):
+    """Chat text from the raw bytes of an uploaded .txt or .zip export."""
+    return TextStream(payload, member).read()
+
+
+def iter_chats(path):
+    """(label, member) for every chat in an export; member is None for .txt files."""
+    if path.lower().endswith('.zip'):
+        with zipfile.ZipFile(path) as z:
+            members = chat_members(z)
+        if len(members) == 1:
+            return [(os.path.basename(path), members[0])]
+        return [(f"{os.path.basename(path)}:{name}", name) for name in members]
+    return [(os.path.basename(path), None)]
@@ -0,0 +1,181 @@
+"""Concurrent-session load test of the analysis pipeline, run entirely in-process.
+
+    python loadtest.py --sessions 8 --size 50000 --rounds 2 --think 1.5
+    python loadtest.py --sessions 4,8,16 --size 20000 --skip sentiment_summary,emotion_timeline
+
+Each simulated analyst uploads a chat, renders the page for the whole group,
+then switches between members, pausing for a think time between actions, like
+app.py sessions sharing one Streamlit server process.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import loader
+import metrics
+import pipeline
+import preprocessor
+import synthetic
+from bench import RSSSampler
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def _users(df):
+    counts = df[~df['users'].isin(['group_notification', 'unknown_user', 'empty_message', 'error_processing'])]['users']
+    return counts.value_counts().index.tolist()
+
+
+def run_session(session, payload, rounds, think, skip, rng, latencies, errors, lock):
+    """One analyst: upload, full page for the group, then `rounds` user switches."""
+    def record(action, seconds):
+        with lock:
+            latencies.setdefault(action, []).append(seconds)
+
+    try:
+        tick = time.perf_counter()
+        df = preprocessor.preprocess(loader.TextStream(payload))
+        record('upload', time.perf_counter() - tick)
+
+        users = ['Overall'] + _users(df)
+        for step in range(rounds + 1):
+            if think > 0:
+                time.sleep(rng.exponential(think))
+            selected_user = 'Overall' if step == 0 else users[1 + (session + step - 1) % max(len(users) - 1, 1)]
+            tick = time.perf_counter()
+            pipeline.render_page(df, selected_user, skip, on_step=lambda name, seconds: record(f'step.{name}', seconds))
+            record('page' if step == 0 else 'switch_user', time.perf_counter() - tick)
+    except Exception as e:
+        with lock:
+            errors.append(f"session {session}: {e!r}")
+
+
+def summarize_latencies(samples):
+    values = np.asarray(samples)
+    summary = {f'p{p}': round(float(np.percentile(values, p)), 4) for p in PERCENTILES}
+    summary.update(count=int(len(values)), mean=round(float(values.mean()), 4), max=round(float(values.max()), 4))
+    return summary
+
+
+def run_load(sessions=4, size=20000, rounds=2, think=1.0, ramp=0.0, chats=None, skip=(), seed=0, log=print):
+    """Run `sessions` concurrent analysts and return latency, throughput and memory figures."""
+    chats = chats or sessions
+    log(f"Generating {chats} chat(s) of {size} messages")
+    payloads = [synthetic.generate_text(size, seed=seed + i).encode('utf-8') for i in range(chats)]
+
+    latencies, errors, lock = {}, [], threading.Lock()
+    rngs = [np.random.default_rng([seed, i]) for i in range(sessions)]
+    threads = []
+    log(f"Starting {sessions} sessions ({rounds} user switches each, think time {think}s)")
+    with RSSSampler(interval=0.05) as rss:
+        started = time.perf_counter()
+        for i in range(sessions):
+            thread = threading.Thread(target=run_session, name=f'session-{i}', daemon=True,
+                                      args=(i, payloads[i % chats], rounds, think, skip, rngs[i], latencies, errors, lock))
+            threads.append(thread)
+            thread.start()
+            if ramp > 0:
+                time.sleep(ramp / sessions)
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    actions = {name: summarize_latencies(values) for name, values in sorted(latencies.items())}
+    completed = sessions - len(errors)
+    renders = len(latencies.get('page', [])) + len(latencies.get('switch_user', []))
+    return {
+        'sessions': sessions,
+        'size': size,
+        'rounds': rounds,
+        'think': think,
+        'elapsed_seconds': round(elapsed, 3),
+        'completed_sessions': completed,
+        'errors': errors,
+        'throughput': {
+            'sessions_per_minute': round(completed / elapsed * 60, 2) if elapsed else None,
+            'renders_per_second': round(renders / elapsed, 3) if elapsed else None,
+            'messages_parsed_per_second': round(len(latencies.get('upload', [])) * size / elapsed, 1) if elapsed else None,
+        },
+        'memory': {
+            'rss_start_bytes': rss.start,
+            'rss_peak_bytes': rss.peak,
+            'rss_growth_bytes': (rss.peak - rss.start) if rss.start is not None else None,
+            'process_peak_bytes': metrics.peak_rss_bytes(),
+        },
+        'latency': actions,
+    }
+
+
+def as_results(run):
+    """Flatten a run into bench.py result rows so `bench.py compare` can diff two load tests."""
+    rows = []
+    for action in ('upload', 'page', 'switch_user'):
+        if action in run['latency']:
+            for p in ('p50', 'p95'):
+                rows.append({'benchmark': f"load.{run['sessions']}x.{action}.{p}", 'size': run['size'],
+                             'seconds': run['latency'][action][p]})
+    return rows
+
+
+def print_run(run):
+    print(f"\n{run['sessions']} sessions x {run['size']} messages: {run['completed_sessions']} completed "
+          f"in {run['elapsed_seconds']:.1f}s, {run['throughput']['renders_per_second']} renders/s, "
+          f"peak RSS {(run['memory']['rss_peak_bytes'] or 0) / 1e6:.0f} MB")
+    print(f"  {'action':<34}{'count':>7}" + ''.join(f"{'p' + str(p):>9}" for p in PERCENTILES) + f"{'max':>9}")
+    ordered = [a for a in ('upload', 'page', 'switch_user') if a in run['latency']]
+    ordered += sorted((a for a in run['latency'] if a.startswith('step.')),
+                      key=lambda a: -run['latency'][a]['p95'])[:10]
+    for action in ordered:
+        stats = run['latency'][action]
+        print(f"  {action:<34}{stats['count']:>7}" + ''.join(f"{stats['p' + str(p)]:>8.3f}s" for p in PERCENTILES)
+              + f"{stats['max']:>8.3f}s")
+    for error in run['errors'][:5]:
+        print(f"  ERROR {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent analysts against the analysis pipeline.")
+    parser.add_argument('--sessions', default='4', help="Concurrent sessions; a comma list runs several levels")
+    parser.add_argument('--size', type=int, default=20000, help="Messages per generated chat")
+    parser.add_argument('--rounds', type=int, default=2, help="User switches per session after the first page")
+    parser.add_argument('--think', type=float, default=1.0, help="Mean think time between actions, in seconds")
+    parser.add_argument('--ramp', type=float, default=0.0, help="Spread session starts over this many seconds")
+    parser.add_argument('--chats', type=int, help="Distinct chats shared by the sessions (default: one each)")
+    parser.add_argument('--skip', help="Comma-separated page steps to skip (e.g. sentiment_summary,emotion_timeline)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="Write the report as JSON")
+    args = parser.parse_args(argv)
+
+    skip = [name.strip() for name in (args.skip or '').split(',') if name.strip()]
+    unknown = [name for name in skip if name not in pipeline.APP_PAGE]
+    if unknown:
+        print(f"Unknown steps: {', '.join(unknown)}. Available: {', '.join(pipeline.APP_PAGE)}", file=sys.stderr)
+        return 2
+
+    runs = []
+    for sessions in [int(level) for level in args.sessions.split(',') if level.strip()]:
+        run = run_load(sessions, args.size, args.rounds, args.think, args.ramp, args.chats, skip, args.seed)
+        print_run(run)
+        runs.append(run)
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        report = {
+            'meta': {'created': datetime.now().isoformat(timespec='seconds'), 'cpu_count': os.cpu_count(),
+                     'skip': skip, 'seed': args.seed},
+            'runs': runs,
+            'results': [row for run in runs for row in as_results(run)],
+        }
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved report to {args.out}")
+    return 1 if any(run['errors'] for run in runs) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""Inventory of the files in an export "with media", read from the zip's central directory.
+
+    files = media.inventory("WhatsApp Chat with Family.zip")
+    shared = media.attachments(df)
+    media.usage_by_user(shared, files)
+    media.usage_by_type(shared, files)
+
+Names and sizes come from the directory at the end of the archive, so no
+attachment is ever decompressed and multi-GB exports are indexed in
+milliseconds. Messages are matched to files by the name in their
+"<file> (file attached)" line.
+"""
+import io
+import os
+import zipfile
+
+import pandas as pd
+
+import loader
+from instrumentation import timed
+
+ATTACHMENT_PATTERN = '^\u200e?' + r'(?P<android>[^\n]*?\S) \(file attached\)|<attached: (?P<ios>[^>]+)>'
+# WhatsApp's own file name prefixes, then the extension
+PREFIX_TYPES = {
+    'IMG': 'image', 'PHOTO': 'image', 'VID': 'video', 'VIDEO': 'video', 'GIF': 'gif',
+    'AUD': 'audio', 'AUDIO': 'audio', 'PTT': 'voice note', 'STK': 'sticker', 'STICKER': 'sticker',
+    'DOC': 'document', 'CONTACT': 'contact',
+}
+EXTENSION_TYPES = {
+    'jpg': 'image', 'jpeg': 'image', 'png': 'image', 'heic': 'image', 'webp': 'image',
+    'mp4': 'video', '3gp': 'video', 'mov': 'video', 'mkv': 'video',
+    'gif': 'gif',
+    'opus': 'audio', 'ogg': 'audio', 'mp3': 'audio', 'm4a': 'audio', 'aac': 'audio', 'amr': 'audio',
+    'vcf': 'contact',
+}
+SYSTEM_USERS = ['group_notification', 'unknown_user', 'empty_message', 'error_processing']
+
+
+def media_type(name):
+    """'image', 'video', 'voice note', ... for an attachment file name; 'document' if unknown."""
+    base = os.path.basename(name)
+    for part in base.replace('_', '-').split('-')[:2]:
+        if part.upper() in PREFIX_TYPES:
+            return PREFIX_TYPES[part.upper()]
+    extension = os.path.splitext(base)[1].lstrip('.').lower()
+    return EXTENSION_TYPES.get(extension, 'document')
+
+
+@timed
+def inventory(source):
+    """One row per attachment in an export zip (file, path, type, size, compressed).
+
+    source is a path, the export's bytes, a seekable binary file or an open
+    zipfile.ZipFile. The chat text itself is left out.
+    """
+    if isinstance(source, zipfile.ZipFile):
+        infos, chats = source.infolist(), set(loader.chat_members(source))
+    else:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        with zipfile.ZipFile(source) as z:
+            infos, chats = z.infolist(), set(loader.chat_members(z))
+    rows = [(os.path.basename(info.filename), info.filename, info.file_size, info.compress_size)
+            for info in infos if not info.is_dir() and info.filename not in chats]
+    files = pd.DataFrame(rows, columns=['file', 'path', 'size', 'compressed'])
+    files.insert(2, 'type', files['file'].map(media_type).astype(str))
+    return files
+
+
+@timed
+def attachments(df):
+    """One row per attached-file message (date, users, file, type)."""
+    rows = df[~df['users'].isin(SYSTEM_USERS)]
+    names = rows['message'].astype(str).str.extract(ATTACHMENT_PATTERN)
+    names = names['android'].fillna(names['ios']).dropna()
+    shared = pd.DataFrame({
+        'date': rows.loc[names.index, 'date'],
+        'users': rows.loc[names.index, 'users'].astype(str),
+        'file': names.map(os.path.basename).astype(str),
+    })
+    shared['type'] = shared['file'].map(media_type).astype(str)
+    return shared.reset_index(drop=True)
+
+
+def _matched(shared, files):
+    sizes = files.drop_duplicates('file').set_index('file')['size']
+    matched = shared.assign(bytes=shared['file'].map(sizes))
+    matched['missing'] = matched['bytes'].isna()
+    matched['bytes'] = matched['bytes'].fillna(0).astype('int64')
+    return matched
+
+
+@timed
+def usage_by_user(shared, files):
+    """Files and bytes each member shared, per type (users, type, files, bytes, missing).
+
+    missing counts attachments mentioned in the chat but absent from the zip.
+    """
+    matched = _matched(shared, files)
+    usage = matched.groupby(['users', 'type']).agg(
+        files=('file', 'size'), bytes=('bytes', 'sum'), missing=('missing', 'sum'))
+    usage = usage.reset_index().sort_values(['bytes', 'files'], ascending=False, kind='mergesort')
+    return usage.reset_index(drop=True)
+
+
+@timed
+def usage_by_type(shared, files):
+    """Per type: files in the zip, their bytes, and how many the chat references (type, files, bytes, shared)."""
+    in_zip = files.groupby('type').agg(files=('file', 'size'), bytes=('size', 'sum'))
+    referenced = shared.groupby('type').size().rename('shared')
+    usage = in_zip.join(referenced, how='outer').fillna(0).astype('int64')
+    usage = usage.rename_axis('type').reset_index().sort_values('bytes', ascending=False, kind='mergesort')
+    return usage.reset_index(drop=True)
@@ -0,0 +1,306 @@
+"""Operational metrics in the Prometheus text exposition format.
+
+    ANALYZER_METRICS_PORT=9464 streamlit run app.py
+    curl http://127.0.0.1:9464/metrics
+
+Parser and helper timings arrive through the instrumentation records; caches,
+the PDF export and the app's sessions report here directly.
+"""
+import contextlib
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import instrumentation
+
+log = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+    def samples(self):
+        """(suffix, label pairs, value) for every series of this metric."""
+        with self._lock:
+            return [('', key, value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, pairs, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(pairs)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only go up")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """A value that goes up and down; with fn, it is read from fn() at scrape time."""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), fn=None):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.fn is not None:
+            value = self.fn()
+            return [] if value is None else [('', (), value)]
+        return super().samples()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe how long the block takes, in seconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            series = [(key, dict(value, counts=list(value['counts']))) for key, value in self._values.items()]
+        samples = []
+        for key, value in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, value['counts']):
+                cumulative += count
+                samples.append(('_bucket', key + (('le', _format_value(bound)),), cumulative))
+            samples.append(('_sum', key, value['sum']))
+            samples.append(('_count', key, value['count']))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        """All metrics in the text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def rss_bytes():
+    """Resident set size of this process, or None where it can't be read."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_bytes():
+    """Highest resident set size of this process so far, or None where unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+# App sessions seen recently; Streamlit has no public count of connected sessions
+SESSION_TIMEOUT_SECONDS = 30 * 60
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def touch_session(session_id):
+    """Mark a browser session as active (call once per render)."""
+    with _sessions_lock:
+        _sessions[session_id] = time.monotonic()
+
+
+def active_sessions():
+    cutoff = time.monotonic() - SESSION_TIMEOUT_SECONDS
+    with _sessions_lock:
+        for session_id in [s for s, seen in _sessions.items() if seen < cutoff]:
+            del _sessions[session_id]
+        return len(_sessions)
+
+
+PARSE_SECONDS = REGISTRY.register(Histogram(
+    'analyzer_parse_seconds', 'Time to parse one chat export.'))
+MESSAGES_PARSED = REGISTRY.register(Counter(
+    'analyzer_messages_parsed_total', 'Messages parsed from chat exports.'))
+PARSE_RATE = REGISTRY.register(Gauge(
+    'analyzer_parse_messages_per_second', 'Parsing throughput of the most recent export.'))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'analyzer_stage_seconds', 'Duration of parser stages and helper analyses.', ['stage']))
+STAGE_ERRORS = REGISTRY.register(Counter(
+    'analyzer_stage_errors_total', 'Parser stages and helper analyses that raised.', ['stage']))
+SENTIMENT_SECONDS = REGISTRY.register(Histogram(
+    'analyzer_sentiment_seconds', 'Time spent scoring message sentiment.'))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    'analyzer_cache_requests_total', 'Cache lookups by cache and result (hit or miss).', ['cache', 'result']))
+PDF_EXPORT_SECONDS = REGISTRY.register(Histogram(
+    'analyzer_pdf_export_seconds', 'Time to build the full PDF report.'))
+ACTIVE_SESSIONS = REGISTRY.register(Gauge(
+    'analyzer_active_sessions', f'App sessions active in the last {SESSION_TIMEOUT_SECONDS // 60} minutes.',
+    fn=active_sessions))
+RESIDENT_MEMORY = REGISTRY.register(Gauge(
+    'process_resident_memory_bytes', 'Resident memory size in bytes.', fn=rss_bytes))
+PEAK_MEMORY = REGISTRY.register(Gauge(
+    'analyzer_peak_memory_bytes', 'Peak resident memory of this process in bytes.', fn=peak_rss_bytes))
+
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def _observe_stage(record):
+    seconds = record['duration_ms'] / 1000.0
+    STAGE_SECONDS.observe(seconds, stage=record['stage'])
+    if not record['ok']:
+        STAGE_ERRORS.inc(stage=record['stage'])
+    elif record['stage'] == 'preprocessor.preprocess':
+        PARSE_SECONDS.observe(seconds)
+        if record['rows_out'] and seconds > 0:
+            PARSE_RATE.set(record['rows_out'] / seconds)
+    elif record['stage'] == 'helper.analyze_sentiment':
+        SENTIMENT_SECONDS.observe(seconds)
+
+
+instrumentation.add_observer(_observe_stage)
+
+
+def record_stages(records):
+    """Count stage records from a worker process (see instrumentation.call_collected) here."""
+    for record in records:
+        _observe_stage(record)
+        if record['ok'] and record['stage'] == 'preprocessor.preprocess' and record['rows_out']:
+            MESSAGES_PARSED.inc(record['rows_out'])
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+def start_http_server(port=9464, host='127.0.0.1'):
+    """Serve /metrics on a daemon thread; repeated calls for the same address reuse the server."""
+    with _servers_lock:
+        server = _servers.get((host, port))
+        if server is None:
+            server = ThreadingHTTPServer((host, port), MetricsHandler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+            _servers[(host, port)] = server
+            log.info("Serving metrics on http://%s:%s/metrics", host, server.server_address[1])
+    return server
@@ -0,0 +1,199 @@
+"""Side-by-side analysis of several chats.
+
+    sources = multichat.upload_sources([(name, payload), ...])
+    frames, errors = multichat.parse_sources(sources, workers=4)
+    combined = multichat.combine(frames)
+    multichat.heatmaps(combined)
+
+Exports are parsed concurrently in worker processes and stacked into one
+compact frame tagged with a categorical ``chat`` column. Every comparison is a
+single grouped pass over that frame, not one pass per chat.
+"""
+import io
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+import helper
+import instrumentation
+import loader
+import metrics
+import preprocessor
+import storage
+from instrumentation import timed
+
+SYSTEM_USERS = ['group_notification', 'unknown_user', 'empty_message', 'error_processing']
+URL_PATTERN = r'https?://\S+|www\.\S+'
+# Repeated labels stored as categories in the combined frame
+CATEGORY_COLUMNS = ['users', 'day_name', 'month', 'period']
+
+
+def upload_sources(files):
+    """(label, payload, member) for every chat in uploaded (name, bytes) exports.
+
+    A zip holding several chats is split into one payload per chat, so each
+    worker is sent only the chat it parses, not the whole archive.
+    """
+    sources = []
+    for name, payload in files:
+        if payload[:4] == b'PK\x03\x04':
+            with zipfile.ZipFile(io.BytesIO(payload)) as z:
+                members = loader.chat_members(z)
+                if len(members) == 1:
+                    sources.append((name, payload, members[0]))
+                else:
+                    sources.extend((f"{name}:{member}", z.read(member), None) for member in members)
+        else:
+            sources.append((name, payload, None))
+    # The same file name uploaded twice still needs two labels
+    seen = {}
+    for i, (label, payload, member) in enumerate(sources):
+        seen[label] = seen.get(label, 0) + 1
+        if seen[label] > 1:
+            sources[i] = (f"{label} ({seen[label]})", payload, member)
+    return sources
+
+
+def _parse_source(payload, member):
+    return preprocessor.preprocess(loader.TextStream(payload, member))
+
+
+def _recorded(collected):
+    # Parse metrics from a worker process are counted in this one
+    df, records = collected
+    metrics.record_stages(records)
+    return df
+
+
+def parse_sources(sources, workers=None, on_done=None):
+    """Parse chats concurrently; returns ({label: frame}, {label: error}) in source order.
+
+    on_done(label, finished, total) is called as each chat finishes.
+    """
+    workers = max(1, min(workers or os.cpu_count() or 1, len(sources)))
+    results, errors = {}, {}
+
+    def finish(label, parse):
+        try:
+            results[label] = parse()
+        except Exception as e:
+            errors[label] = str(e)
+        if on_done is not None:
+            on_done(label, len(results) + len(errors), len(sources))
+
+    if workers == 1:
+        for label, payload, member in sources:
+            finish(label, lambda: _parse_source(payload, member))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(instrumentation.call_collected, _parse_source, payload, member): label
+                       for label, payload, member in sources}
+            for future in as_completed(futures):
+                finish(futures[future], lambda: _recorded(future.result()))
+    frames = {label: results[label] for label, _, _ in sources if label in results}
+    return frames, errors
+
+
+@timed
+def combine(frames):
+    """Stack parsed chats into one frame with a categorical `chat` column and compact dtypes."""
+    labels = [label for label, df in frames.items() if not df.empty]
+    if not labels:
+        return preprocessor.empty_frame().assign(chat=pd.Categorical([]))
+    combined = pd.concat([frames[label] for label in labels], ignore_index=True)
+    combined['chat'] = pd.Categorical.from_codes(
+        np.repeat(np.arange(len(labels)), [len(frames[label]) for label in labels]), categories=labels)
+    for column in CATEGORY_COLUMNS:
+        combined[column] = combined[column].astype('category')
+    for column, dtype in storage.INTEGER_COLUMNS.items():
+        combined[column] = combined[column].astype(dtype)
+    return combined
+
+
+@timed
+def chat_overview(combined):
+    """One row per chat: messages, members, words, media, links and activity span."""
+    user_rows = combined[~combined['users'].isin(SYSTEM_USERS)]
+    messages = user_rows['message'].astype(str)
+    features = pd.DataFrame({
+        'chat': user_rows['chat'],
+        'users': user_rows['users'],
+        'date': user_rows['date'],
+        'words': messages.str.split().str.len().fillna(0).astype(int),
+        'links': messages.str.count(URL_PATTERN).fillna(0).astype(int),
+        'media': helper.is_media(messages).astype(int),
+    })
+    overview = features.groupby('chat', observed=False).agg(
+        Messages=('date', 'size'),
+        Members=('users', 'nunique'),
+        Words=('words', 'sum'),
+        Media=('media', 'sum'),
+        Links=('links', 'sum'),
+        First=('date', 'min'),
+        Last=('date', 'max'),
+    )
+    days = (overview['Last'] - overview['First']).dt.days + 1
+    overview['Messages/Day'] = (overview['Messages'] / days).round(1)
+    return overview.rename_axis('Chat').reset_index()
+
+
+@timed
+def message_volume(combined, freq='M'):
+    """Messages per chat per month ('M') or day ('D'), in long format (chat, period, message)."""
+    if freq == 'D':
+        volume = combined.groupby(['chat', 'specific_date'], observed=True)['message'].count().reset_index()
+        volume['period'] = pd.to_datetime(volume['specific_date'])
+    elif freq == 'M':
+        volume = combined.groupby(['chat', 'year', 'month_num'], observed=True)['message'].count().reset_index()
+        volume['period'] = pd.to_datetime(pd.DataFrame({'year': volume['year'], 'month': volume['month_num'], 'day': 1}))
+    else:
+        raise ValueError(f"Unknown frequency: {freq!r} (use 'M' or 'D')")
+    return volume[['chat', 'period', 'message']]
+
+
+@timed
+def heatmaps(combined):
+    """Day-by-hour message counts for every chat, shaped like helper.activity_heatmap."""
+    counts = combined.groupby(['chat', 'day_name', 'period'], observed=True)['message'].count()
+    table = counts.unstack('period').astype(float)
+    result = {}
+    for chat in table.index.get_level_values('chat').unique():
+        heatmap = table.xs(chat, level='chat').dropna(axis=1, how='all').fillna(0)
+        heatmap.index = heatmap.index.astype(str)
+        heatmap.columns = heatmap.columns.astype(str)
+        result[chat] = heatmap
+    return result
+
+
+@timed
+def top_users(combined, n=5):
+    """The n busiest members of each chat with their share of its messages (chat, Name, Messages, Percent)."""
+    user_rows = combined[~combined['users'].isin(SYSTEM_USERS)]
+    counts = user_rows.groupby(['chat', 'users'], observed=True).size().rename('Messages').reset_index()
+    totals = counts.groupby('chat', observed=True)['Messages'].transform('sum')
+    counts['Percent'] = (counts['Messages'] / totals * 100).round(2)
+    counts = counts.sort_values(['chat', 'Messages'], ascending=[True, False], kind='mergesort')
+    ranked = counts.groupby('chat', observed=True).head(n).rename(columns={'users': 'Name'})
+    ranked['Name'] = ranked['Name'].astype(str)
+    return ranked.reset_index(drop=True)
+
+
+@timed
+def sentiment_mix(combined):
+    """Positive, Neutral and Negative message counts and shares per chat (chat, Sentiment, Count, Percent).
+
+    Uses the same VADER labels as helper.sentiment_summary, scoring every
+    message once across all chats.
+    """
+    messages = combined['message']
+    scored = combined[messages.notna() & ~messages.astype(str).str.contains("<Media omitted>", case=False, na=False)]
+    analyzer = SentimentIntensityAnalyzer()
+    labels = [helper.sentiment_label(analyzer.polarity_scores(str(text))['compound']) for text in scored['message']]
+    mix = pd.DataFrame({'chat': scored['chat'], 'Sentiment': labels})
+    mix = mix.groupby(['chat', 'Sentiment'], observed=True).size().rename('Count').reset_index()
+    mix['Percent'] = (mix['Count'] / mix.groupby('chat', observed=True)['Count'].transform('sum') * 100).round(1)
+    return mix
@@ -0,0 +1,153 @@
+import json
+import time
+import pandas as pd
+import helper
+import search
+
+
+def _stats(selected_user, df, start=None, end=None):
+    num_messages, words, media, links = helper.fetch_stats(selected_user, df, start, end)
+    return {'messages': num_messages, 'words': words, 'media': media, 'links': links}
+
+
+def _busy_users(selected_user, df, start=None, end=None):
+    return helper.most_busy_user(df, start, end)[1]
+
+
+def _response_times(selected_user, df, start=None, end=None):
+    return helper.response_time_analysis(df, start, end)
+
+
+def _response_time_distribution(selected_user, df, start=None, end=None):
+    return helper.response_time_distribution(df, start=start, end=end)
+
+
+def _message_length_distribution(selected_user, df, start=None, end=None):
+    return helper.message_length_distribution(selected_user, df, start=start, end=end)
+
+
+def _conversation_starters(selected_user, df, start=None, end=None):
+    return helper.conversation_starters(df, start=start, end=end)
+
+
+def _sessions(selected_user, df, start=None, end=None):
+    sessions = helper.build_sessions(df, start=start, end=end)
+    return sessions.drop(columns=['participants'])
+
+
+def _mentions(selected_user, df, start=None, end=None):
+    return helper.mention_matrix(helper.extract_mentions(df, start, end))
+
+
+def _insights(selected_user, df, start=None, end=None):
+    return helper.get_chat_insights(selected_user, df, start, end)
+
+
+# Analyses that can run without the UI, all called as fn(selected_user, df, start, end)
+ANALYSES = {
+    'stats': _stats,
+    'busy_users': _busy_users,
+    'monthly_timeline': helper.monthly_timeline,
+    'daily_timeline': helper.daily_timeline,
+    'week_activity': helper.week_activity_map,
+    'month_activity': helper.month_activity_map,
+    'heatmap': helper.activity_heatmap,
+    'common_words': helper.most_common_words,
+    'emoji': helper.emoji_analysis,
+    'urls': helper.analyze_urls,
+    'sentiment': helper.sentiment_summary,
+    'emotion_timeline': helper.emotion_timeline,
+    'message_lengths': helper.message_length_analysis,
+    'response_times': _response_times,
+    'message_length_distribution': _message_length_distribution,
+    'response_time_distribution': _response_time_distribution,
+    'conversation_starters': _conversation_starters,
+    'sessions': _sessions,
+    'mentions': _mentions,
+    'insights': _insights,
+    'summary': helper.export_analysis_summary,
+}
+
+# Sentiment scoring is by far the slowest step (the summary includes it), so it is opt-in for batch runs
+DEFAULT_ANALYSES = [name for name in ANALYSES
+                    if name not in ('sentiment', 'emotion_timeline', 'summary', 'message_lengths')]
+
+
+# What app.py runs to render one page after parsing, in the same order. Each step is
+# called as fn(selected_user, df, results) with the results of the steps before it.
+APP_PAGE = {
+    'fetch_stats': lambda user, df, r: helper.fetch_stats(user, df),
+    'search_index': lambda user, df, r: search.get_index(df),
+    'monthly_timeline': lambda user, df, r: helper.monthly_timeline(user, df),
+    'daily_timeline': lambda user, df, r: helper.daily_timeline(user, df, max_points=helper.TIMELINE_MAX_POINTS),
+    'week_activity_map': lambda user, df, r: helper.week_activity_map(user, df),
+    'month_activity_map': lambda user, df, r: helper.month_activity_map(user, df),
+    'activity_heatmap': lambda user, df, r: helper.activity_heatmap(user, df),
+    'most_busy_user': lambda user, df, r: helper.most_busy_user(df),
+    'extract_mentions': lambda user, df, r: helper.extract_mentions(df),
+    'mention_summary': lambda user, df, r: helper.mention_summary(user, r['extract_mentions']),
+    'mention_matrix': lambda user, df, r: helper.mention_matrix(r['extract_mentions']),
+    'create_wordcloud': lambda user, df, r: helper.create_wordcloud(user, df),
+    'most_common_words': lambda user, df, r: helper.most_common_words(user, df),
+    'sentiment_summary': lambda user, df, r: helper.sentiment_summary(user, df),
+    'emotion_timeline': lambda user, df, r: helper.emotion_timeline(user, df, max_points=helper.TIMELINE_MAX_POINTS),
+    'emoji_analysis': lambda user, df, r: helper.emoji_analysis(user, df),
+    'message_length_distribution': lambda user, df, r: helper.message_length_distribution(user, df),
+    'response_time_distribution': lambda user, df, r: helper.response_time_distribution(df),
+    'build_sessions': lambda user, df, r: helper.build_sessions(df),
+    'conversation_starters': lambda user, df, r: helper.conversation_starters(df, sessions=r['build_sessions']),
+    'sessions_per_day': lambda user, df, r: helper.sessions_per_day(df, sessions=r['build_sessions'],
+                                                                   max_points=helper.TIMELINE_MAX_POINTS),
+    'session_length_distribution': lambda user, df, r: helper.session_length_distribution(df, sessions=r['build_sessions']),
+    'analyze_urls': lambda user, df, r: helper.analyze_urls(user, df),
+    'get_chat_insights': lambda user, df, r: helper.get_chat_insights(user, df),
+    'export_analysis_summary': lambda user, df, r: helper.export_analysis_summary(user, df),
+}
+
+
+def render_page(df, selected_user='Overall', skip=(), on_step=None):
+    """Run the APP_PAGE steps like one app render; on_step(name, seconds) sees each timing."""
+    results = {}
+    for name, fn in APP_PAGE.items():
+        if name in skip:
+            continue
+        tick = time.perf_counter()
+        results[name] = fn(selected_user, df, results)
+        if on_step is not None:
+            on_step(name, time.perf_counter() - tick)
+    return results
+
+
+def parse_analyses(names):
+    """Validate a comma-separated list (or 'all'/'default') of analysis names."""
+    if not names or names == 'default':
+        return list(DEFAULT_ANALYSES)
+    if names == 'all':
+        return list(ANALYSES)
+    selected = [name.strip() for name in names.split(',') if name.strip()]
+    unknown = [name for name in selected if name not in ANALYSES]
+    if unknown:
+        raise ValueError(f"Unknown analyses: {', '.join(unknown)}. Available: {', '.join(ANALYSES)}")
+    return selected
+
+
+def run_analysis(name, df, selected_user='Overall', start=None, end=None):
+    return ANALYSES[name](selected_user, df, start, end)
+
+
+def to_jsonable(result):
+    """Convert helper results (frames, series, tuples, numpy values) to plain JSON types."""
+    if isinstance(result, pd.DataFrame):
+        frame = result.reset_index() if not isinstance(result.index, pd.RangeIndex) else result
+        return json.loads(frame.to_json(orient='records', date_format='iso', default_handler=str))
+    if isinstance(result, pd.Series):
+        return {str(key): to_jsonable(value) for key, value in result.items()}
+    if isinstance(result, dict):
+        return {str(key): to_jsonable(value) for key, value in result.items()}
+    if isinstance(result, (list, tuple)):
+        return [to_jsonable(value) for value in result]
+    if hasattr(result, 'item'):
+        return result.item()
+    if isinstance(result, (pd.Timestamp,)) or hasattr(result, 'isoformat'):
+        return result.isoformat()
+    return result
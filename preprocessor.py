@@ -1,93 +1,165 @@
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import re
 from dateutil import parser
+from instrumentation import timed
+import metrics
 
+log = logging.getLogger(__name__)
 
-def preprocess(data):
-    if not data or not isinstance(data, str):
-        print("Input data is invalid (None, empty, or not a string). Returning empty DataFrame.")
-        return pd.DataFrame(columns=[
-            'date', 'users', 'message', 'year', 'month_num', 'specific_date', 
-            'day_name', 'month', 'day', 'hour', 'minute', 'period'
-        ])
 
-    # Raw date pattern
-    pattern_str = r'\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2}(?::\d{2})?(?:\s?[APap][Mm])?\s-\s'
+COLUMNS = ['date', 'users', 'message', 'year', 'month_num', 'specific_date',
+           'day_name', 'month', 'day', 'hour', 'minute', 'period']
+
+
+def empty_frame():
+    return pd.DataFrame(columns=COLUMNS)
+
+
+# Share of the whole parse spent in each stage, for an overall progress fraction
+STAGE_WEIGHTS = {'split_messages': 0.15, 'parse_dates': 0.6, 'split_users': 0.2, 'add_time_features': 0.05}
+# Rows between progress callbacks and cancellation checks
+PROGRESS_EVERY = 5000
+# Raw date that starts every message: "12/03/19, 14:05 - " (Android) or "[12/03/19, 14:05:09] " (iOS)
+DATE_PATTERN = re.compile(r'\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2}(?::\d{2})?(?:\s?[APap][Mm])?\s-\s'
+                          r'|\u200e?\[\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2}(?::\d{2})?(?:\s?[APap][Mm])?\]\s')
+
+
+class ParseCancelled(Exception):
+    """preprocess() stopped because its cancel event was set."""
+
+
+class _Progress:
+    """Reports stage progress to a callback and checks for cancellation between chunks."""
+
+    def __init__(self, callback=None, cancel=None, total_chars=0):
+        self.callback = callback
+        self.cancel = cancel
+        self.total_chars = total_chars
+        self.chars_done = 0
+        self.messages = 0
+
+    def update(self, stage, done, total):
+        if self.cancel is not None and self.cancel.is_set():
+            raise ParseCancelled(f"Parsing cancelled during {stage}")
+        if self.callback is None:
+            return
+        stages = list(STAGE_WEIGHTS)
+        stage_fraction = done / total if total else 1.0
+        before = sum(STAGE_WEIGHTS[name] for name in stages[:stages.index(stage)])
+        self.callback({
+            'stage': stage,
+            'stage_fraction': round(stage_fraction, 4),
+            'fraction': round(min(before + STAGE_WEIGHTS[stage] * stage_fraction, 1.0), 4),
+            'chars_done': self.chars_done,
+            'chars_total': self.total_chars,
+            'messages': self.messages,
+        })
+
+
+@timed
+def split_messages(data, tracker=None):
+    """Stage 1: cut the raw export (a str or an iterable of str chunks) into (raw date, 'user: message') rows."""
+    tracker = tracker or _Progress()
     
     full_date_strings = []
     message_content = []
 
-    # Find dates
-    date_matches = list(re.finditer(pattern_str, data))
-
-    if not date_matches:
-        print("No date patterns found by finditer. Cannot extract messages. Returning empty DataFrame.")
-        return pd.DataFrame(columns=[
-            'date', 'users', 'message', 'year', 'month_num', 'specific_date', 
-            'day_name', 'month', 'day', 'hour', 'minute', 'period'
-        ])
-
-    for i, match in enumerate(date_matches):
-        current_date_str = match.group(0)  # Matched date
-        
-        # Start of message
-        start_of_message = match.end()
-        
-        # End of message: next match or end
-        end_of_message = date_matches[i+1].start() if i + 1 < len(date_matches) else len(data)
-        
-        msg_text = data[start_of_message:end_of_message].strip()
-        
+    def add_message(date_str, msg_text):
+        msg_text = msg_text.strip()
         # Add if msg exists
         if msg_text:
-            full_date_strings.append(current_date_str)
+            full_date_strings.append(date_str)
             message_content.append(msg_text)
 
-    print(f"Total messages extracted (finditer method): {len(message_content)}")
-    print(f"Total dates extracted (finditer method): {len(full_date_strings)}")
+    # Find dates; each message runs from its date to the next one. Only the
+    # unfinished last message is carried over to the next chunk.
+    buffer = ''
+    consumed = 0  # characters already dropped from the front of buffer
+    pending = None  # (date, start, end) of the message still being read
+    count = 0
+    for chunk in ([data] if isinstance(data, str) else data):
+        buffer += chunk
+        if not tracker.total_chars:
+            tracker.total_chars = getattr(data, 'chars_hint', 0)
+        for match in DATE_PATTERN.finditer(buffer, pending[2] if pending else 0):
+            if pending is not None:
+                add_message(pending[0], buffer[pending[2]:match.start()])
+            pending = (match.group(0), match.start(), match.end())
+            count += 1
+            if count % PROGRESS_EVERY == 0:
+                tracker.chars_done, tracker.messages = consumed + match.start(), len(message_content)
+                tracker.update('split_messages', tracker.chars_done, max(tracker.total_chars, tracker.chars_done))
+        if pending is not None and pending[1] > 0:
+            cut = pending[1]
+            buffer = buffer[cut:]
+            consumed += cut
+            pending = (pending[0], 0, pending[2] - cut)
+
+    if pending is None:
+        log.warning("No date patterns found by finditer. Cannot extract messages. Returning empty DataFrame.")
+        return None
+    add_message(pending[0], buffer[pending[2]:])
+    tracker.chars_done, tracker.messages = consumed + len(buffer), len(message_content)
+    tracker.total_chars = tracker.chars_done
+    tracker.update('split_messages', tracker.chars_done, tracker.chars_done)
+
+    log.info(f"Total messages extracted (finditer method): {len(message_content)}")
+    log.info(f"Total dates extracted (finditer method): {len(full_date_strings)}")
 
     if not message_content:
-        print("No non-empty messages. Returning empty DataFrame.")
-        return pd.DataFrame(columns=[
-            'date', 'users', 'message', 'year', 'month_num', 'specific_date', 
-            'day_name', 'month', 'day', 'hour', 'minute', 'period'
-        ])
+        log.warning("No non-empty messages. Returning empty DataFrame.")
+        return None
     
     # Build DataFrame
-    df = pd.DataFrame({"user_message": message_content, "raw_message_date": full_date_strings})
-    
+    return pd.DataFrame({"user_message": message_content, "raw_message_date": full_date_strings})
+
+
+@timed
+def parse_dates(df, tracker=None):
+    """Stage 2: parse the raw date strings, dropping rows that fail."""
+    tracker = tracker or _Progress()
     # Parse date safely
     def try_parse_date(date_str_val):
         # Clean date str
-        cleaned_date_str = date_str_val.replace(" - ", "").strip()
+        cleaned_date_str = date_str_val.replace(" - ", "").strip().strip('\u200e[]')
         try:
             return parser.parse(cleaned_date_str, fuzzy=True, dayfirst=True)
         except Exception:
             try:
                 return parser.parse(cleaned_date_str, fuzzy=False, dayfirst=False)
             except Exception as e:
-                print(f"Failed to parse date: '{cleaned_date_str}'. Error: {e}")
+                log.warning(f"Failed to parse date: '{cleaned_date_str}'. Error: {e}")
                 return pd.NaT
     
-    df["date"] = df["raw_message_date"].apply(try_parse_date)
+    # Parse in chunks so progress and cancellation are checked along the way
+    raw_dates = df["raw_message_date"]
+    chunks = []
+    for lo in range(0, len(raw_dates), PROGRESS_EVERY):
+        chunks.append(raw_dates.iloc[lo:lo + PROGRESS_EVERY].apply(try_parse_date))
+        tracker.update('parse_dates', lo + len(chunks[-1]), len(raw_dates))
+    df["date"] = pd.concat(chunks) if chunks else raw_dates.apply(try_parse_date)
     
     # Remove parse failures
-    df = df.dropna(subset=['date'])
-    
-    if df.empty:
-        print("No valid dates parsed. Returning empty DataFrame.")
-        return pd.DataFrame(columns=[
-            'date', 'users', 'message', 'year', 'month_num', 'specific_date', 
-            'day_name', 'month', 'day', 'hour', 'minute', 'period'
-        ])
-        
+    return df.dropna(subset=['date'])
+
+
+@timed
+def split_users(df, tracker=None):
+    """Stage 3: split each row into sender and message text."""
+    tracker = tracker or _Progress()
     users_list = []
     messages_list = [] 
     
     # Compile user regex
     user_pattern_re = re.compile(r'^([^:]+?):\s+(.*)', re.DOTALL)
 
-    for um_text in df['user_message']:
+    for row, um_text in enumerate(df['user_message'], 1):
+        if row % PROGRESS_EVERY == 0:
+            tracker.update('split_users', row, len(df))
         try:
             message_str = str(um_text).strip()  # Ensure string
             
@@ -127,7 +199,7 @@ def preprocess(data):
                     users_list.append('unknown_user')
                     messages_list.append(message_str)
         except Exception as e:
-            print(f"Error processing message: '{str(um_text)[:70]}'. Error: {e}")
+            log.warning(f"Error processing message: '{str(um_text)[:70]}'. Error: {e}")
             users_list.append('error_processing')
             messages_list.append(str(um_text)[:70] + '...' if len(str(um_text)) > 70 else str(um_text))
     
@@ -139,13 +211,19 @@ def preprocess(data):
     group_notifications_count = len(df[df['users'] == 'group_notification'])
     actual_user_messages_count = len(df[~df['users'].isin(['group_notification', 'empty_message', 'error_processing', 'unknown_user'])])
     
-    print(f"DataFrame rows: {total_df_rows}")
-    print(f"Group notif: {group_notifications_count}")
-    print(f"Actual user messages: {actual_user_messages_count}")
+    log.info(f"DataFrame rows: {total_df_rows}")
+    log.info(f"Group notif: {group_notifications_count}")
+    log.info(f"Actual user messages: {actual_user_messages_count}")
     
     # Remove temp cols
     df.drop(columns=['user_message', 'raw_message_date'], inplace=True, errors='ignore')
-    
+    tracker.update('split_users', len(df), len(df))
+    return df
+
+
+@timed
+def add_time_features(df):
+    """Stage 4: derive the calendar columns and order rows by date."""
     # Extract time parts
     df["year"] = df["date"].dt.year
     df['month_num'] = df["date"].dt.month
@@ -167,4 +245,98 @@ def preprocess(data):
             period.append(f"{hour_val:02d}-{(hour_val + 1):02d}")  # Format hours
     df['period'] = period
     
+    # Keep rows in timestamp order so date windows are contiguous slices
+    if not df['date'].is_monotonic_increasing:
+        df = df.sort_values('date', kind='mergesort')
+    
+    return df
+
+
+@timed
+def preprocess(data, progress=None, cancel=None):
+    """Parse an export into the message frame.
+
+    data is the export text, or an iterable of text chunks such as a
+    loader.TextStream, which is split as it is read. progress, if given, is
+    called with a dict (stage, stage_fraction, fraction, chars_done,
+    chars_total, messages) every few thousand rows. Setting the cancel event
+    (a threading.Event) makes the next check raise ParseCancelled.
+    """
+    streamed = not isinstance(data, (str, bytes, bytearray)) and hasattr(data, '__iter__')
+    if not streamed and (not data or not isinstance(data, str)):
+        log.warning("Input data is invalid (None, empty, or not a string). Returning empty DataFrame.")
+        return empty_frame()
+
+    tracker = _Progress(progress, cancel, 0 if streamed else len(data))
+    df = split_messages(data, tracker)
+    if df is None:
+        return empty_frame()
+
+    df = parse_dates(df, tracker)
+    if df.empty:
+        log.warning("No valid dates parsed. Returning empty DataFrame.")
+        return empty_frame()
+
+    df = split_users(df, tracker)
+    df = add_time_features(df)
+    tracker.update('add_time_features', 1, 1)
+    metrics.MESSAGES_PARSED.inc(len(df))
     return df
+
+
+def iter_frames(data, batch_messages=50000):
+    """Parse an export in batches of about batch_messages messages, yielding one frame per batch.
+
+    data is the export text or an iterable of text chunks. Only the current
+    batch is held, so consumers that aggregate as they go (sketches.ChatSketch)
+    run in flat memory however long the chat is.
+    """
+    buffer = ''
+    scanned = 0  # end of the last date found in buffer
+    count = 0
+    for chunk in ([data] if isinstance(data, str) else data):
+        buffer += chunk
+        cuts = []
+        for match in DATE_PATTERN.finditer(buffer, scanned):
+            count += 1
+            if count > batch_messages:
+                cuts.append(match.start())
+                count = 1
+            scanned = match.end()
+        start = 0
+        for cut in cuts:
+            yield preprocess(buffer[start:cut])
+            start = cut
+        if start:
+            buffer, scanned = buffer[start:], scanned - start
+    if buffer.strip():
+        yield preprocess(buffer)
+
+
+_parse_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='parse')
+
+
+class ParseJob:
+    """preprocess() on a background thread, with its latest progress and a cancel switch."""
+
+    def __init__(self, data, key=None):
+        self.key = key
+        self.progress = {'stage': None, 'stage_fraction': 0.0, 'fraction': 0.0, 'chars_done': 0,
+                         'chars_total': len(data) if isinstance(data, str) else 0, 'messages': 0}
+        self.cancel_event = threading.Event()
+        # Timing records reach the caller's collection
+        context = contextvars.copy_context()
+        self.future = _parse_pool.submit(context.run, preprocess, data, self._update, self.cancel_event)
+
+    def _update(self, record):
+        self.progress = record
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.future.cancel()
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
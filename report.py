@@ -0,0 +1,341 @@
+"""Full PDF report: gathered once per request, charts rasterized in parallel, cached by input.
+
+The app submits a report with ``submit_report`` and polls the returned future;
+identical requests (same chat window, user and session gap) reuse the cached PDF.
+"""
+import functools
+import io
+import logging
+import os
+import threading
+import urllib.request
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import seaborn as sns
+
+import helper
+import metrics
+
+log = logging.getLogger(__name__)
+
+FONT_PATHS = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",  # Linux (Debian/Ubuntu)
+    "/usr/share/fonts/TTF/DejaVuSans.ttf",  # Some Linux distros
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",  # Alpine Linux
+    "/System/Library/Fonts/Arial.ttf",  # macOS
+    "C:/Windows/Fonts/arial.ttf",  # Windows
+]
+FONT_URL = "https://github.com/dejavu-fonts/dejavu-fonts/raw/master/ttf/DejaVuSans.ttf"
+FONT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'whatsapp-analyzer', 'DejaVuSans.ttf')
+
+# Agg rasterization holds the GIL, so charts render in worker processes
+CHART_WORKERS = min(4, os.cpu_count() or 1)
+_PDF_CACHE_SIZE = 8
+_pdf_cache = OrderedDict()
+_pending = {}
+_lock = threading.Lock()
+# Report jobs run here so the page never waits for one
+_report_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='pdf-report')
+_chart_pool = None
+
+
+@functools.lru_cache(maxsize=1)
+def resolve_font():
+    """Path of a Unicode TrueType font, found or downloaded once per process (None if unavailable)."""
+    for path in FONT_PATHS + [FONT_CACHE_PATH]:
+        if os.path.exists(path):
+            return path
+    try:
+        os.makedirs(os.path.dirname(FONT_CACHE_PATH), exist_ok=True)
+        log.info("Downloading DejaVu Sans font for Unicode support...")
+        partial = FONT_CACHE_PATH + '.part'
+        urllib.request.urlretrieve(FONT_URL, partial)
+        os.replace(partial, FONT_CACHE_PATH)
+        return FONT_CACHE_PATH
+    except Exception as e:
+        log.warning(f"No Unicode font found, using Arial (limited Unicode support): {e}")
+        return None
+
+
+def collect_report_data(selected_user, df, session_gap=120):
+    """Metrics, tables and chart specs for the report; each chart spec is (kind, title, data)."""
+    insights = helper.get_chat_insights(selected_user, df)
+    summary_text = helper.export_analysis_summary(selected_user, df)
+    report_metrics = {
+        "Total Messages": f"{insights.get('total_messages', 0):,}",
+        "Duration (Days)": insights.get('date_range', {}).get('duration_days', 0),
+        "Messages/Day": f"{insights.get('avg_messages_per_day', 0):.1f}",
+        "Peak Day": insights.get('peak_activity', {}).get('day', 'N/A'),
+        "Peak Hour": f"{insights.get('peak_activity', {}).get('hour', 'N/A')}:00",
+        "Peak Month": insights.get('peak_activity', {}).get('month', 'N/A'),
+        "Total Links Shared": insights.get('total_links_shared', 0),
+        "Unique Links Shared": insights.get('unique_links_shared', 0)
+    }
+    overall = selected_user == "Overall"
+    busy_users = helper.most_busy_user(df)[1] if overall else pd.DataFrame()
+    emoji_df = helper.emoji_analysis(selected_user, df)
+    url_df = helper.analyze_urls(selected_user, df)
+    tables = {}
+    if not busy_users.empty:
+        tables["Most Active Users"] = busy_users.head(10)
+    if not emoji_df.empty:
+        tables["Top Emojis"] = emoji_df.head(10)
+    if not url_df.empty:
+        tables["Top Shared Domains"] = url_df.head(10)
+
+    charts = []
+
+    def add(kind, title, builder):
+        # A failing chart is left out of the report instead of failing it
+        try:
+            data = builder()
+            if data is not None:
+                charts.append((kind, title, data))
+        except Exception as e:
+            log.warning(f"Skipping chart '{title}': {e}")
+
+    def series_data(series):
+        return None if series.empty else {'x': [str(i) for i in series.index], 'y': series.to_numpy()}
+
+    def histogram_data(histogram):
+        edges = histogram['bin_start'].to_list() + histogram['bin_end'].tail(1).to_list()
+        return {'counts': histogram['count'].to_numpy(), 'edges': edges}
+
+    timeline = helper.monthly_timeline(selected_user, df)
+    add('line', f"Monthly Activity - {selected_user}",
+        lambda: None if timeline.empty else {'x': timeline['time'].astype(str).tolist(), 'y': timeline['message'].to_numpy()})
+    daily = helper.daily_timeline(selected_user, df, max_points=helper.TIMELINE_MAX_POINTS)
+    add('line', f"Messages per {helper.timeline_resolution(daily).title()} - {selected_user}",
+        lambda: None if daily.empty else {'x': pd.to_datetime(daily['specific_date']).to_numpy(),
+                                          'y': daily['message'].to_numpy(), 'color': 'green'})
+    add('bar', f"Weekly Activity - {selected_user}",
+        lambda: series_data(helper.week_activity_map(selected_user, df)))
+    add('bar', f"Monthly Activity - {selected_user}",
+        lambda: series_data(helper.month_activity_map(selected_user, df)))
+    if overall and not busy_users.empty:
+        add('pie', "Chat Contribution %",
+            lambda: {'labels': busy_users['Name'].head(10).tolist(), 'values': busy_users['Percent'].head(10).to_numpy()})
+    heatmap = helper.activity_heatmap(selected_user, df)
+    add('heatmap', f"Activity Heatmap - {selected_user}",
+        lambda: None if heatmap.empty or heatmap.isnull().values.all() else {'frame': heatmap})
+    add('image', "Word Cloud", lambda: _wordcloud_data(selected_user, df))
+    words = helper.most_common_words(selected_user, df)
+    add('barh', f"Top 15 Words - {selected_user}",
+        lambda: None if words.empty else {'labels': words['Word'].head(15).tolist(), 'values': words['Frequency'].head(15).to_numpy()})
+    sentiment = helper.sentiment_summary(selected_user, df)
+    add('pie', "Sentiment Distribution",
+        lambda: None if sentiment.empty else {'labels': sentiment['Sentiment'].tolist(), 'values': sentiment['Count'].to_numpy(),
+                                              'colors': {'Positive': 'green', 'Negative': 'red', 'Neutral': 'blue'}})
+    emotions = helper.emotion_timeline(selected_user, df, max_points=helper.TIMELINE_MAX_POINTS)
+    add('lines', "Sentiment Over Time",
+        lambda: None if emotions.empty else {
+            'x': pd.to_datetime(emotions['specific_date']).to_numpy(),
+            'series': {name: emotions[name].to_numpy() for name in ('Positive', 'Negative', 'Neutral') if name in emotions},
+            'colors': {'Positive': 'green', 'Negative': 'red', 'Neutral': 'blue'}})
+    add('barh', "Top 10 Emojis",
+        lambda: None if emoji_df.empty else {'labels': emoji_df['Emoji'].head(10).tolist(), 'values': emoji_df['Count'].head(10).to_numpy()})
+    lengths = helper.message_length_distribution(selected_user, df, bins=30)
+    add('hist', "Message Length Distribution",
+        lambda: None if not lengths['count'] else {**histogram_data(lengths['histogram']),
+                                                   'xlabel': 'Message Length (characters)'})
+    if overall:
+        average = lengths['box'].set_index('group')['mean'].sort_values(ascending=False).head(10)
+        add('bar', "Average Message Length by User", lambda: series_data(average))
+        responses = helper.response_time_distribution(df, bins=20)
+        add('hist', "Response Time Distribution",
+            lambda: None if not responses['count'] else {**histogram_data(responses['histogram']),
+                                                         'xlabel': 'Response Time (minutes)', 'color': 'lightcoral'})
+        starters = helper.conversation_starters(df, gap_minutes=session_gap)
+        add('pie', "Conversation Starters",
+            lambda: None if starters.empty else {'labels': starters['User'].tolist(),
+                                                 'values': starters['Conversations_Started'].to_numpy()})
+    add('barh', "Top 10 Shared Domains",
+        lambda: None if url_df.empty else {'labels': url_df['Domain'].head(10).tolist(), 'values': url_df['Count'].head(10).to_numpy()})
+    return summary_text, report_metrics, tables, charts
+
+
+def _wordcloud_data(selected_user, df):
+    wc = helper.create_wordcloud(selected_user, df)
+    return None if wc is None else {'image': wc.to_array()}
+
+
+def render_chart(kind, title, data):
+    """Rasterize one chart to PNG bytes with the object-oriented matplotlib API (thread-safe)."""
+    fig = Figure(figsize=(10, 6), dpi=100)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    if kind == 'line':
+        ax.plot(data['x'], data['y'], marker='o' if len(data['y']) <= 60 else None, color=data.get('color'))
+        ax.tick_params(axis='x', labelrotation=45)
+    elif kind == 'lines':
+        for name, values in data['series'].items():
+            ax.plot(data['x'], values, label=name, color=data['colors'].get(name))
+        ax.legend()
+        ax.tick_params(axis='x', labelrotation=45)
+    elif kind == 'bar':
+        ax.bar(data['x'], data['y'], color='steelblue')
+        ax.tick_params(axis='x', labelrotation=45)
+    elif kind == 'barh':
+        ax.barh(data['labels'][::-1], data['values'][::-1], color='steelblue')
+    elif kind == 'pie':
+        colors = [data['colors'].get(label) for label in data['labels']] if 'colors' in data else None
+        ax.pie(data['values'], labels=data['labels'], colors=colors, autopct='%1.1f%%')
+        ax.axis('equal')
+    elif kind == 'hist':
+        ax.stairs(data['counts'], data['edges'], fill=True, color=data.get('color', 'steelblue'))
+        ax.set_xlabel(data['xlabel'])
+        ax.set_ylabel('Frequency')
+    elif kind == 'heatmap':
+        fig.set_size_inches(12, 6)
+        sns.heatmap(data['frame'], annot=True, fmt='g', cmap='YlOrRd', cbar_kws={'label': 'Number of Messages'}, ax=ax)
+        ax.set_xlabel('Time Period')
+        ax.set_ylabel('Day of Week')
+        ax.tick_params(axis='x', labelrotation=45)
+    elif kind == 'image':
+        ax.imshow(data['image'], interpolation='bilinear')
+        ax.axis('off')
+    ax.set_title(title, fontsize=14)
+    buffer = io.BytesIO()
+    with warnings.catch_warnings():
+        # Emoji labels have no glyph in the default font
+        warnings.simplefilter('ignore')
+        fig.tight_layout()
+        fig.savefig(buffer, format='png', bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def _get_chart_pool():
+    global _chart_pool
+    with _lock:
+        if _chart_pool is None:
+            _chart_pool = ProcessPoolExecutor(max_workers=CHART_WORKERS)
+        return _chart_pool
+
+
+def render_charts(charts):
+    """PNG bytes for every chart spec, rasterized in parallel; failed charts are dropped."""
+    if CHART_WORKERS > 1 and len(charts) > 1:
+        futures = [_get_chart_pool().submit(render_chart, kind, title, data) for kind, title, data in charts]
+        results = [(title, future.result) for (_, title, _), future in zip(charts, futures)]
+    else:
+        results = [(title, functools.partial(render_chart, kind, title, data)) for kind, title, data in charts]
+    images = []
+    for title, result in results:
+        try:
+            images.append(result())
+        except Exception as e:
+            log.warning(f"Could not render chart '{title}': {e}")
+    return images
+
+
+def build_pdf(summary_text, chart_images, report_metrics, tables):
+    from fpdf import FPDF, XPos, YPos
+
+    pdf = FPDF()
+    pdf.add_page()
+    font_name = "Arial"
+    font_path = resolve_font()
+    if font_path:
+        try:
+            pdf.add_font("CustomFont", "", font_path)
+            font_name = "CustomFont"
+        except Exception as e:
+            log.warning(f"Failed to load font {font_path}: {e}")
+
+    def line(height, text, size=None):
+        if size:
+            pdf.set_font(font_name, size=size)
+        try:
+            pdf.cell(0, height, text, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        except Exception as e:
+            log.warning(f"Could not display text '{text[:40]}' - {e}")
+            pdf.cell(0, height, text.encode('latin-1', 'ignore').decode('latin-1'), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    pdf.set_font(font_name, size=16)
+    pdf.cell(0, 12, "WhatsApp Chat Analyzer Report", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="C")
+    pdf.ln(2)
+    line(10, "Top Statistics:", size=12)
+    for label, value in report_metrics.items():
+        line(8, f"{label}: {value}")
+    pdf.ln(2)
+
+    pdf.set_font(font_name, size=11)
+    try:
+        pdf.multi_cell(0, 8, summary_text)
+    except Exception as e:
+        log.warning(f"Could not display summary text - {e}")
+        pdf.multi_cell(0, 8, summary_text.encode('latin-1', 'ignore').decode('latin-1'))
+    pdf.ln(2)
+
+    for table_title, table in tables.items():
+        line(10, table_title, size=12)
+        if not table.empty:
+            line(7, ' | '.join(str(col) for col in table.columns), size=9)
+            for row in table.itertuples(index=False):
+                line(7, ' | '.join(str(x) for x in row))
+        pdf.ln(2)
+
+    for image in chart_images:
+        pdf.add_page()
+        # fpdf2 reads images from memory, no temporary files
+        pdf.image(io.BytesIO(image), w=180)
+    return bytes(pdf.output())
+
+
+def report_key(selected_user, df, session_gap=120):
+    # The fingerprint of a date-window slice includes the window bounds
+    return helper.chat_fingerprint(df), selected_user, session_gap
+
+
+def cached_report(key):
+    with _lock:
+        if key in _pdf_cache:
+            _pdf_cache.move_to_end(key)
+            return _pdf_cache[key]
+    return None
+
+
+def generate_report(selected_user, df, session_gap=120):
+    """Build the full PDF report synchronously and cache it."""
+    key = report_key(selected_user, df, session_gap)
+    cached = cached_report(key)
+    metrics.cache_lookup('pdf_report', cached is not None)
+    if cached is not None:
+        return cached
+    with metrics.PDF_EXPORT_SECONDS.time():
+        summary_text, report_metrics, tables, charts = collect_report_data(selected_user, df, session_gap)
+        pdf_bytes = build_pdf(summary_text, render_charts(charts), report_metrics, tables)
+    with _lock:
+        _pdf_cache[key] = pdf_bytes
+        _pdf_cache.move_to_end(key)
+        while len(_pdf_cache) > _PDF_CACHE_SIZE:
+            _pdf_cache.popitem(last=False)
+    return pdf_bytes
+
+
+def submit_report(selected_user, df, session_gap=120):
+    """Start building the report in the background; identical requests share one job."""
+    key = report_key(selected_user, df, session_gap)
+    with _lock:
+        future = _pending.get(key)
+        if future is None or future.done():
+            future = _report_pool.submit(generate_report, selected_user, df, session_gap)
+            _pending[key] = future
+            submitted = True
+        else:
+            submitted = False
+    if submitted:
+        # Outside the lock: an already finished future runs the callback, and _forget, right away
+        future.add_done_callback(lambda _: _forget(key, future))
+    return future
+
+
+def _forget(key, future):
+    with _lock:
+        if _pending.get(key) is future:
+            del _pending[key]
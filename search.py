@@ -0,0 +1,152 @@
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import helper
+import metrics
+
+# BM25 ranking parameters
+K1 = 1.2
+B = 0.75
+
+_token_pattern = r'\w+'
+_query_pattern = re.compile(r'"([^"]+)"|(\S+)')
+
+# Built indexes, keyed by chat fingerprint
+_INDEX_CACHE_SIZE = 8
+_index_cache = OrderedDict()
+# Shared by every Streamlit session thread
+_lock = threading.Lock()
+
+
+class SearchIndex:
+    """Inverted index over the parsed message column."""
+
+    def __init__(self, df):
+        df = df.reset_index(drop=True)
+        self.size = len(df)
+        self.text = df['message'].astype(str)
+        self.messages = self.text.to_numpy()
+        self.dates = pd.to_datetime(df['date']).to_numpy()
+        self.users = df['users'].to_numpy()
+        self.user_codes, user_names = pd.factorize(df['users'])
+        self.user_lookup = {name: code for code, name in enumerate(user_names)}
+
+        # One (term, document) pair per token, counted in a single sort
+        tokens = df['message'].astype(str).str.lower().str.findall(_token_pattern).explode().dropna()
+        docs = tokens.index.to_numpy(dtype=np.int64)
+        term_codes, vocabulary = pd.factorize(tokens, sort=False)
+        self.vocabulary = {term: code for code, term in enumerate(vocabulary)}
+        self.doc_lengths = np.bincount(docs, minlength=self.size).astype(np.float32)
+        self.avg_doc_length = float(self.doc_lengths.mean()) if self.size else 0.0
+
+        keys, tf = np.unique(term_codes.astype(np.int64) * max(self.size, 1) + docs, return_counts=True)
+        postings_terms = keys // max(self.size, 1)
+        self.postings = (keys % max(self.size, 1)).astype(np.int32)
+        self.frequencies = tf.astype(np.int32)
+        self.offsets = np.searchsorted(postings_terms, np.arange(len(vocabulary) + 1))
+
+    def _postings(self, term):
+        code = self.vocabulary.get(term)
+        if code is None:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+        lo, hi = self.offsets[code], self.offsets[code + 1]
+        return self.postings[lo:hi], self.frequencies[lo:hi]
+
+    def search(self, query, user=None, start=None, end=None, limit=20):
+        """Return ranked messages matching every term and quoted phrase."""
+        columns = ['date', 'users', 'message', 'score']
+        terms, phrases = parse_query(query)
+        if not terms:
+            return pd.DataFrame(columns=columns)
+
+        # Intersect postings starting from the rarest term
+        postings = sorted((self._postings(term) for term in set(terms)), key=lambda p: len(p[0]))
+        candidates = postings[0][0]
+        for docs, _ in postings[1:]:
+            if candidates.size == 0:
+                break
+            pos = np.searchsorted(docs, candidates)
+            pos[pos == docs.size] = 0
+            candidates = candidates[docs[pos] == candidates] if docs.size else candidates[:0]
+
+        # Restrict by user and date range before scoring
+        if user is not None and user != 'Overall':
+            code = self.user_lookup.get(user)
+            if code is None:
+                return pd.DataFrame(columns=columns)
+            candidates = candidates[self.user_codes[candidates] == code]
+        if start is not None:
+            candidates = candidates[self.dates[candidates] >= np.datetime64(pd.Timestamp(start))]
+        if end is not None:
+            candidates = candidates[self.dates[candidates] < helper.window_end(end)]
+
+        # Phrases are verified against the text of the remaining candidates only
+        for phrase in phrases:
+            phrase_pattern = r'\b' + r'\W+'.join(map(re.escape, phrase)) + r'\b'
+            keep = self.text.take(candidates).str.contains(phrase_pattern, case=False, regex=True)
+            candidates = candidates[keep.to_numpy(dtype=bool)]
+
+        if candidates.size == 0:
+            return pd.DataFrame(columns=columns)
+
+        scores = np.zeros(candidates.size, dtype=np.float64)
+        length_norm = K1 * (1 - B + B * self.doc_lengths[candidates] / max(self.avg_doc_length, 1e-9))
+        for term in set(terms):
+            docs, tf = self._postings(term)
+            idf = np.log(1 + (self.size - docs.size + 0.5) / (docs.size + 0.5))
+            term_tf = tf[np.searchsorted(docs, candidates)]
+            scores += idf * term_tf * (K1 + 1) / (term_tf + length_norm)
+
+        # Best scores first, newest first among ties
+        if candidates.size > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            candidates, scores = candidates[top], scores[top]
+        order = np.lexsort((-self.dates[candidates].astype(np.int64), -scores))
+        candidates, scores = candidates[order], scores[order]
+        return pd.DataFrame({
+            'date': self.dates[candidates],
+            'users': self.users[candidates],
+            'message': self.messages[candidates],
+            'score': np.round(scores, 4),
+        })
+
+
+def parse_query(query):
+    """Split a query into terms and quoted phrases."""
+    terms = []
+    phrases = []
+    for phrase, word in _query_pattern.findall(str(query).lower()):
+        words = re.findall(_token_pattern, phrase or word)
+        terms.extend(words)
+        if phrase and len(words) > 1:
+            phrases.append(words)
+    return terms, phrases
+
+
+def get_index(df):
+    """Build the search index for a chat once and reuse it."""
+    key = helper.chat_fingerprint(df)
+    with _lock:
+        index = _index_cache.get(key)
+        if index is not None:
+            _index_cache.move_to_end(key)
+    metrics.cache_lookup('search_index', index is not None)
+    if index is not None:
+        return index
+    # Built outside the lock so other sessions' lookups don't wait on it
+    index = SearchIndex(df)
+    with _lock:
+        _index_cache[key] = index
+        _index_cache.move_to_end(key)
+        while len(_index_cache) > _INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+
+def search_messages(df, query, selected_user='Overall', start=None, end=None, limit=20):
+    """Find who said something and when, e.g. search_messages(df, '"see you" tomorrow')."""
+    if df.empty:
+        return pd.DataFrame(columns=['date', 'users', 'message', 'score'])
+    return get_index(df).search(query, user=selected_user, start=start, end=end, limit=limit)
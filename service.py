@@ -0,0 +1,242 @@
+"""Local HTTP analysis service (standard library only).
+
+    python service.py --port 8765 --workers 2 --max-queue 8
+
+    curl --data-binary @chat.zip "http://127.0.0.1:8765/analyze?analyses=stats,heatmap"
+"""
+import argparse
+import hashlib
+import json
+import logging
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import instrumentation
+import loader
+import metrics
+import pipeline
+import preprocessor
+
+log = logging.getLogger(__name__)
+
+SERVICE_ANALYSES = ['stats', 'monthly_timeline', 'daily_timeline', 'heatmap', 'emoji', 'urls', 'sentiment']
+
+
+class QueueFull(Exception):
+    pass
+
+
+def analyze_payload(payload, analyses, selected_user='Overall', start=None, end=None):
+    """Parse an uploaded export and run the analyses (runs in a worker process)."""
+    started = time.perf_counter()
+    df = preprocessor.preprocess(loader.TextStream(payload))
+    parse_seconds = time.perf_counter() - started
+    results = {}
+    if not df.empty:
+        for name in analyses:
+            results[name] = pipeline.to_jsonable(pipeline.run_analysis(name, df, selected_user, start, end))
+    return {
+        'messages': int(len(df)),
+        'user': selected_user,
+        'results': results,
+        'timings': {'parse': round(parse_seconds, 4), 'total': round(time.perf_counter() - started, 4)},
+    }
+
+
+class AnalysisService:
+    """Bounded worker pool with request queueing and a content-hash result cache."""
+
+    def __init__(self, workers=2, max_queue=8, cache_size=64, timeout=600):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        # Running plus waiting jobs; anything beyond this is rejected instead of piling up
+        self.slots = threading.BoundedSemaphore(workers + max_queue)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'cache_hits': 0, 'rejected': 0, 'failed': 0}
+
+    def cache_key(self, payload, analyses, selected_user, start, end):
+        digest = hashlib.sha256(payload).hexdigest()
+        return digest, (digest, tuple(analyses), selected_user, start, end)
+
+    def analyze(self, payload, analyses, selected_user='Overall', start=None, end=None):
+        digest, key = self.cache_key(payload, analyses, selected_user, start, end)
+        with self.lock:
+            self.stats['requests'] += 1
+            metrics.cache_lookup('service', key in self.cache)
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.stats['cache_hits'] += 1
+                return dict(self.cache[key], chat_id=digest, cached=True)
+            future = self.inflight.get(key)
+            owner = future is None
+            if owner:
+                # Identical uploads that arrive together share one job
+                if not self.slots.acquire(blocking=False):
+                    self.stats['rejected'] += 1
+                    raise QueueFull()
+                # Metrics recorded in the worker stay there; its stage records come back with the result
+                future = self.pool.submit(instrumentation.call_collected, analyze_payload,
+                                          payload, analyses, selected_user, start, end)
+                self.inflight[key] = future
+                future.add_done_callback(lambda _: self.slots.release())
+        try:
+            result, records = future.result(timeout=self.timeout)
+        except Exception:
+            with self.lock:
+                if owner:
+                    self.stats['failed'] += 1
+                self.inflight.pop(key, None)
+            raise
+        if owner:
+            metrics.record_stages(records)
+        with self.lock:
+            self.inflight.pop(key, None)
+            self.cache[key] = result
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return dict(result, chat_id=digest, cached=False)
+
+    def health(self):
+        with self.lock:
+            return dict(self.stats, status='ok', workers=self.workers, max_queue=self.max_queue,
+                        inflight=len(self.inflight), cached=len(self.cache))
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class AnalysisHandler(BaseHTTPRequestHandler):
+    service = None
+    max_upload_bytes = 200 * 1024 * 1024
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = urllib.parse.urlparse(self.path).path
+        if path == '/health':
+            self._send_json(200, self.service.health())
+        elif path == '/metrics':
+            body = metrics.REGISTRY.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', metrics.CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif path == '/analyses':
+            self._send_json(200, {'available': list(pipeline.ANALYSES), 'default': SERVICE_ANALYSES})
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        url = urllib.parse.urlparse(self.path)
+        if url.path != '/analyze':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        params = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        if length <= 0:
+            self._send_json(400, {'error': 'Send the export file as the request body'})
+            return
+        if length > self.max_upload_bytes:
+            self._send_json(413, {'error': f'Upload larger than {self.max_upload_bytes} bytes'})
+            return
+        try:
+            analyses = pipeline.parse_analyses(params.get('analyses')) if params.get('analyses') else SERVICE_ANALYSES
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        payload = self.rfile.read(length)
+        try:
+            result = self.service.analyze(payload, analyses, params.get('user', 'Overall'),
+                                          params.get('start'), params.get('end'))
+        except QueueFull:
+            self._send_json(503, {'error': 'Too many analyses in progress, retry later'}, {'Retry-After': '5'})
+            return
+        except (UnicodeDecodeError, ValueError) as e:
+            self._send_json(400, {'error': f'Could not read export: {e}'})
+            return
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+        self._send_json(200, result)
+
+    def log_message(self, format, *args):
+        log.info("%s - %s", self.address_string(), format % args)
+
+
+def create_server(host='127.0.0.1', port=8765, workers=2, max_queue=8, cache_size=64, max_upload_mb=200):
+    """Build the HTTP server; call serve_forever() on the result."""
+    service = AnalysisService(workers=workers, max_queue=max_queue, cache_size=cache_size)
+    handler = type('Handler', (AnalysisHandler,), {
+        'service': service,
+        'max_upload_bytes': max_upload_mb * 1024 * 1024,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def request_analysis(path, url='http://127.0.0.1:8765', analyses=None, user='Overall', start=None, end=None):
+    """Client helper: upload an export file and return the decoded JSON response."""
+    params = {'user': user}
+    if analyses:
+        params['analyses'] = ','.join(analyses) if not isinstance(analyses, str) else analyses
+    if start:
+        params['start'] = str(start)
+    if end:
+        params['end'] = str(end)
+    with open(path, 'rb') as f:
+        payload = f.read()
+    request = urllib.request.Request(f"{url.rstrip('/')}/analyze?{urllib.parse.urlencode(params)}",
+                                     data=payload, method='POST',
+                                     headers={'Content-Type': 'application/octet-stream'})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve chat analyses over local HTTP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2, help="Worker processes running analyses")
+    parser.add_argument('--max-queue', type=int, default=8, help="Requests allowed to wait for a worker")
+    parser.add_argument('--cache-size', type=int, default=64, help="Cached results, keyed by upload hash")
+    parser.add_argument('--max-upload-mb', type=int, default=200)
+    args = parser.parse_args(argv)
+    # Request lines at INFO; the parser's per-upload INFO lines stay quiet
+    logging.basicConfig(format='%(asctime)s %(name)s %(message)s')
+    log.setLevel(logging.INFO)
+
+    server = create_server(args.host, args.port, args.workers, args.max_queue, args.cache_size, args.max_upload_mb)
+    print(f"Serving analyses on http://{args.host}:{args.port} ({args.workers} workers, queue {args.max_queue})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""Fixed-memory sketches for approximate word, emoji, link and domain statistics.
+
+    sketch = sketches.sketch_export(loader.TextStream("chat.zip"))
+    sketch.most_common_words()    # Word, Frequency, Error
+    sketch.unique_links()         # (estimate, relative standard error)
+
+The exact helpers keep every word, emoji and link of the chat in memory.
+A ChatSketch keeps Space-Saving counters for the top words, emojis and
+domains and HyperLogLog registers for distinct links and vocabulary, so
+its size is fixed by `capacity` and `precision`, not by the chat. It is
+fed one parsed frame at a time, for example from preprocessor.iter_frames.
+"""
+import heapq
+import math
+from collections import Counter
+from urllib.parse import urlparse
+
+import emoji
+import numpy as np
+import pandas as pd
+
+import helper
+import preprocessor
+from instrumentation import timed
+
+URL_PATTERN = r'https?://\S+|www\.\S+'
+# Counters per Space-Saving table and log2 of the HyperLogLog registers
+CAPACITY = 2000
+PRECISION = 14
+# Rows per batch when sketching a parsed chat
+BATCH_ROWS = 20000
+# Chats with at least this many messages open in the app's approximate mode
+APPROXIMATE_ABOVE = 500000
+
+
+def _bit_length(values):
+    """Bit length of each uint64, exactly (float64 holds 32-bit halves without rounding)."""
+    high = np.frexp((values >> np.uint64(32)).astype(np.float64))[1]
+    low = np.frexp((values & np.uint64(0xFFFFFFFF)).astype(np.float64))[1]
+    return np.where(high > 0, high + 32, low)
+
+
+class HyperLogLog:
+    """Distinct-count estimate in 2**precision one-byte registers.
+
+    The relative standard error is 1.04 / sqrt(2**precision), 0.8% at the
+    default precision of 14 (16 KB). Hashes come from pandas' hash_array, so
+    sketches built in different processes can be merged.
+    """
+
+    def __init__(self, precision=PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def update(self, items):
+        items = np.asarray(items, dtype=object)
+        if not len(items):
+            return
+        hashes = pd.util.hash_array(items)
+        suffix_bits = 64 - self.precision
+        index = (hashes >> np.uint64(suffix_bits)).astype(np.intp)
+        rank = suffix_bits - _bit_length(hashes & np.uint64((1 << suffix_bits) - 1)) + 1
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self):
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.power(2.0, -self.registers.astype(np.float64)).sum()
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate while many registers are empty
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class SpaceSaving:
+    """Heavy hitters in `capacity` counters (Metwally et al.'s Space-Saving).
+
+    A new item past capacity replaces the smallest counter and inherits its
+    count as error, so every reported count overstates the true one by at
+    most its error, and every item seen more than total / capacity times is
+    kept. With no more distinct items than counters the counts are exact.
+    """
+
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.total = 0
+        self._heap = []  # (count, item); entries older than the item's count are skipped
+
+    def add(self, item, weight=1):
+        self.total += weight
+        if item in self.counts:
+            self.counts[item] += weight
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = weight
+            self.errors[item] = 0
+        else:
+            floor, evicted = self._pop_min()
+            del self.counts[evicted], self.errors[evicted]
+            self.counts[item] = floor + weight
+            self.errors[item] = floor
+        heapq.heappush(self._heap, (self.counts[item], item))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, key) for key, count in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def update(self, counts):
+        """Add (item, count) pairs, such as a value_counts() of one batch."""
+        for item, weight in counts.items():
+            self.add(item, int(weight))
+
+    def _pop_min(self):
+        while True:
+            count, item = heapq.heappop(self._heap)
+            if self.counts.get(item) == count:
+                return count, item
+
+    @property
+    def max_error(self):
+        """Largest possible overcount of any reported item."""
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+
+    def top(self, n=None):
+        """(item, count, error) by descending count."""
+        ranked = sorted(self.counts.items(), key=lambda pair: -pair[1])
+        return [(item, count, self.errors[item]) for item, count in ranked[:n]]
+
+
+def _domain(link):
+    # Same rule as helper.analyze_urls
+    try:
+        domain = urlparse(link).netloc
+    except Exception:
+        return "unknown_domain"
+    return domain[4:] if domain.startswith('www.') else domain
+
+
+class ChatSketch:
+    """Approximate top words, emojis and domains, distinct links and vocabulary of a chat.
+
+    Tokens follow helper.most_common_words, helper.emoji_analysis and
+    helper.analyze_urls, so with fewer distinct items than `capacity` the
+    tables match the exact helpers.
+    """
+
+    def __init__(self, capacity=CAPACITY, precision=PRECISION):
+        self.messages = 0
+        self.links = 0
+        self.words = SpaceSaving(capacity)
+        self.emojis = SpaceSaving(capacity)
+        self.domains = SpaceSaving(capacity)
+        self.vocabulary = HyperLogLog(precision)
+        self.distinct_links = HyperLogLog(precision)
+
+    def update(self, frame, selected_user='Overall'):
+        """Add one batch of parsed messages."""
+        if selected_user != 'Overall':
+            frame = frame[frame['users'] == selected_user]
+        messages = frame['message'].dropna().astype(str)
+        messages = messages[~messages.str.contains("<Media omitted>", case=False, regex=False)]
+        self.messages += len(messages)
+        if messages.empty:
+            return
+
+        words = messages.str.lower().str.split().explode().dropna()
+        words = words[(words.str.len() > 1) & words.str.isalpha()]
+        words = words[~words.isin(helper.load_stop_words())]
+        word_counts = words.value_counts()
+        self.words.update(word_counts)
+        self.vocabulary.update(word_counts.index)
+
+        characters = Counter(''.join(messages))
+        self.emojis.update({c: n for c, n in characters.items() if c in emoji.EMOJI_DATA})
+
+        links = messages.str.findall(URL_PATTERN).explode().dropna()
+        self.links += len(links)
+        link_counts = links.value_counts()
+        self.distinct_links.update(link_counts.index)
+        self.domains.update(link_counts.groupby(link_counts.index.map(_domain)).sum())
+
+    def _table(self, counter, label, value, n):
+        return pd.DataFrame(counter.top(n), columns=[label, value, 'Error'])
+
+    def most_common_words(self, n=20):
+        """Like helper.most_common_words, with each count's possible overstatement in `Error`."""
+        return self._table(self.words, 'Word', 'Frequency', n)
+
+    def emoji_analysis(self, n=20):
+        """Like helper.emoji_analysis, with `Error`."""
+        return self._table(self.emojis, 'Emoji', 'Count', n)
+
+    def analyze_urls(self, n=None):
+        """Like helper.analyze_urls, with `Error`."""
+        return self._table(self.domains, 'Domain', 'Count', n)
+
+    def unique_links(self):
+        """(estimated distinct links, relative standard error)."""
+        return self.distinct_links.count(), self.distinct_links.relative_error
+
+    def vocabulary_size(self):
+        """(estimated distinct words, relative standard error)."""
+        return self.vocabulary.count(), self.vocabulary.relative_error
+
+    def error_bounds(self):
+        """Largest overcount in each top-K table and the distinct-count standard error."""
+        return {
+            'words': self.words.max_error,
+            'emojis': self.emojis.max_error,
+            'domains': self.domains.max_error,
+            'distinct_relative_error': self.vocabulary.relative_error,
+        }
+
+
+@timed
+def sketch_chat(selected_user, df, start=None, end=None, batch_rows=BATCH_ROWS, **kwargs):
+    """ChatSketch of a parsed chat, fed in batches of rows."""
+    df = helper.slice_date_range(df, start, end)
+    sketch = ChatSketch(**kwargs)
+    for lo in range(0, len(df), batch_rows):
+        sketch.update(df.iloc[lo:lo + batch_rows], selected_user)
+    return sketch
+
+
+@timed
+def sketch_export(data, selected_user='Overall', batch_messages=BATCH_ROWS, **kwargs):
+    """ChatSketch of an export text or text stream, parsed batch by batch and never held whole."""
+    sketch = ChatSketch(**kwargs)
+    for frame in preprocessor.iter_frames(data, batch_messages):
+        sketch.update(frame, selected_user)
+    return sketch
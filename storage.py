@@ -0,0 +1,105 @@
+import os
+import pandas as pd
+import helper
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+# Low-cardinality columns stored dictionary-encoded
+DICTIONARY_COLUMNS = ['users', 'day_name', 'month', 'period', 'specific_date']
+# Small integer parts of the timestamp
+INTEGER_COLUMNS = {'year': 'int16', 'month_num': 'int8', 'day': 'int8', 'hour': 'int8', 'minute': 'int8'}
+
+
+def _format_for(path, file_format):
+    if file_format:
+        return file_format
+    ext = os.path.splitext(str(path))[1].lower()
+    return 'arrow' if ext in ('.arrow', '.feather', '.ipc') else 'parquet'
+
+
+def to_arrow(df):
+    """Convert a parsed chat to an Arrow table with compact column types."""
+    if not ARROW_AVAILABLE:
+        raise ImportError("pyarrow is required to save chats. Install it with `pip install pyarrow`.")
+    columns = {}
+    for name in df.columns:
+        values = df[name]
+        if name == 'date':
+            columns[name] = pa.array(pd.to_datetime(values).to_numpy(dtype='datetime64[ms]'), type=pa.timestamp('ms'))
+        elif name == 'specific_date':
+            dates = pa.array(pd.to_datetime(values).to_numpy(dtype='datetime64[D]'), type=pa.date32())
+            columns[name] = dates.dictionary_encode()
+        elif name in DICTIONARY_COLUMNS:
+            columns[name] = pa.array(values.astype(str), type=pa.string()).dictionary_encode()
+        elif name in INTEGER_COLUMNS:
+            columns[name] = pa.array(values.to_numpy().astype(INTEGER_COLUMNS[name]))
+        elif name == 'message':
+            columns[name] = pa.array(values.astype(str), type=pa.large_string())
+        else:
+            columns[name] = pa.array(values)
+    table = pa.table(columns)
+    if not df.empty:
+        # Reloaded chats keep the fingerprint their cached results were keyed by
+        table = table.replace_schema_metadata({b'chat_id': helper.chat_fingerprint(df).encode('utf-8')})
+    return table
+
+
+def save_chat(df, path, file_format=None, compression='zstd'):
+    """Write a parsed chat to Parquet or Arrow IPC (picked from the extension).
+
+    Parquet also accepts a writable file object.
+    """
+    table = to_arrow(df)
+    if _format_for(path, file_format) == 'arrow':
+        # Arrow IPC is kept uncompressed so it can be memory-mapped without copying
+        with pa.OSFile(str(path), 'wb') as sink:
+            with ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    else:
+        pq.write_table(table, path, compression=compression)
+    return path
+
+
+def read_table(path, columns=None, file_format=None, memory_map=True):
+    """Open a saved chat as an Arrow table, memory-mapped by default."""
+    if not ARROW_AVAILABLE:
+        raise ImportError("pyarrow is required to load chats. Install it with `pip install pyarrow`.")
+    if _format_for(path, file_format) == 'arrow':
+        source = pa.memory_map(str(path), 'r') if memory_map else pa.OSFile(str(path), 'rb')
+        table = ipc.open_file(source).read_all()
+        return table.select(columns) if columns else table
+    return pq.read_table(str(path), columns=columns, memory_map=memory_map)
+
+
+def load_chat(path, columns=None, file_format=None, memory_map=True):
+    """Load a saved chat back into the DataFrame shape preprocess returns.
+
+    Dictionary-encoded columns (users, day and month names, hour periods and
+    specific_date) come back as pandas Categoricals rather than one Python
+    object per row.
+    """
+    table = read_table(path, columns=columns, file_format=file_format, memory_map=memory_map)
+    data = {}
+    for name, column in zip(table.column_names, table.columns):
+        if pa.types.is_dictionary(column.type):
+            # Stay dictionary-encoded: integer codes per row, one Python value per distinct user, day, ...
+            combined = column.unify_dictionaries().combine_chunks()
+            values = pd.Categorical.from_codes(combined.indices.to_numpy(zero_copy_only=False).astype('int32'),
+                                               categories=pd.Index(combined.dictionary.to_pylist(), dtype=object))
+            # Sorted categories group and pivot in the same order as the plain values would
+            data[name] = values.reorder_categories(sorted(values.categories))
+        elif pa.types.is_timestamp(column.type):
+            data[name] = column.to_pandas().astype('datetime64[ns]')
+        else:
+            data[name] = column.to_pandas()
+    df = pd.DataFrame(data)
+    metadata = table.schema.metadata or {}
+    if b'chat_id' in metadata:
+        helper.remember_fingerprint(df, metadata[b'chat_id'].decode('utf-8'))
+    return df
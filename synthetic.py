@@ -0,0 +1,185 @@
+"""Deterministic synthetic WhatsApp exports for scale testing.
+
+    python synthetic.py chat.txt --messages 1000000 --seed 7 --dialect android --clock 12h
+"""
+import argparse
+import os
+import sys
+import zipfile
+import numpy as np
+import pandas as pd
+
+DIALECTS = ('android', 'ios')
+CLOCKS = ('24h', '12h')
+
+FIRST_NAMES = ['Aarav', 'Ananya', 'Arjun', 'Bob', 'Chandra', 'Deepa', 'Emma', 'Farhan', 'Gita', 'Hassan',
+               'Isha', 'James', 'Kabir', 'Lina', 'Maya', 'Nadia', 'Omar', 'Priya', 'Rahul', 'Sara',
+               'Tanvir', 'Uma', 'Vikram', 'Wei', 'Yusuf', 'Zara']
+LAST_NAMES = ['Sen', 'Das', 'Roy', 'Smith', 'Khan', 'Ghosh', 'Bose', 'Lee', 'Paul', 'Dutta']
+BENGALI_NAMES = ['অমিত', 'সুমি', 'রাহুল দাস', 'প্রিয়া', 'তন্ময়']
+
+ENGLISH = ['good morning everyone', 'ok', 'see you tomorrow', 'what time is the meeting?', 'haha that is so true',
+           'can someone share the notes', 'I will be late today', 'thanks a lot', 'this is terrible news',
+           'happy birthday!!', 'where are you guys', 'let us meet at the cafe', 'done', 'no idea honestly',
+           'that was an amazing match', 'please check the group description', 'sure, sounds good']
+BENGALI = ['আমি ভালো আছি', 'তুমি কেমন আছো?', 'আজ খুব গরম', 'কাল দেখা হবে', 'ধন্যবাদ', 'খুব ভালো খবর',
+           'আমরা কখন যাবো', 'একটু অপেক্ষা করো']
+EMOJIS = ['😂', '❤️', '👍', '🙏', '😭', '🔥', '😊', '🎉', '😅', '🤣']
+DOMAINS = ['youtube.com', 'www.google.com', 'github.com', 'instagram.com', 'en.wikipedia.org', 'news.example.org']
+MEDIA = ['<Media omitted>', 'image omitted', 'video omitted', 'sticker omitted', 'audio omitted', 'document omitted']
+
+
+def make_users(count, rng):
+    """Participant names mixing English, Bengali and saved-as-number contacts."""
+    users = []
+    while len(users) < count:
+        kind = rng.random()
+        if kind < 0.15:
+            name = f"+91 {rng.integers(70000, 99999)} {rng.integers(10000, 99999)}"
+        elif kind < 0.25:
+            name = f"{BENGALI_NAMES[rng.integers(len(BENGALI_NAMES))]} {len(users)}"
+        else:
+            name = f"{FIRST_NAMES[rng.integers(len(FIRST_NAMES))]} {LAST_NAMES[rng.integers(len(LAST_NAMES))]}"
+        if name not in users:
+            users.append(name)
+    return users
+
+
+def format_timestamps(times, dialect='android', clock='24h'):
+    """Export-style timestamp prefixes for an array of datetimes."""
+    index = pd.DatetimeIndex(times)
+    days, months, years = index.day, index.month, index.year % 100
+    hours, minutes, seconds = index.hour, index.minute, index.second
+    prefixes = []
+    for d, m, y, h, mi, s in zip(days, months, years, hours, minutes, seconds):
+        if clock == '12h':
+            # Newer exports put a narrow no-break space before am/pm
+            time_str = f"{(h % 12) or 12}:{mi:02d}" + (f":{s:02d}" if dialect == 'ios' else '')
+            suffix = 'PM' if h >= 12 else 'AM'
+            time_str += '\u202f' + (suffix if dialect == 'ios' else suffix.lower())
+        else:
+            time_str = f"{h:02d}:{mi:02d}" + (f":{s:02d}" if dialect == 'ios' else '')
+        if dialect == 'ios':
+            prefixes.append(f"[{d:02d}/{m:02d}/{y:02d}, {time_str}] ")
+        else:
+            prefixes.append(f"{d}/{m}/{y:02d}, {time_str} - ")
+    return prefixes
+
+
+def _message_text(kind, rng, users):
+    if kind == 'media':
+        return MEDIA[0] if rng.random() < 0.7 else MEDIA[rng.integers(1, len(MEDIA))]
+    if kind == 'link':
+        domain = DOMAINS[rng.integers(len(DOMAINS))]
+        scheme = '' if domain.startswith('www.') and rng.random() < 0.5 else 'https://'
+        return f"{ENGLISH[rng.integers(len(ENGLISH))]} {scheme}{domain}/{rng.integers(1, 10 ** 6):x}"
+    if kind == 'emoji':
+        return ENGLISH[rng.integers(len(ENGLISH))] + ' ' + ''.join(EMOJIS[i] for i in rng.integers(len(EMOJIS), size=rng.integers(1, 4)))
+    if kind == 'bengali':
+        return BENGALI[rng.integers(len(BENGALI))]
+    if kind == 'multiline':
+        lines = rng.integers(2, 5)
+        return '\n'.join(ENGLISH[i] for i in rng.integers(len(ENGLISH), size=lines))
+    if kind == 'mention':
+        return f"@{users[rng.integers(len(users))]} {ENGLISH[rng.integers(len(ENGLISH))]}"
+    return ENGLISH[rng.integers(len(ENGLISH))]
+
+
+def _system_text(rng, users):
+    a, b = users[rng.integers(len(users))], users[rng.integers(len(users))]
+    options = [f"{a} added {b}", f"{a} left", f"{a} changed the subject from \"old\" to \"new\"",
+               f"{a} changed this group's icon", f"{a} joined using this group's invite link",
+               f"{a} removed {b}", f"Your security code with {a} changed."]
+    return options[rng.integers(len(options))]
+
+
+def iter_export_lines(n_messages, seed=0, dialect='android', clock='24h', n_users=20, skew=1.1,
+                      start='2019-01-01', mean_gap_minutes=30.0, system_ratio=0.005, media_ratio=0.06,
+                      link_ratio=0.03, emoji_ratio=0.12, bengali_ratio=0.2, multiline_ratio=0.03,
+                      mention_ratio=0.03, chunk_size=100000):
+    """Yield export text in chunks; output depends only on the arguments."""
+    if dialect not in DIALECTS or clock not in CLOCKS:
+        raise ValueError(f"dialect must be one of {DIALECTS} and clock one of {CLOCKS}")
+    rng = np.random.default_rng(seed)
+    users = make_users(n_users, rng)
+    # Zipf-like activity: a few members send most of the messages
+    weights = 1.0 / np.arange(1, n_users + 1) ** skew
+    weights /= weights.sum()
+
+    kinds = ['media', 'link', 'emoji', 'bengali', 'multiline', 'mention']
+    ratios = np.array([media_ratio, link_ratio, emoji_ratio, bengali_ratio, multiline_ratio, mention_ratio])
+    kind_p = np.append(ratios, max(0.0, 1.0 - ratios.sum()))
+    kind_p /= kind_p.sum()
+    kinds.append('text')
+
+    clock_time = pd.Timestamp(start).to_datetime64()
+    if dialect == 'android':
+        yield format_timestamps([clock_time], dialect, clock)[0] + \
+            "Messages and calls are end-to-end encrypted. No one outside of this chat, not even WhatsApp, can read or listen to them.\n"
+
+    produced = 0
+    while produced < n_messages:
+        size = min(chunk_size, n_messages - produced)
+        # Bursty arrivals: mostly quick replies, sometimes hours of silence
+        quick = rng.random(size) < 0.85
+        mean_gap = mean_gap_minutes * 60
+        gaps = np.where(quick, rng.exponential(mean_gap * 0.1, size), rng.exponential(mean_gap * 6.1, size))
+        times = clock_time + np.cumsum(gaps).astype('timedelta64[s]')
+        clock_time = times[-1]
+        senders = rng.choice(n_users, size=size, p=weights)
+        message_kinds = rng.choice(len(kinds), size=size, p=kind_p)
+        system = rng.random(size) < system_ratio
+
+        lines = []
+        for prefix, sender, kind, is_system in zip(format_timestamps(times, dialect, clock), senders, message_kinds, system):
+            if is_system:
+                lines.append(prefix + _system_text(rng, users))
+            else:
+                lines.append(f"{prefix}{users[sender]}: {_message_text(kinds[kind], rng, users)}")
+        produced += size
+        yield '\n'.join(lines) + '\n'
+
+
+def generate_text(n_messages, **options):
+    """Whole export as one string (for small sizes)."""
+    return ''.join(iter_export_lines(n_messages, **options))
+
+
+def write_export(path, n_messages, as_zip=False, **options):
+    """Write an export to a .txt file (or a zip holding one) and return its path."""
+    if as_zip:
+        member = f"WhatsApp Chat with Synthetic {n_messages}.txt"
+        with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as z:
+            with z.open(member, 'w', force_zip64=True) as f:
+                for chunk in iter_export_lines(n_messages, **options):
+                    f.write(chunk.encode('utf-8'))
+    else:
+        with open(path, 'w', encoding='utf-8', newline='\n') as f:
+            for chunk in iter_export_lines(n_messages, **options):
+                f.write(chunk)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic WhatsApp chat export.")
+    parser.add_argument('path', help="Output .txt (or .zip with --zip)")
+    parser.add_argument('--messages', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dialect', choices=DIALECTS, default='android')
+    parser.add_argument('--clock', choices=CLOCKS, default='24h')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--skew', type=float, default=1.1, help="Activity skew (0 = everyone equally active)")
+    parser.add_argument('--start', default='2019-01-01')
+    parser.add_argument('--bengali-ratio', type=float, default=0.2)
+    parser.add_argument('--zip', action='store_true', help="Write a zipped export")
+    args = parser.parse_args(argv)
+
+    write_export(args.path, args.messages, as_zip=args.zip, seed=args.seed, dialect=args.dialect,
+                 clock=args.clock, n_users=args.users, skew=args.skew, start=args.start,
+                 bengali_ratio=args.bengali_ratio)
+    print(f"Wrote {args.messages} messages to {args.path} ({os.path.getsize(args.path) / 1e6:.1f} MB)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())